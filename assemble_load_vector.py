@@ -1,7 +1,10 @@
 import numpy as np
 import inspect
+import math
 
+import numba_kernels
 import numerical_integration as numint
+import polynomial
 
 
 def zero_func(x, y):
@@ -116,3 +119,276 @@ def load_vector(num_nodes, nodal_points, elements, right_hand_side = zero_func):
             i = elements[k, alpha]
             F[i] += Fh_k[alpha]
     return F
+
+
+#----------------------------------------------------------------------------------------
+
+def vectorized_load_vector(num_nodes, nodal_points, elements, right_hand_side = zero_func, backend = "numpy"):
+    '''
+        This function assembles the whole load vector F without looping over the elements.
+        ----------------
+        Inputs:
+            num_nodes (int): Total number of nodes in the finite element mesh
+            nodal_points: List/numpy array of all nodal points in the mesh
+            elements: List/numpy array where every element is a vector with 3 elements
+                      which gives the index in the nodal_points array of which nodes
+                      makes up element i
+            right_hand_side: the function on the right hand side of the original poisson equation
+            backend (str): "numpy" (default) or "numba". With "numba" and a right hand side
+                           compiled with numba.njit, the quadrature runs in the parallel
+                           kernel numba_kernels.load_values() and f is called one point
+                           at a time. Otherwise the NumPy implementation is used.
+        ----------------
+        Output:
+           load_vector: A num_nodes long vector that is the load
+                              vector for the whole system
+        ----------------
+        Raises:
+            ValueError: If the right_hand_side function cannot input 2 arguments,
+                        or if backend is not "numpy" or "numba"
+        ----------------
+        Long description:
+            Gives the same vector as load_vector() with the same 4-point Gaussian quadrature.
+            The right hand side is evaluated once on the quadrature points of all elements,
+            and the elemental contributions are scattered into F with np.bincount.
+    '''
+    signature = inspect.signature(right_hand_side)
+    parameters = signature.parameters
+    if (not len(parameters) == 2):
+        raise ValueError ("The right hand side needs to be able to accept two inputs")
+    if (backend != "numpy" and backend != "numba"):
+        raise ValueError (f"backend needs to be either numpy or numba, but is {backend}")
+
+    elements = np.asarray(elements, dtype=int)
+    z, rho = numint.quadrature_rule(4)
+
+    if (backend == "numba" and numba_kernels.is_jitted(right_hand_side)):
+        Fh = numba_kernels.load_values(np.asarray(nodal_points, dtype=float), elements,
+                                       z, rho.astype(float), right_hand_side)
+        return np.bincount(elements.ravel(), weights=Fh.ravel(), minlength=num_nodes)
+
+    Fh = elemental_load_vectors(nodal_points, elements, right_hand_side)
+
+    F = np.bincount(elements.ravel(), weights=Fh.ravel(), minlength=num_nodes)
+    return F
+
+#----------------------------------------------------------------------------------------
+
+def elemental_load_vectors(nodal_points, elements, right_hand_side = zero_func):
+    '''
+        Computes the elemental load vectors of all elements at once with the 4-point rule,
+        returned as a num_elements x 3 array. The vectorized counterpart of
+        elemental_load_vector(). A polynomial.Polynomial is integrated exactly with
+        polynomial_load_vectors() instead.
+    '''
+    if isinstance(right_hand_side, polynomial.Polynomial):
+        return polynomial_load_vectors(nodal_points, elements, right_hand_side)
+
+    elements = np.asarray(elements, dtype=int)
+    z, rho = numint.quadrature_rule(4)
+    p = np.asarray(nodal_points)[elements]
+
+    # Twice the area of every element
+    d1 = p[:, 1] - p[:, 0]
+    d2 = p[:, 2] - p[:, 0]
+    area = 0.5 * np.abs(d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0])
+
+    # Quadrature points of every element, shape (num_elements, N_q)
+    x = p[:, :, 0] @ z.T
+    y = p[:, :, 1] @ z.T
+    f = np.broadcast_to(right_hand_side(x.ravel(), y.ravel()), x.size).reshape(x.shape)
+
+    # The local basis function alpha equals the barycentric coordinate z[:, alpha]
+    return area[:, None] * ((rho * f) @ z)
+
+#----------------------------------------------------------------------------------------
+
+def polynomial_load_vectors(nodal_points, elements, right_hand_side):
+    '''
+        Computes the exact elemental load vectors of all elements for a polynomial right hand side.
+        ----------------
+        Inputs:
+            nodal_points: List/numpy array of all nodal points in the mesh
+            elements: List/numpy array where every element is a vector with 3 elements
+                      which gives the index in the nodal_points array of which nodes
+                      makes up element i
+            right_hand_side (polynomial.Polynomial): the polynomial f(x, y)
+        ----------------
+        Output:
+            Fh: num_elements x 3 array with the elemental load vectors
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            On an element, x = sum_k x_k lambda_k and y = sum_k y_k lambda_k in the
+            barycentric coordinates lambda_k, which are also the local basis functions.
+            Expanding x^i y^j lambda_alpha with the multinomial theorem and integrating
+            every barycentric monomial with the closed form
+            integral of lambda_1^s_1 lambda_2^s_2 lambda_3^s_3 over K = 2 |K| s_1! s_2! s_3! / (|s| + 2)!
+            gives
+            integral of x^i y^j lambda_alpha over K = 2 |K| i! j! / (i + j + 3)! G_alpha[i, j],
+            where G_alpha[i, j] is the coefficient of u^i w^j in the power series of
+            1 / ((1 - x_alpha u - y_alpha w) prod_k (1 - x_k u - y_k w)). Dividing a series S
+            by 1 - x_k u - y_k w is the recursion T[a, b] = S[a, b] + x_k T[a - 1, b] + y_k T[a, b - 1],
+            so the coefficients up to the exponents of f are found for all elements at once
+            with two multiplications each per factor. The right hand side is never
+            evaluated and there is no quadrature error.
+    '''
+    # Vertex coordinates as 3 x num_elements arrays
+    elements = np.asarray(elements, dtype=int)
+    nodal_points = np.asarray(nodal_points, dtype=float)
+    x = nodal_points[:, 0][elements.T]
+    y = nodal_points[:, 1][elements.T]
+    area = 0.5 * np.abs((x[1] - x[0]) * (y[2] - y[0]) - (y[1] - y[0]) * (x[2] - x[0]))
+
+    # Exponents (a, b) of the series that are needed, in an order where (a - 1, b) and (a, b - 1) come first
+    monomials = right_hand_side.coefficients
+    needed = sorted({(a, b) for i, j in monomials for a in range(i + 1) for b in range(j + 1)})
+
+    def divide(series, x_k, y_k):
+        quotient = {}
+        for a, b in needed:
+            coefficient = series[(a, b)]
+            if (a > 0):
+                coefficient = coefficient + x_k * quotient[(a - 1, b)]
+            if (b > 0):
+                coefficient = coefficient + y_k * quotient[(a, b - 1)]
+            quotient[(a, b)] = coefficient
+        return quotient
+
+    series = {exponents: 0.0 for exponents in needed}
+    series[(0, 0)] = np.ones(len(elements))
+    for k in range(3):
+        series = divide(series, x[k], y[k])
+
+    Fh = np.zeros((3, len(elements)))
+    for alpha in range(3):
+        series_alpha = divide(series, x[alpha], y[alpha])
+        for (i, j), c in monomials.items():
+            Fh[alpha] += (c * math.factorial(i) * math.factorial(j) / math.factorial(i + j + 3)) * series_alpha[(i, j)]
+
+    return (2 * area * Fh).T
+
+#----------------------------------------------------------------------------------------
+
+def adaptive_load_vector(num_nodes, nodal_points, elements, right_hand_side = zero_func,
+                         tolerance = 1e-10, max_depth = 8):
+    '''
+        This function assembles the whole load vector F with adaptive quadrature.
+        ----------------
+        Inputs:
+            num_nodes (int): Total number of nodes in the finite element mesh
+            nodal_points: List/numpy array of all nodal points in the mesh
+            elements: List/numpy array where every element is a vector with 3 elements
+                      which gives the index in the nodal_points array of which nodes
+                      makes up element i
+            right_hand_side: the function on the right hand side of the original poisson equation
+            tolerance (float): accepted error estimate for the elemental load vector of
+                               every element
+            max_depth (int): maximal number of times an element is subdivided
+        ----------------
+        Output:
+           load_vector: A num_nodes long vector that is the load
+                              vector for the whole system
+        ----------------
+        Raises:
+            ValueError: If the right_hand_side function cannot input 2 arguments,
+                        or if tolerance is not positive
+        ----------------
+        Long description:
+            The error of every triangle is estimated in two stages, each comparing two rule
+            orders. First the 4-point (degree 3) rule is compared with the centroid rule,
+            which is one of its points, so this costs the 4 evaluations of f of
+            vectorized_load_vector(). Where the difference is below the tolerance, as it is
+            where f is nearly constant, the 4-point value is kept. Only the other triangles
+            evaluate the 6 remaining points of the 7-point (degree 5) rule, and the
+            difference between the 7-point and 4-point values estimates their error. Where
+            it is below the tolerance the 7-point value is kept. The remaining triangles are
+            split into four by their edge midpoints, each child gets a quarter of the
+            tolerance of its parent, and only the children are integrated again. Every level
+            is handled for all remaining triangles at once. After max_depth levels the
+            7-point value is kept whatever the estimate.
+            The triangles are stored by the barycentric coordinates of their vertices in the
+            original element, so the local basis functions of the element are just the
+            barycentric coordinates of the quadrature points. A polynomial.Polynomial is
+            integrated exactly with polynomial_load_vectors() instead.
+    '''
+    signature = inspect.signature(right_hand_side)
+    parameters = signature.parameters
+    if (not len(parameters) == 2):
+        raise ValueError ("The right hand side needs to be able to accept two inputs")
+    if (not tolerance > 0):
+        raise ValueError (f"The tolerance needs to be positive, but is {tolerance}")
+
+    elements = np.asarray(elements, dtype=int)
+    if isinstance(right_hand_side, polynomial.Polynomial):
+        Fh = polynomial_load_vectors(nodal_points, elements, right_hand_side)
+        return np.bincount(elements.ravel(), weights=Fh.ravel(), minlength=num_nodes)
+
+    p = np.asarray(nodal_points)[elements]
+    z4, rho4 = numint.quadrature_rule(4)
+    z7, rho7 = numint.quadrature_rule(7)
+    # The centroid rule is the first point of the 4-point rule, and the 7-point rule
+    # shares that point too, so it is only evaluated once
+    rule7 = np.concatenate([[0], np.arange(len(z4), len(z4) + len(z7) - 1)])
+
+    d1 = p[:, 1] - p[:, 0]
+    d2 = p[:, 2] - p[:, 0]
+    element_area = 0.5 * np.abs(d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0])
+
+    # Every subdivision splits a triangle into the 4 triangles spanned by these
+    # barycentric coordinates (w.r.t. the triangle itself) of their vertices
+    corners = np.eye(3)
+    midpoints = 0.5 * (corners[[0, 1, 2]] + corners[[1, 2, 0]])
+    children = np.array([[corners[0], midpoints[0], midpoints[2]],
+                         [midpoints[0], corners[1], midpoints[1]],
+                         [midpoints[2], midpoints[1], corners[2]],
+                         [midpoints[0], midpoints[1], midpoints[2]]])
+
+    # Active triangles: the element they belong to, the barycentric coordinates of their
+    # vertices in that element, their area and their tolerance
+    parent = np.arange(len(elements))
+    vertices = np.broadcast_to(corners, (len(elements), 3, 3))
+    area = element_area
+    local_tolerance = np.full(len(elements), float(tolerance))
+
+    def integrate(z, vertices, parent):
+        # f times the barycentric coordinates in the original elements, at the points z
+        lam = z @ vertices
+        x = np.einsum("kqa,ka->kq", lam, p[parent, :, 0])
+        y = np.einsum("kqa,ka->kq", lam, p[parent, :, 1])
+        f = np.broadcast_to(right_hand_side(x.ravel(), y.ravel()), x.size).reshape(x.shape)
+        return f[:, :, None] * lam
+
+    Fh = np.zeros((len(elements), 3))
+    for depth in range(max_depth + 1):
+        integrand = integrate(z4, vertices, parent)
+        F4 = area[:, None] * np.einsum("q,kqa->ka", rho4, integrand)
+        F1 = area[:, None] * integrand[:, 0]
+        cheap = np.max(np.abs(F4 - F1), axis=1) <= local_tolerance
+        np.add.at(Fh, parent[cheap], F4[cheap])
+
+        # Only the triangles the cheap estimate did not accept go on to the 7-point rule
+        check = ~cheap
+        if not np.any(check):
+            break
+        parent, vertices = parent[check], vertices[check]
+        area, local_tolerance = area[check], local_tolerance[check]
+        integrand = np.concatenate([integrand[check], integrate(z7[1:], vertices, parent)], axis=1)
+        F7 = area[:, None] * np.einsum("q,kqa->ka", rho7, integrand[:, rule7])
+
+        error = np.max(np.abs(F7 - F4[check]), axis=1)
+        accept = (error <= local_tolerance) if depth < max_depth else np.full(len(parent), True)
+        np.add.at(Fh, parent[accept], F7[accept])
+
+        refine = ~accept
+        if not np.any(refine):
+            break
+        parent = np.repeat(parent[refine], 4)
+        vertices = (children[None] @ vertices[refine][:, None]).reshape(-1, 3, 3)
+        area = np.repeat(area[refine] / 4, 4)
+        local_tolerance = np.repeat(local_tolerance[refine] / 4, 4)
+
+    F = np.bincount(elements.ravel(), weights=Fh.ravel(), minlength=num_nodes)
+    return F
@@ -0,0 +1,62 @@
+import numpy as np
+import scipy.sparse as sps
+
+import assemble_stiffness_matrix as stiffmat
+
+
+def elemental_mass_matrix(area):
+    '''
+        Function that creates the local 3x3 elemental mass matrix.
+        ----------------
+        Inputs:
+            area: area of the element, a float or an array of areas
+        ----------------
+        Returns:
+            elemental_matrix: 3x3 matrix (or an array of them, one per area) being the
+                              elemental mass matrix
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            For linear basis functions on a triangle with area |K|,
+            M^k_{alpha, beta} = int_K H_alpha H_beta dA = |K| (1 + delta_{alpha, beta}) / 12,
+            which follows from the exact integrals of products of barycentric coordinates.
+    '''
+    reference = (np.ones((3, 3)) + np.eye(3)) / 12
+    return np.multiply.outer(area, reference)
+
+#----------------------------------------------------------------------------------------
+
+def mass_matrix(num_nodes, nodal_points, elements):
+    '''
+        This function assembles the whole mass matrix M as a sparse matrix.
+        ----------------
+        Inputs:
+            num_nodes (int): Total number of nodes in the finite element mesh
+            nodal_points: List/numpy array of all nodal points in the mesh
+            elements: List/numpy array where every element is a vector with 3 elements
+                      which gives the index in the nodal_points array of which nodes
+                      makes up element i
+        ----------------
+        Output:
+            mass_matrix: A num_nodes x num_nodes scipy.sparse CSR matrix with entries
+                         M_{i, j} = int_Omega H_i H_j dA
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            The elemental mass matrices of all elements are computed at once from the element
+            areas and scattered into the global matrix as COO triplets, in the same way as
+            assemble_stiffness_matrix.sparse_stiffness_matrix(). The mass matrix has the same
+            sparsity pattern as the stiffness matrix.
+    '''
+    elements = np.asarray(elements, dtype=int)
+    _, areas = stiffmat.element_geometry(nodal_points, elements)
+    M_k = elemental_mass_matrix(areas)
+
+    rows = np.repeat(elements, 3, axis=1).ravel()
+    cols = np.tile(elements, (1, 3)).ravel()
+    M = sps.coo_matrix((M_k.ravel(), (rows, cols)), shape=(num_nodes, num_nodes)).tocsr()
+    return M
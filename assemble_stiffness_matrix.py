@@ -1,4 +1,12 @@
 import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.linalg as spsla
+
+import numba_kernels
+
+# Version of the stiffness assembly. Increase it whenever the assembled matrix changes,
+# so operators stored by operator_cache.py are not reused.
+ASSEMBLY_VERSION = 1
 
 
 def elemental_stiffness_matrix(nodal_points, element):
@@ -84,3 +92,168 @@ def stiffness_matrix(num_nodes, nodal_points, elements):
         indices = elements[k, :]
         A[np.ix_(indices, indices)] += Ah_k
     return A
+
+
+#----------------------------------------------------------------------------------------
+
+def element_geometry(nodal_points, elements):
+    '''
+        Computes the gradients of the local basis functions and the area of every element.
+        ----------------
+        Inputs:
+            nodal_points: List/numpy array of all nodal points in the mesh
+            elements: List/numpy array where every element is a vector with 3 elements
+                      which gives the index in the nodal_points array of which nodes
+                      makes up element i
+        ----------------
+        Output:
+            gradients (ndarray): num_elements x 3 x 2 array, where gradients[k, alpha] is
+                                 [c_x,alpha, c_y,alpha] for the local basis function alpha
+                                 on element k
+            areas (ndarray): num_elements array with the area of every element
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            This is the vectorized counterpart of solving the 3x3 system for the basis
+            coefficients in elemental_stiffness_matrix(). The gradient of the local basis
+            function belonging to vertex alpha is the rotated opposite edge divided by
+            twice the signed area, so all elements are handled at once without any
+            linear solves.
+    '''
+    elements = np.asarray(elements, dtype=int)
+    p = np.asarray(nodal_points)[elements]
+
+    # Twice the signed area of every element
+    d1 = p[:, 1] - p[:, 0]
+    d2 = p[:, 2] - p[:, 0]
+    det = d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0]
+
+    # The edge opposite to vertex alpha goes from vertex alpha+1 to vertex alpha+2
+    opposite = np.roll(p, -2, axis=1) - np.roll(p, -1, axis=1)
+    gradients = np.stack([-opposite[:, :, 1], opposite[:, :, 0]], axis=2) / det[:, None, None]
+
+    areas = 0.5 * np.abs(det)
+    return gradients, areas
+
+#----------------------------------------------------------------------------------------
+
+def elemental_stiffness_matrices(nodal_points, elements):
+    '''
+        Computes the elemental stiffness matrices of all elements at once, returned as a
+        num_elements x 3 x 3 array. The vectorized counterpart of elemental_stiffness_matrix().
+    '''
+    gradients, areas = element_geometry(nodal_points, elements)
+
+    # A^k_{alpha, beta} = area(triangle) * (c_x,alpha * c_x,beta + c_y, alpha * c_y, beta)
+    return areas[:, None, None] * (gradients @ gradients.transpose(0, 2, 1))
+
+#----------------------------------------------------------------------------------------
+
+def sparse_stiffness_matrix(num_nodes, nodal_points, elements, backend = "numpy"):
+    '''
+        This function assembles the whole stiffness matrix A as a sparse matrix.
+        ----------------
+        Inputs:
+            num_nodes (int): Total number of nodes in the finite element mesh
+            nodal_points: List/numpy array of all nodal points in the mesh
+            elements: List/numpy array where every element is a vector with 3 elements
+                      which gives the index in the nodal_points array of which nodes
+                      makes up element i
+            backend (str): "numpy" (default) or "numba" to compute the elemental matrices
+                           with the compiled kernels in numba_kernels.py. Without Numba
+                           installed, "numba" falls back to "numpy".
+        ----------------
+        Output:
+            stiffness_matrix: A num_nodes x num_nodes scipy.sparse CSR matrix that is the
+                              stiffness matrix for the whole system
+        ----------------
+        Raises:
+            ValueError: If backend is not "numpy" or "numba"
+        ----------------
+        Long description:
+            Gives the same matrix as stiffness_matrix(), but all elemental matrices are
+            computed at once from element_geometry() and scattered into the global matrix
+            as COO triplets. Duplicate entries are summed when converting to CSR, so the
+            memory use is proportional to the number of elements instead of num_nodes^2.
+    '''
+    if (backend != "numpy" and backend != "numba"):
+        raise ValueError (f"backend needs to be either numpy or numba, but is {backend}")
+
+    elements = np.asarray(elements, dtype=int)
+    if (backend == "numba" and numba_kernels.NUMBA_AVAILABLE):
+        A_k = numba_kernels.stiffness_values(np.asarray(nodal_points, dtype=float), elements)
+    else:
+        A_k = elemental_stiffness_matrices(nodal_points, elements)
+
+    rows = np.repeat(elements, 3, axis=1).ravel()
+    cols = np.tile(elements, (1, 3)).ravel()
+    A = sps.coo_matrix((A_k.ravel(), (rows, cols)), shape=(num_nodes, num_nodes)).tocsr()
+    return A
+
+#----------------------------------------------------------------------------------------
+
+class StiffnessOperator(spsla.LinearOperator):
+    '''
+        Matrix-free stiffness matrix, restricted to the interior nodes, as a scipy LinearOperator.
+        ----------------
+        Inputs:
+            num_nodes (int): Total number of nodes in the finite element mesh
+            nodal_points: List/numpy array of all nodal points in the mesh
+            elements: List/numpy array of the elements of the mesh
+            interior (ndarray): indices of the unknowns, for example solver.interior_nodes()
+                                (default: all nodes)
+            backend (str): "numpy" (default) or "numba" to apply the operator with the
+                           compiled kernel numba_kernels.stiffness_matvec()
+        ----------------
+        Raises:
+            ValueError: If backend is not "numpy" or "numba"
+        ----------------
+        Long description:
+            Only the gradients of element_geometry(), scaled by the square root of the
+            area, are stored, 6 numbers per element. A u is computed as a gather of the
+            nodal values of every element, the local product G (G^T u_k) with the scaled
+            3 x 2 gradient matrix G of the element, and a scatter with np.bincount. The
+            arrays are stored component by component (3 x num_elements), so every step
+            works on contiguous vectors. The nodes that are not in interior are set to zero
+            before the gather and dropped after the scatter, which is the same as
+            A[interior][:, interior] of sparse_stiffness_matrix(). No global matrix and no
+            COO triplets are formed. The operator is symmetric, and diagonal() gives its
+            diagonal for Jacobi preconditioning.
+    '''
+    def __init__(self, num_nodes, nodal_points, elements, interior = None, backend = "numpy"):
+        if (backend != "numpy" and backend != "numba"):
+            raise ValueError (f"backend needs to be either numpy or numba, but is {backend}")
+
+        self.num_nodes = num_nodes
+        self.interior = np.arange(num_nodes) if interior is None else np.asarray(interior)
+        self.compiled = backend == "numba" and numba_kernels.NUMBA_AVAILABLE
+
+        gradients, areas = element_geometry(nodal_points, elements)
+        scaled = gradients * np.sqrt(areas)[:, None, None]
+        self.elements = np.ascontiguousarray(np.asarray(elements, dtype=int).T)
+        self.gradients_x = np.ascontiguousarray(scaled[:, :, 0].T)
+        self.gradients_y = np.ascontiguousarray(scaled[:, :, 1].T)
+        super().__init__(dtype=np.float64, shape=(len(self.interior), len(self.interior)))
+
+    def _matvec(self, u):
+        u_full = np.zeros(self.num_nodes)
+        u_full[self.interior] = np.ravel(u)
+
+        if self.compiled:
+            return numba_kernels.stiffness_matvec(self.elements, self.gradients_x, self.gradients_y, u_full)[self.interior]
+
+        u_k = u_full[self.elements]
+        gx, gy = self.gradients_x, self.gradients_y
+        gradient_x = gx[0] * u_k[0] + gx[1] * u_k[1] + gx[2] * u_k[2]
+        gradient_y = gy[0] * u_k[0] + gy[1] * u_k[1] + gy[2] * u_k[2]
+        local = gx * gradient_x + gy * gradient_y
+        return np.bincount(self.elements.ravel(), local.ravel(), minlength=self.num_nodes)[self.interior]
+
+    def _rmatvec(self, u):
+        return self._matvec(u)
+
+    def diagonal(self):
+        local = self.gradients_x**2 + self.gradients_y**2
+        return np.bincount(self.elements.ravel(), local.ravel(), minlength=self.num_nodes)[self.interior]
@@ -0,0 +1,184 @@
+import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.linalg as spsla
+
+import multiprocessing
+
+# Number of sectors when none is given, independent of the number of cpus
+DEFAULT_SECTORS = 4
+# The workers are started without forking, since solver() also runs in the threads of
+# server.py and a forked child may inherit a lock that another thread holds
+MP_CONTEXT = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods()
+                                         else "spawn")
+
+#----------------------------------------------------------------------------------------
+
+def sector_partition(nodal_points, elements, num_sectors):
+    '''
+        Splits the elements of the unit circle mesh into angular sectors.
+        ----------------
+        Inputs:
+            nodal_points (ndarray): the nodal_points we get from the mesh generation
+            elements (ndarray): the elements we get from mesh generation
+            num_sectors (int): number of sectors
+        ----------------
+        Output:
+            sectors (ndarray): array of the sector index (0, ..., num_sectors - 1) of every element
+        ----------------
+        Raises:
+            ValueError: If num_sectors is smaller than 1
+        ----------------
+        Long description:
+            An element belongs to the sector its centroid lies in. All sectors meet in the
+            centre node, which generate_mesh.circle_data() puts at index 0.
+    '''
+    if (num_sectors < 1):
+        raise ValueError (f"Need at least 1 sector, but got {num_sectors}")
+
+    centroids = np.asarray(nodal_points)[np.asarray(elements, dtype=int)].mean(axis=1)
+    angles = np.arctan2(centroids[:, 1], centroids[:, 0])
+    sectors = np.floor((angles + np.pi) / (2 * np.pi) * num_sectors).astype(int)
+    return np.minimum(sectors, num_sectors - 1)
+
+#----------------------------------------------------------------------------------------
+
+def subdomains(A, interior, elements, sectors, num_sectors, overlap = 2):
+    '''
+        Finds the unknowns of every overlapping subdomain.
+        ----------------
+        Inputs:
+            A: the stiffness matrix restricted to the interior nodes
+            interior (ndarray): indices of the interior nodes, see solver.interior_nodes()
+            elements (ndarray): the elements we get from mesh generation
+            sectors (ndarray): sector of every element, see sector_partition()
+            num_sectors (int): number of sectors
+            overlap (int): number of layers of neighbouring nodes added to every sector
+        ----------------
+        Output:
+            owned (list): for every sector, the sorted interior unknowns (indices into A)
+                          of the nodes of its elements, excluding those already owned by an
+                          earlier sector, so the sets do not overlap
+            extended (list): for every sector, its owned unknowns grown by overlap layers of
+                             neighbours in the graph of A
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            The unknowns are numbered like the rows of A, so global node interior[i] is
+            unknown i. Boundary nodes are not unknowns and are left out.
+    '''
+    # The rows of A sum to zero away from the boundary, so the graph is taken from |A|
+    graph = abs(A).tocsr()
+    num_nodes = np.max(elements) + 1
+    unknown = np.full(num_nodes, -1)
+    unknown[interior] = np.arange(len(interior))
+
+    assigned = np.zeros(len(interior), dtype=bool)
+    owned = []
+    extended = []
+    for sector in range(num_sectors):
+        nodes = unknown[np.unique(elements[sectors == sector])]
+        member = np.zeros(len(interior), dtype=bool)
+        member[nodes[nodes >= 0]] = True
+
+        owned.append(np.flatnonzero(member & ~assigned))
+        assigned |= member
+
+        for _ in range(overlap):
+            member = (graph @ member.astype(float)) > 0
+        extended.append(np.flatnonzero(member))
+    return owned, extended
+
+#----------------------------------------------------------------------------------------
+
+def subdomain_worker(connection, data, indices, indptr, shape):
+    '''
+        Runs in a worker process: factorizes one subdomain matrix, given as CSC arrays, and
+        then answers every vector received on connection with the solution of the
+        subdomain system, until it receives None.
+    '''
+    factor = spsla.splu(sps.csc_matrix((data, indices, indptr), shape=shape))
+    connection.send(True)
+    while True:
+        residual = connection.recv()
+        if residual is None:
+            break
+        connection.send(factor.solve(residual))
+    connection.close()
+
+#----------------------------------------------------------------------------------------
+
+class SchwarzPreconditioner:
+    '''
+        Two-level additive Schwarz preconditioner with the subdomain solves in worker processes.
+        ----------------
+        Long description:
+            M^-1 r = sum_i R_i^T A_i^-1 R_i r + R_0^T A_0^-1 R_0 r, where R_i restricts to the
+            unknowns of the overlapping subdomain i and A_i = R_i A R_i^T. The coarse space R_0
+            has one row per sector, the indicator of the unknowns it owns, so that the
+            sectors can exchange information through the centre in one step. With processes
+            set to True every subdomain is factorized and solved in its own process, started
+            from MP_CONTEXT, so the factorizations and the solves of one application run in
+            parallel. Use it as a context manager, or call close(), to stop the workers.
+    '''
+    def __init__(self, A, owned, extended, processes = True):
+        self.A = A.tocsr()
+        self.shape = A.shape
+        self.extended = extended
+        self.processes = processes
+
+        # Coarse space of sector indicators
+        rows = np.concatenate([np.full(len(unknowns), sector) for sector, unknowns in enumerate(owned)])
+        cols = np.concatenate(owned)
+        self.R_0 = sps.csr_matrix((np.ones(len(cols)), (rows, cols)), shape=(len(owned), A.shape[0]))
+        A_0 = (self.R_0 @ self.A @ self.R_0.T).toarray()
+        self.coarse = np.linalg.pinv(A_0)
+
+        self.workers = []
+        self.factors = []
+        matrices = [self.A[unknowns][:, unknowns].tocsc() for unknowns in extended]
+        if processes:
+            for A_i in matrices:
+                parent, child = MP_CONTEXT.Pipe()
+                worker = MP_CONTEXT.Process(target=subdomain_worker, daemon=True,
+                                             args=(child, A_i.data, A_i.indices, A_i.indptr, A_i.shape))
+                worker.start()
+                child.close()
+                self.workers.append((worker, parent))
+            for _, parent in self.workers:
+                parent.recv()
+        else:
+            self.factors = [spsla.splu(A_i) for A_i in matrices]
+
+    def apply(self, r):
+        r = np.asarray(r).ravel()
+        z = self.R_0.T @ (self.coarse @ (self.R_0 @ r))
+        if self.processes:
+            for (_, parent), unknowns in zip(self.workers, self.extended):
+                parent.send(r[unknowns])
+            for (_, parent), unknowns in zip(self.workers, self.extended):
+                z[unknowns] += parent.recv()
+        else:
+            for factor, unknowns in zip(self.factors, self.extended):
+                z[unknowns] += factor.solve(r[unknowns])
+        return z
+
+    def as_linear_operator(self):
+        return spsla.LinearOperator(self.shape, matvec=self.apply)
+
+    def close(self):
+        for worker, parent in self.workers:
+            try:
+                parent.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            parent.close()
+            worker.join()
+        self.workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
@@ -0,0 +1,58 @@
+import numpy as np
+import scipy.sparse.linalg as spsla
+
+import assemble_mass_matrix as massmat
+import assemble_stiffness_matrix as stiffmat
+import generate_mesh as mesh
+import solver
+
+
+def eigen_solver(num_nodes, k = 6):
+    '''
+        Finds the k smallest eigenvalues and eigenfunctions of the Laplacian on the unit disc
+        with homogeneous dirichlet boundary conditions,
+        -nabla^2 u(x, y) = lambda u(x, y)
+        ----------------
+        Inputs:
+            num_nodes (int): Total number of nodes in the finite element mesh
+            k (int): number of eigenpairs to compute
+        ----------------
+        Output:
+            eigenvalues (ndarray): the k smallest eigenvalues in increasing order
+            eigenfunctions (ndarray): num_nodes x k array, column i is the eigenfunction of
+                                      eigenvalue i at the nodal points (zero on the boundary),
+                                      normalized so that int_Omega u_i u_j dA = delta_{i, j}
+            nodal_points (ndarray): the nodal_points we get from the mesh generation
+            elements (ndarray): the elements we get from mesh generation
+            boundary_edges (ndarray): list of boundary nodes we get from mesh generation
+        ----------------
+        Raises:
+            ValueError: If k is not between 1 and the number of interior nodes minus 1
+        ----------------
+        Long description:
+            The discrete problem is the generalized eigenvalue problem A u = lambda M u on the
+            interior nodes, with the stiffness matrix A and the mass matrix M. It is solved
+            with the sparse Lanczos method in shift-invert mode around 0 (scipy's eigsh), so
+            only one sparse factorization of A is needed and the smallest eigenvalues
+            converge in a few iterations. The exact eigenvalues of the unit disc are the
+            squared zeros of the Bessel functions, j_{m, n}^2.
+    '''
+    # Generate mesh
+    nodal_points, elements, boundary_edges = mesh.generate_mesh(num_nodes)
+    interior = solver.interior_nodes(num_nodes, boundary_edges)
+
+    if (k < 1 or k >= len(interior)):
+        raise ValueError (f"k needs to be between 1 and {len(interior) - 1}, but is {k}")
+
+    # Assemble stiffness and mass matrix on the interior nodes
+    A = stiffmat.sparse_stiffness_matrix(num_nodes, nodal_points, elements)[interior][:, interior]
+    M = massmat.mass_matrix(num_nodes, nodal_points, elements)[interior][:, interior]
+
+    # Shift-invert Lanczos around 0 gives the eigenvalues closest to 0
+    eigenvalues, eigenvectors = spsla.eigsh(A.tocsc(), k = k, M = M.tocsc(), sigma = 0, which = "LM")
+    order = np.argsort(eigenvalues)
+
+    eigenfunctions = np.zeros((num_nodes, k))
+    eigenfunctions[interior] = eigenvectors[:, order]
+
+    return eigenvalues[order], eigenfunctions, nodal_points, elements, boundary_edges
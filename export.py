@@ -0,0 +1,277 @@
+import numpy as np
+
+import os
+
+'''
+    Binary export of the mesh and the solution for viewers like ParaView and VisIt.
+    All arrays are written straight from their NumPy buffers, there are no loops over
+    elements and no numbers are formatted as text, so large results are written at
+    the speed of the disk.
+'''
+
+# VTK cell types of the elements and the boundary edges
+VTK_TRIANGLE = 5
+VTK_LINE = 3
+
+
+#----------------------------------------------------------------------------------------
+
+def little_endian(array, dtype):
+    '''
+        Returns array as a C-contiguous little endian array of the given dtype,
+        without copying when it already is one.
+    '''
+    return np.ascontiguousarray(array, dtype=np.dtype(dtype).newbyteorder("<"))
+
+#----------------------------------------------------------------------------------------
+
+def mesh_arrays(nodal_points, elements, boundary_edges):
+    '''
+        Converts the output of generate_mesh() to the arrays that are written to file:
+        float64 nodal points and int64 elements and boundary edges.
+    '''
+    nodal_points = little_endian(nodal_points, np.float64)
+    elements = little_endian(elements, np.int64)
+    boundary_edges = little_endian(boundary_edges, np.int64)
+    return nodal_points, elements, boundary_edges
+
+#----------------------------------------------------------------------------------------
+
+def write_vtu(path, nodal_points, elements, boundary_edges, point_data = None):
+    '''
+        Writes the mesh and nodal data to a VTK unstructured grid file with appended raw binary data.
+        ----------------
+        Inputs:
+            path (str): the .vtu file to write
+            nodal_points (ndarray): the nodal_points we get from the mesh generation
+            elements (ndarray): the elements we get from mesh generation
+            boundary_edges (ndarray): list of boundary edges we get from mesh generation
+            point_data (dict): maps names to arrays of length num_nodes, for example
+                               {"solution": sol}
+        ----------------
+        Output:
+            -
+        ----------------
+        Raises:
+            ValueError: If an array in point_data does not have one value per node
+        ----------------
+        Long description:
+            The elements are written as VTK triangles and the boundary edges as VTK lines in
+            the same grid. The XML header only holds the offsets of the data arrays, every
+            array is then written as one block (a UInt64 byte count followed by the raw
+            bytes) in the AppendedData section.
+    '''
+    nodal_points, elements, boundary_edges = mesh_arrays(nodal_points, elements, boundary_edges)
+    point_data = {} if point_data is None else point_data
+    num_nodes = len(nodal_points)
+    num_elements = len(elements)
+    num_edges = len(boundary_edges)
+
+    arrays = {}
+    for name, values in point_data.items():
+        values = little_endian(values, np.float64)
+        if (values.shape != (num_nodes,)):
+            raise ValueError (f"Point data {name} needs {num_nodes} values, but has shape {values.shape}")
+        arrays[name] = [values]
+
+    # VTK points are three dimensional
+    points = np.zeros((num_nodes, 3), dtype="<f8")
+    points[:, :2] = nodal_points
+
+    blocks = list(arrays.values()) + [
+        [points],
+        [elements, boundary_edges],
+        [np.arange(3, 3 * num_elements + 1, 3, dtype="<i8"),
+         np.arange(3 * num_elements + 2, 3 * num_elements + 2 * num_edges + 1, 2, dtype="<i8")],
+        [np.full(num_elements, VTK_TRIANGLE, dtype=np.uint8), np.full(num_edges, VTK_LINE, dtype=np.uint8)],
+    ]
+
+    # Offset of every block in the appended data, each block starts with an 8 byte size
+    offsets = np.cumsum([0] + [8 + sum(part.nbytes for part in block) for block in blocks])
+
+    point_arrays = "".join(f'        <DataArray type="Float64" Name="{name}" format="appended" offset="{offsets[i]}"/>\n'
+                           for i, name in enumerate(arrays))
+    k = len(arrays)
+    header = (
+        '<?xml version="1.0"?>\n'
+        '<VTKFile type="UnstructuredGrid" version="1.0" byte_order="LittleEndian" header_type="UInt64">\n'
+        '  <UnstructuredGrid>\n'
+        f'    <Piece NumberOfPoints="{num_nodes}" NumberOfCells="{num_elements + num_edges}">\n'
+        '      <PointData>\n'
+        f'{point_arrays}'
+        '      </PointData>\n'
+        '      <Points>\n'
+        f'        <DataArray type="Float64" NumberOfComponents="3" format="appended" offset="{offsets[k]}"/>\n'
+        '      </Points>\n'
+        '      <Cells>\n'
+        f'        <DataArray type="Int64" Name="connectivity" format="appended" offset="{offsets[k + 1]}"/>\n'
+        f'        <DataArray type="Int64" Name="offsets" format="appended" offset="{offsets[k + 2]}"/>\n'
+        f'        <DataArray type="UInt8" Name="types" format="appended" offset="{offsets[k + 3]}"/>\n'
+        '      </Cells>\n'
+        '    </Piece>\n'
+        '  </UnstructuredGrid>\n'
+        '  <AppendedData encoding="raw">\n'
+        '   _'
+    )
+
+    with open(path, "wb") as file:
+        file.write(header.encode())
+        for block in blocks:
+            file.write(np.array(sum(part.nbytes for part in block), dtype="<u8").tobytes())
+            for part in block:
+                file.write(memoryview(part).cast("B"))
+        file.write(b'\n  </AppendedData>\n</VTKFile>\n')
+
+#----------------------------------------------------------------------------------------
+
+def write_vtu_series(path, nodal_points, elements, boundary_edges, solutions, times = None, name = "solution"):
+    '''
+        Writes a time series of nodal solutions as one .vtu file per step and a ParaView
+        collection (.pvd) file that lists them.
+        ----------------
+        Inputs:
+            path (str): the .pvd file to write, the steps are written next to it as
+                        <stem>_<step>.vtu
+            nodal_points, elements, boundary_edges: the mesh from mesh generation
+            solutions: iterable of arrays of length num_nodes, one per step or right hand side
+            times: sequence with the time of every step (default: 0, 1, 2, ...)
+            name (str): name of the nodal data in the .vtu files
+        ----------------
+        Output:
+            files (list): paths of the written .vtu files
+        ----------------
+        Raises:
+            ValueError: If a solution does not have one value per node
+        ----------------
+        Long description:
+            The solutions are consumed one at a time, so a generator can produce them while
+            the series is written. Every .vtu file is self contained. write_xdmf() writes
+            the mesh only once and is therefore smaller for long series.
+    '''
+    stem = os.path.splitext(path)[0]
+    directory = os.path.dirname(path)
+    datasets = []
+    files = []
+    for step, solution in enumerate(solutions):
+        time = step if times is None else times[step]
+        file_path = f"{stem}_{step:05d}.vtu"
+        write_vtu(file_path, nodal_points, elements, boundary_edges, {name: solution})
+        files.append(file_path)
+        datasets.append(f'    <DataSet timestep="{float(time)!r}" file="{os.path.relpath(file_path, directory or ".")}"/>\n')
+
+    with open(path, "w") as file:
+        file.write('<?xml version="1.0"?>\n'
+                   '<VTKFile type="Collection" version="1.0" byte_order="LittleEndian">\n'
+                   '  <Collection>\n'
+                   f'{"".join(datasets)}'
+                   '  </Collection>\n'
+                   '</VTKFile>\n')
+    return files
+
+#----------------------------------------------------------------------------------------
+
+def xdmf_data_item(array, sidecar, seek):
+    '''
+        XML of an XDMF DataItem that reads array from offset seek of the binary sidecar file.
+    '''
+    data_type = "Float" if array.dtype.kind == "f" else "Int"
+    dimensions = " ".join(str(dimension) for dimension in array.shape)
+    return (f'<DataItem Format="Binary" Endian="Little" DataType="{data_type}" Precision="{array.dtype.itemsize}" '
+            f'Dimensions="{dimensions}" Seek="{seek}">{sidecar}</DataItem>')
+
+#----------------------------------------------------------------------------------------
+
+def write_xdmf(path, nodal_points, elements, boundary_edges, solutions, times = None, name = "solution"):
+    '''
+        Writes the mesh and one or more nodal solutions to an XDMF file with a raw binary sidecar.
+        ----------------
+        Inputs:
+            path (str): the .xmf file to write, the binary data is written to the file with
+                        the same stem and the suffix .bin
+            nodal_points, elements, boundary_edges: the mesh from mesh generation
+            solutions: an array of length num_nodes for a single solution, or an iterable
+                       of such arrays (for example a num_steps x num_nodes array or a
+                       generator) for a time series
+            times: sequence with the time of every step (default: 0, 1, 2, ...)
+            name (str): name of the nodal data
+        ----------------
+        Output:
+            -
+        ----------------
+        Raises:
+            ValueError: If a solution does not have one value per node
+        ----------------
+        Long description:
+            The sidecar holds the elements, the nodal points and the boundary edges once,
+            followed by the solutions. The XML file points into the sidecar with byte
+            offsets, so every step of a time series reuses the same mesh data. The domain
+            holds the triangle grid (a temporal collection for a time series) and a
+            separate polyline grid with the boundary edges.
+    '''
+    nodal_points, elements, boundary_edges = mesh_arrays(nodal_points, elements, boundary_edges)
+    num_nodes = len(nodal_points)
+    sidecar_path = os.path.splitext(path)[0] + ".bin"
+    sidecar = os.path.basename(sidecar_path)
+
+    single = isinstance(solutions, np.ndarray) and solutions.ndim == 1
+    if single:
+        solutions = [solutions]
+
+    seek = 0
+    with open(sidecar_path, "wb") as file:
+        mesh_items = {}
+        for key, array in [("elements", elements), ("nodal_points", nodal_points), ("boundary_edges", boundary_edges)]:
+            mesh_items[key] = xdmf_data_item(array, sidecar, seek)
+            file.write(memoryview(array).cast("B"))
+            seek += array.nbytes
+
+        solution_items = []
+        for solution in solutions:
+            solution = little_endian(solution, np.float64)
+            if (solution.shape != (num_nodes,)):
+                raise ValueError (f"A solution needs {num_nodes} values, but has shape {solution.shape}")
+            solution_items.append(xdmf_data_item(solution, sidecar, seek))
+            file.write(memoryview(solution).cast("B"))
+            seek += solution.nbytes
+
+    def grid(grid_name, item, time = None, indent = "    "):
+        time_tag = "" if time is None else f'{indent}  <Time Value="{float(time)!r}"/>\n'
+        return (f'{indent}<Grid Name="{grid_name}" GridType="Uniform">\n'
+                f'{time_tag}'
+                f'{indent}  <Topology TopologyType="Triangle" NumberOfElements="{len(elements)}">\n'
+                f'{indent}    {mesh_items["elements"]}\n'
+                f'{indent}  </Topology>\n'
+                f'{indent}  <Geometry GeometryType="XY">\n'
+                f'{indent}    {mesh_items["nodal_points"]}\n'
+                f'{indent}  </Geometry>\n'
+                f'{indent}  <Attribute Name="{name}" AttributeType="Scalar" Center="Node">\n'
+                f'{indent}    {item}\n'
+                f'{indent}  </Attribute>\n'
+                f'{indent}</Grid>\n')
+
+    if single:
+        grids = grid("mesh", solution_items[0])
+    else:
+        steps = "".join(grid(f"mesh_{step}", item, step if times is None else times[step], indent = "      ")
+                        for step, item in enumerate(solution_items))
+        grids = ('    <Grid Name="mesh" GridType="Collection" CollectionType="Temporal">\n'
+                 f'{steps}'
+                 '    </Grid>\n')
+
+    boundary = ('    <Grid Name="boundary" GridType="Uniform">\n'
+                f'      <Topology TopologyType="Polyline" NodesPerElement="2" NumberOfElements="{len(boundary_edges)}">\n'
+                f'        {mesh_items["boundary_edges"]}\n'
+                '      </Topology>\n'
+                '      <Geometry GeometryType="XY">\n'
+                f'        {mesh_items["nodal_points"]}\n'
+                '      </Geometry>\n'
+                '    </Grid>\n')
+
+    with open(path, "w") as file:
+        file.write('<?xml version="1.0" ?>\n'
+                   '<Xdmf Version="3.0">\n'
+                   '  <Domain>\n'
+                   f'{grids}'
+                   f'{boundary}'
+                   '  </Domain>\n'
+                   '</Xdmf>\n')
@@ -173,4 +173,229 @@ def get_boundary_edges(num_nodes, dof_in_circles):
 
     return boundary_edges
 
-#----------------------------------------------------------------------------------------
\ No newline at end of file
+#----------------------------------------------------------------------------------------
+
+def space_filling_curve_index(points, curve = "hilbert", order = 16):
+    """
+    Computes the position of points along a space-filling curve.
+    ----------------
+    Inputs:
+    - points (ndarray): Array of shape (n, 2) with the points.
+    - curve (str): Either "hilbert" or "morton".
+    - order (int): Number of bits per coordinate in the grid the points are snapped to.
+    ----------------
+    Returns:
+    - index (ndarray): Array of n integers giving the position of every point along the curve.
+    ----------------
+    Raises:
+        ValueError:
+            If curve is not "hilbert" or "morton".
+    ----------------
+    Long description:
+        The points are scaled to the bounding box and snapped to a 2^order x 2^order grid.
+        The loops only run over the bits of the coordinates, every bit is handled for all
+        points at once.
+    """
+    if (curve != "hilbert" and curve != "morton"):
+        raise ValueError (f"curve needs to be either hilbert or morton, but is {curve}")
+
+    points = np.asarray(points, dtype=float)
+    n = 1 << order
+    lower = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lower, np.finfo(float).tiny)
+    grid = np.minimum(((points - lower) / extent * n).astype(np.int64), n - 1)
+    x = grid[:, 0].copy()
+    y = grid[:, 1].copy()
+
+    index = np.zeros(len(points), dtype=np.int64)
+    if (curve == "morton"):
+        for bit in range(order):
+            index |= ((x >> bit) & 1) << (2 * bit)
+            index |= ((y >> bit) & 1) << (2 * bit + 1)
+        return index
+
+    s = n >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        index += s * s * ((3 * rx) ^ ry)
+
+        # Rotate the quadrant so that the curve inside it has the standard orientation
+        flip = ~ry & rx
+        x[flip] = n - 1 - x[flip]
+        y[flip] = n - 1 - y[flip]
+        swap = ~ry
+        x[swap], y[swap] = y[swap], x[swap]
+        s >>= 1
+    return index
+
+#----------------------------------------------------------------------------------------
+
+def renumber_mesh(nodal_points, elements, boundary_edges, curve = "hilbert"):
+    """
+    Renumbers the nodes and elements of a mesh along a space-filling curve.
+    ----------------
+    Inputs:
+    - nodal_points (ndarray): List of all nodal points in the mesh.
+    - elements (ndarray): List of elements given by the indices of their three nodal points.
+    - boundary_edges (ndarray): List of boundary edges given by the indices of their end points.
+    - curve (str): Either "hilbert" or "morton".
+    ----------------
+    Returns:
+    - nodal_points (ndarray): The nodal points in the new order.
+    - elements (ndarray): The elements in the new order, indexing the new nodal points.
+    - boundary_edges (ndarray): The boundary edges, indexing the new nodal points.
+    - permutation (ndarray): permutation[i] is the old index of new node i, so a solution
+      on the new mesh is moved back to the old order by u_old[permutation] = u_new.
+    ----------------
+    Raises:
+        ValueError:
+            If curve is not "hilbert" or "morton".
+    ----------------
+    Long description:
+        get_nodal_points() orders the nodes ring by ring and the Delaunay triangulation orders
+        the elements arbitrarily, so neighbouring elements can be far apart in memory. Sorting
+        the nodes, and the elements by their centroids, along a space-filling curve makes the
+        gather from nodal_points and the scatter into the global system local. It is an
+        optional stage after generate_mesh(), the mesh itself is unchanged.
+    """
+    nodal_points = np.asarray(nodal_points)
+    elements = np.asarray(elements)
+    boundary_edges = np.asarray(boundary_edges)
+
+    permutation = np.argsort(space_filling_curve_index(nodal_points, curve), kind="stable")
+    inverse = np.empty_like(permutation)
+    inverse[permutation] = np.arange(len(permutation))
+
+    nodal_points = nodal_points[permutation]
+    elements = inverse[elements].astype(elements.dtype)
+    boundary_edges = inverse[boundary_edges.astype(int)].astype(boundary_edges.dtype)
+
+    centroids = nodal_points[elements].mean(axis=1)
+    elements = elements[np.argsort(space_filling_curve_index(centroids, curve), kind="stable")]
+
+    return nodal_points, elements, boundary_edges, permutation
+
+#----------------------------------------------------------------------------------------
+
+def refine_mesh(nodal_points, elements, boundary_edges):
+    """
+    Refines a mesh of the unit circle uniformly by splitting every element into four.
+    ----------------
+    Inputs:
+    - nodal_points (ndarray): List of all nodal points in the mesh.
+    - elements (ndarray): List of elements given by the indices of their three nodal points.
+    - boundary_edges (ndarray): List of boundary edges given by the indices of their end points.
+    ----------------
+    Returns:
+    - nodal_points (ndarray): The old nodal points followed by one new point per edge.
+    - elements (ndarray): Four elements for every old element.
+    - boundary_edges (ndarray): Two boundary edges for every old boundary edge.
+    ----------------
+    Raises:
+        -
+    ----------------
+    Long description:
+        Every edge gets a new node at its midpoint, and every element (a, b, c) is split into
+        the three corner elements and the element of the three midpoints. The midpoints of
+        boundary edges are moved out onto the unit circle, so the refined mesh approximates
+        the circle better. The old nodes keep their indices, so the meshes of repeated
+        refinements are nested and share the nodes of the coarsest mesh.
+    """
+    nodal_points = np.asarray(nodal_points)
+    elements = np.asarray(elements)
+    boundary_edges = np.asarray(boundary_edges)
+    num_nodes = len(nodal_points)
+
+    # Edges (a, b), (b, c) and (c, a) of every element, numbered by their sorted end points
+    local_edges = np.stack([elements, np.roll(elements, -1, axis=1)], axis=2).astype(np.int64)
+    keys = np.min(local_edges, axis=2) * num_nodes + np.max(local_edges, axis=2)
+    unique_keys, edge_index = np.unique(keys, return_inverse=True)
+    edge_index = edge_index.reshape(keys.shape)
+    edge_nodes = np.stack([unique_keys // num_nodes, unique_keys % num_nodes], axis=1)
+
+    midpoints = 0.5 * (nodal_points[edge_nodes[:, 0]] + nodal_points[edge_nodes[:, 1]])
+    boundary = boundary_edges.astype(np.int64)
+    boundary_index = np.searchsorted(unique_keys, np.min(boundary, axis=1) * num_nodes + np.max(boundary, axis=1))
+    midpoints[boundary_index] /= np.linalg.norm(midpoints[boundary_index], axis=1)[:, None]
+
+    # Midpoint m_ab of (a, b), m_bc of (b, c) and m_ca of (c, a)
+    m = num_nodes + edge_index
+    a, b, c = elements[:, 0], elements[:, 1], elements[:, 2]
+    refined_elements = np.concatenate([
+        np.stack([a, m[:, 0], m[:, 2]], axis=1),
+        np.stack([m[:, 0], b, m[:, 1]], axis=1),
+        np.stack([m[:, 2], m[:, 1], c], axis=1),
+        np.stack([m[:, 0], m[:, 1], m[:, 2]], axis=1),
+    ]).astype(elements.dtype)
+
+    middle = num_nodes + boundary_index
+    refined_edges = np.concatenate([
+        np.stack([boundary[:, 0], middle], axis=1),
+        np.stack([middle, boundary[:, 1]], axis=1),
+    ]).astype(boundary_edges.dtype)
+
+    return np.concatenate([nodal_points, midpoints]), refined_elements, refined_edges
+
+#----------------------------------------------------------------------------------------
+
+def boundary_elements(elements, boundary_edges):
+    """
+    Finds the element that every boundary edge belongs to.
+    ----------------
+    Inputs:
+    - elements (ndarray): List of elements given by the indices of their three nodal points.
+    - boundary_edges (ndarray): List of boundary edges given by the indices of their end points.
+    ----------------
+    Returns:
+    - owners (ndarray): owners[i] is the index of the element with boundary_edges[i] as an edge.
+    ----------------
+    Raises:
+        -
+    ----------------
+    Long description:
+        The edges of all elements are numbered by their sorted end points, and the
+        boundary edges are looked up among them with a binary search.
+    """
+    elements = np.asarray(elements, dtype=np.int64)
+    boundary = np.asarray(boundary_edges).astype(np.int64)
+    num_nodes = max(np.max(elements), np.max(boundary)) + 1
+
+    local_edges = np.stack([elements, np.roll(elements, -1, axis=1)], axis=2)
+    keys = (np.min(local_edges, axis=2) * num_nodes + np.max(local_edges, axis=2)).ravel()
+    order = np.argsort(keys, kind="stable")
+    position = np.searchsorted(keys[order], np.min(boundary, axis=1) * num_nodes + np.max(boundary, axis=1))
+    return order[position] // 3
+
+#----------------------------------------------------------------------------------------
+
+def boundary_normals(nodal_points, elements, boundary_edges):
+    """
+    Finds the outward normals of the boundary edges.
+    ----------------
+    Inputs:
+    - nodal_points (ndarray): List of the coordinates of the nodal points.
+    - elements (ndarray): List of elements given by the indices of their three nodal points.
+    - boundary_edges (ndarray): List of boundary edges given by the indices of their end points.
+    ----------------
+    Returns:
+    - owners (ndarray): owners[i] is the element with boundary_edges[i] as an edge, see boundary_elements().
+    - normals (ndarray): normals[i] is the outward normal of boundary_edges[i], with the length of the edge.
+    ----------------
+    Raises:
+        -
+    ----------------
+    Long description:
+        The outward normal of an edge is the one pointing away from the centroid of the
+        element of the edge. As it has the length of the edge, the integral of a constant
+        vector field g along the edge is g . normals[i].
+    """
+    nodal_points = np.asarray(nodal_points)
+    elements = np.asarray(elements, dtype=int)
+    boundary = np.asarray(boundary_edges).astype(int)
+    owners = elements[boundary_elements(elements, boundary)]
+
+    edge = nodal_points[boundary[:, 1]] - nodal_points[boundary[:, 0]]
+    normals = np.stack([edge[:, 1], -edge[:, 0]], axis=1)
+    outward = np.sum(normals * (nodal_points[boundary[:, 0]] - nodal_points[owners].mean(axis=1)), axis=1)
+    return owners, normals * np.sign(outward)[:, None]
@@ -0,0 +1,111 @@
+import numpy as np
+import scipy.sparse as sps
+
+import assemble_load_vector as loadvec
+import assemble_stiffness_matrix as stiffmat
+
+
+class IncrementalAssembly:
+    '''
+        Stiffness matrix and load vector that are updated in place when nodal points move.
+        ----------------
+        Inputs:
+            num_nodes (int): Total number of nodes in the finite element mesh
+            nodal_points (ndarray): the nodal_points we get from the mesh generation (copied)
+            elements (ndarray): the elements we get from mesh generation
+            right_hand_side: the function on the right hand side of the original poisson equation (f(x, y))
+        ----------------
+        Attributes:
+            A: the num_nodes x num_nodes CSR stiffness matrix, as sparse_stiffness_matrix()
+            F: the load vector, as assemble_load_vector.vectorized_load_vector()
+            nodal_points (ndarray): the current nodal points
+        ----------------
+        Long description:
+            The sparsity pattern of A only depends on the elements, so it is built once
+            together with, for every entry of every elemental matrix, its position in
+            A.data, and a node -> element adjacency index (the elements touching node i
+            are adjacent[adjacent_start[i]:adjacent_start[i + 1]]). move_nodes() then
+            recomputes the elemental matrices and load vectors of the elements that touch
+            the moved nodes only, and the entries of A.data and F they touch are set to
+            the sum of the current contributions of all elements that share them. Adding
+            the differences of the old and new contributions instead would let rounding
+            errors build up over many updates, while this way every entry is as accurate
+            as after a full assembly, however many updates there were. The cost of an
+            update is proportional to the number of affected elements and their
+            neighbours, not to the size of the mesh, and A and F are the same objects
+            before and after the update. Changing the elements themselves changes the
+            pattern, so it needs a new IncrementalAssembly.
+    '''
+    def __init__(self, num_nodes, nodal_points, elements, right_hand_side = loadvec.zero_func):
+        self.num_nodes = num_nodes
+        self.nodal_points = np.array(nodal_points, dtype=float)
+        self.elements = np.asarray(elements, dtype=int)
+        self.right_hand_side = right_hand_side
+
+        # Fixed pattern, and the position in A.data of every elemental matrix entry
+        rows = np.repeat(self.elements, 3, axis=1).ravel()
+        cols = np.tile(self.elements, (1, 3)).ravel()
+        A_k = stiffmat.elemental_stiffness_matrices(self.nodal_points, self.elements)
+        self.A = sps.coo_matrix((A_k.ravel(), (rows, cols)), shape=(num_nodes, num_nodes)).tocsr()
+        self.A.sort_indices()
+        entry_rows = np.repeat(np.arange(num_nodes, dtype=np.int64), np.diff(self.A.indptr))
+        keys = entry_rows * num_nodes + self.A.indices
+        self.positions = np.searchsorted(keys, rows.astype(np.int64) * num_nodes + cols).reshape(-1, 9)
+
+        F_k = loadvec.elemental_load_vectors(self.nodal_points, self.elements, right_hand_side)
+        self.F = np.bincount(self.elements.ravel(), weights=F_k.ravel(), minlength=num_nodes)
+
+        # Node -> element adjacency
+        self.adjacent = np.argsort(self.elements.ravel(), kind="stable") // 3
+        self.adjacent_start = np.concatenate([[0], np.cumsum(np.bincount(self.elements.ravel(), minlength=num_nodes))])
+
+    def elements_of(self, nodes):
+        '''
+            Returns the sorted indices of the elements that have at least one of the nodes as a vertex.
+        '''
+        nodes = np.atleast_1d(np.asarray(nodes, dtype=int))
+        start = self.adjacent_start[nodes]
+        length = self.adjacent_start[nodes + 1] - start
+        offsets = np.arange(np.sum(length)) - np.repeat(np.cumsum(length) - length, length)
+        return np.unique(self.adjacent[np.repeat(start, length) + offsets])
+
+    def move_nodes(self, nodes, new_points):
+        '''
+            Moves nodes to new_points and updates A and F in place.
+            ----------------
+            Inputs:
+                nodes (ndarray): indices of the nodes that move
+                new_points (ndarray): len(nodes) x 2 array with their new coordinates
+            ----------------
+            Output:
+                affected (ndarray): indices of the elements whose contributions were recomputed
+            ----------------
+            Raises:
+                ValueError: If new_points does not have one point per node
+        '''
+        nodes = np.atleast_1d(np.asarray(nodes, dtype=int))
+        new_points = np.reshape(np.asarray(new_points, dtype=float), (-1, 2))
+        if (len(new_points) != len(nodes)):
+            raise ValueError (f"Need {len(nodes)} new points, but got {len(new_points)}")
+
+        affected = self.elements_of(nodes)
+        self.nodal_points[nodes] = new_points
+
+        # Every element that contributes to a touched entry shares its nodes with an affected element
+        touched_nodes = np.unique(self.elements[affected])
+        touched_positions = np.unique(self.positions[affected])
+        around = self.elements_of(touched_nodes)
+        elements = self.elements[around]
+        A_k = stiffmat.elemental_stiffness_matrices(self.nodal_points, elements).ravel()
+        F_k = loadvec.elemental_load_vectors(self.nodal_points, elements, self.right_hand_side).ravel()
+
+        positions = self.positions[around].ravel()
+        keep = np.isin(positions, touched_positions)
+        self.A.data[touched_positions] = 0
+        np.add.at(self.A.data, positions[keep], A_k[keep])
+
+        element_nodes = elements.ravel()
+        keep = np.isin(element_nodes, touched_nodes)
+        self.F[touched_nodes] = 0
+        np.add.at(self.F, element_nodes[keep], F_k[keep])
+        return affected
@@ -1,8 +1,11 @@
 import numpy as np
 
+import export
+import polynomial
 import solver
 import plotting
 
+import logging
 import sys
 
 
@@ -19,20 +22,46 @@ def run_program(args):
                           for example: x**2+y**2+1 <- this can be written into 
                           the command line
                 verbose: true/false whether or not you want the prints during the run (default True)
+                The flag --engine=<engine> can be given anywhere among the arguments to choose
+                how the linear system is solved: auto or any engine in solver.ENGINES
+                (dense, sparse, banded, iterative, mixed_precision) or
+                solver.SPECIAL_ENGINES (matrix_free, domain_decomposition, radial, polar,
+                polar_cg), see solver.solver() for what they do.
+                By default the engine is chosen automatically by solver.plan_engine().
+                The flag --output=<file> writes the mesh and the solution to a binary .vtu
+                or .xmf file (see export.py) instead of plotting them.
         ----------------
         Output:
             -
         ----------------
         Raises:
-            -
+            ValueError: If the engine is unknown, or if no engine fits in memory,
+                        or if the output file is neither .vtu nor .xmf
         ----------------
         Long description:
             This function runs the whole program which solves the 2D poisson problem
             nabla^2 u(x, y) = -f(x, y),
             where f is given at the top of this file. The input variable num_nodes
-            gives the total number of nodes in the FEM mesh. 
+            gives the total number of nodes in the FEM mesh. If the function is a
+            polynomial in x and y (see polynomial.parse_polynomial()), the load vector
+            is integrated exactly instead of with quadrature.
 
     '''
+    # Separate the flags from the positional arguments
+    engine = "auto"
+    output = None
+    positional_args = []
+    for arg in args:
+        if arg.startswith("--engine="):
+            engine = arg[len("--engine="):]
+        elif arg.startswith("--output="):
+            output = arg[len("--output="):]
+        else:
+            positional_args.append(arg)
+    args = positional_args
+    if (output is not None and not output.endswith((".vtu", ".xmf"))):
+        raise ValueError (f"The output file needs to be a .vtu or .xmf file, but is {output}")
+
     def right_hand_side_f(x, y):
         '''
             This function gives the right hand side of the Poisson problem. 
@@ -58,6 +87,10 @@ def run_program(args):
 
         return func_val
     
+    # Polynomial right hand sides are integrated exactly
+    polynomial_f = polynomial.parse_polynomial(args[1])
+    rhs = right_hand_side_f if polynomial_f is None else polynomial_f
+
     verbose = True
     if len(args) > 2:
         verbose_arg = args[2]
@@ -67,8 +100,19 @@ def run_program(args):
     # Find numerical solution and mesh
     num_nodes = int(args[0])
     if (verbose):
+        logging.basicConfig(level = logging.INFO, format = "%(message)s")
         print("Running the solver...")
-    sol, nodal_points, elements, boundary_edges = solver.solver(num_nodes, right_hand_side_f)
+    sol, nodal_points, elements, boundary_edges = solver.solver(num_nodes, rhs, engine = engine)
+
+    # Write the result to file instead of plotting it
+    if (output is not None):
+        if (verbose):
+            print(f"Writing the mesh and the numerical solution to {output}")
+        if output.endswith(".vtu"):
+            export.write_vtu(output, nodal_points, elements, boundary_edges, {"solution": sol})
+        else:
+            export.write_xdmf(output, nodal_points, elements, boundary_edges, sol)
+        return
 
     # Plot mesh
     if (verbose):
@@ -0,0 +1,173 @@
+import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.csgraph as spcg
+import scipy.sparse.linalg as spsla
+
+import inspect
+import logging
+
+import generate_mesh as mesh
+import incremental_assembly
+import numerical_integration as numint
+import solver as linear_solver
+
+logger = logging.getLogger(__name__)
+
+
+def newton_solver(num_nodes, right_hand_side, derivative = None, tolerance = 1e-10, max_iterations = 50,
+                  inexact = False, initial_guess = None, absolute_tolerance = 1e-10):
+    '''
+        Solves the semilinear poisson problem nabla^2 u(x, y) = -f(x, y, u) with Newton's method.
+        ----------------
+        Inputs:
+            num_nodes (int): Total number of nodes in the finite element mesh
+            right_hand_side: the function f(x, y, u) on the right hand side, called with arrays
+            derivative: the function df/du(x, y, u) (default: a finite difference of f in u)
+            tolerance (float): the iteration stops when the residual has been reduced by this factor
+            max_iterations (int): maximum number of Newton steps
+            inexact (bool): if True, every Newton step is solved only approximately with
+                            conjugate gradients, see the long description
+            initial_guess (ndarray): starting value of length num_nodes (default: zero).
+                                     The boundary values are set to zero.
+            absolute_tolerance (float): the iteration also stops when the norm of the residual
+                                        is below this value
+        ----------------
+        Output:
+            sol: A vector of length num_nodes that is the solution at the nodal points
+            nodal_points (ndarray): the nodal_points we get from the mesh generation
+            elements (ndarray): the elements we get from mesh generation
+            boundary_edges (ndarray): list of boundary edges we get from mesh generation
+        ----------------
+        Raises:
+            ValueError: If right_hand_side does not accept 3 arguments
+        ----------------
+        Long description:
+            The discrete problem is R(u) = A u - F(u) = 0 on the interior nodes, where A is
+            the stiffness matrix and F(u)_i is the integral of f(x, y, u_h) phi_i, computed
+            with the 4-point rule. The Jacobian is J(u) = A - M(u) with the weighted mass
+            matrix M(u)_ij = integral of df/du phi_i phi_j, which has the same sparsity
+            pattern as A. A is assembled once and the Jacobians are written into its
+            pattern (incremental_assembly.IncrementalAssembly), the unknowns are ordered
+            once with reverse Cuthill-McKee, and every Jacobian is factorized in that
+            ordering with permc_spec="NATURAL", so no Newton step computes an ordering
+            again. With inexact set, the step J d = -R is instead solved with conjugate
+            gradients, preconditioned by the factorization of A, up to the relative
+            residual min(0.1, |R| / |R_0|), which is loose far from the solution and tight
+            close to it. The Jacobian must then be positive definite, which holds when
+            df/du <= 0. Every step is followed by a backtracking line search on |R|. If
+            no step length down to 1e-3 reduces |R| (for example with a wrong derivative),
+            a warning is logged and the last iterate is returned. The iteration stops when
+            |R| <= max(tolerance |R_0|, absolute_tolerance), so that an initial guess that
+            is already solved to round-off does not end in a failed line search.
+            The number of Newton steps is logged.
+    '''
+    if (len(inspect.signature(right_hand_side).parameters) != 3):
+        raise ValueError ("The right hand side needs to be able to accept three inputs (x, y, u)")
+    if derivative is None:
+        derivative = finite_difference_derivative(right_hand_side)
+
+    nodal_points, elements, boundary_edges = mesh.generate_mesh(num_nodes)
+    elements = np.asarray(elements, dtype=int)
+    interior = linear_solver.interior_nodes(num_nodes, boundary_edges)
+
+    # Stiffness matrix with the positions of the elemental entries in its pattern
+    assembly = incremental_assembly.IncrementalAssembly(num_nodes, nodal_points, elements)
+    A = assembly.A
+
+    # Quadrature points and weights of all elements, fixed for the mesh
+    z, rho = numint.quadrature_rule(4)
+    p = nodal_points[elements]
+    d1 = p[:, 1] - p[:, 0]
+    d2 = p[:, 2] - p[:, 0]
+    weights = 0.5 * np.abs(d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0])[:, None] * rho
+    x = p[:, :, 0] @ z.T
+    y = p[:, :, 1] @ z.T
+
+    def residual(u):
+        u_q = u[elements] @ z.T
+        f = np.broadcast_to(right_hand_side(x, y, u_q), u_q.shape)
+        F = np.bincount(elements.ravel(), weights=((weights * f) @ z).ravel(), minlength=num_nodes)
+        return (A @ u - F)[interior]
+
+    def jacobian_values(u):
+        u_q = u[elements] @ z.T
+        g = np.broadcast_to(derivative(x, y, u_q), u_q.shape)
+        M_k = np.einsum("kq,qa,qb->kab", weights * g, z, z)
+        return A.data - np.bincount(assembly.positions.ravel(), weights=M_k.ravel(), minlength=len(A.data))
+
+    # Ordering of the interior unknowns, computed once. The data of J[nodes][:, nodes] is
+    # J.data[take], found by extracting the submatrix of a matrix that holds the positions.
+    # The indices are sorted first, as splu() would otherwise sort the shared arrays in place.
+    A_interior = A[interior][:, interior]
+    perm = spcg.reverse_cuthill_mckee(A_interior.tocsr(), symmetric_mode=True)
+    nodes = interior[perm]
+    position_matrix = sps.csr_matrix((np.arange(1, len(A.data) + 1, dtype=float), A.indices, A.indptr), shape=A.shape)
+    reordered = position_matrix[nodes][:, nodes]
+    reordered.sort_indices()
+    take = reordered.data.astype(np.int64) - 1
+
+    def factorize(values):
+        # J is symmetric, so its CSR arrays are also its CSC arrays
+        return spsla.splu(sps.csc_matrix((values[take], reordered.indices, reordered.indptr), shape=reordered.shape),
+                          permc_spec="NATURAL")
+
+    def solve(factor, b):
+        d = np.empty_like(b)
+        d[perm] = factor.solve(b[perm])
+        return d
+
+    if inexact:
+        A_factor = factorize(A.data)
+        preconditioner = spsla.LinearOperator(A_interior.shape, matvec=lambda r: solve(A_factor, np.ravel(r)))
+
+    u = np.zeros(num_nodes) if initial_guess is None else np.array(initial_guess, dtype=float)
+    u[np.setdiff1d(np.arange(num_nodes), interior)] = 0
+    R = residual(u)
+    norm_R0 = np.linalg.norm(R)
+    norm_R = norm_R0
+    target = max(tolerance * norm_R0, absolute_tolerance)
+
+    iterations = 0
+    while (norm_R > target and iterations < max_iterations):
+        iterations += 1
+        values = jacobian_values(u)
+        if inexact:
+            J = sps.csr_matrix((values, A.indices, A.indptr), shape=A.shape)[interior][:, interior]
+            d = linear_solver.conjugate_gradient(J, -R, min(0.1, norm_R / norm_R0), M=preconditioner)
+        else:
+            d = solve(factorize(values), -R)
+
+        # Backtracking line search on the norm of the residual
+        step = 1.0
+        while (step >= 1e-3):
+            u_new = u.copy()
+            u_new[interior] += step * d
+            R_new = residual(u_new)
+            if (np.linalg.norm(R_new) <= (1 - 1e-4 * step) * norm_R):
+                break
+            step /= 2
+        else:
+            logger.warning("Newton step %d: the line search found no step that reduces the residual, "
+                           "returning the last iterate", iterations)
+            break
+        u, R = u_new, R_new
+        norm_R = np.linalg.norm(R)
+        logger.info("Newton step %d: step length %g, relative residual %.3g", iterations, step, norm_R / max(norm_R0, 1e-300))
+
+    if (norm_R > target):
+        logger.warning("Newton's method stopped after %d steps at relative residual %.3g", iterations, norm_R / norm_R0)
+    else:
+        logger.info("Newton's method converged in %d steps", iterations)
+
+    return u, nodal_points, elements, boundary_edges
+
+#----------------------------------------------------------------------------------------
+
+def finite_difference_derivative(right_hand_side):
+    '''
+        Returns a function that approximates df/du(x, y, u) with a forward difference in u.
+    '''
+    def derivative(x, y, u):
+        h = np.sqrt(np.finfo(float).eps) * (1 + np.abs(u))
+        return (right_hand_side(x, y, u + h) - right_hand_side(x, y, u)) / h
+    return derivative
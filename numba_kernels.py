@@ -0,0 +1,134 @@
+import numpy as np
+
+'''
+    Element kernels for the optional Numba backend of the assembly routines.
+    Numba is not a requirement: without it, NUMBA_AVAILABLE is False, the assembly
+    routines use their NumPy implementation, and the kernels below stay plain python
+    functions (slow, but they give the same results).
+'''
+try:
+    import numba
+except ImportError:
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+
+if NUMBA_AVAILABLE:
+    jit = numba.njit(parallel=True, cache=True)
+    serial_jit = numba.njit(cache=True)
+    prange = numba.prange
+else:
+    def jit(function):
+        return function
+    serial_jit = jit
+    prange = range
+
+
+#----------------------------------------------------------------------------------------
+
+def is_jitted(function):
+    '''
+        Checks whether a function is compiled by Numba, so it can be called from the kernels.
+    '''
+    return NUMBA_AVAILABLE and isinstance(function, numba.core.registry.CPUDispatcher)
+
+#----------------------------------------------------------------------------------------
+
+@jit
+def element_geometry(nodal_points, elements):
+    '''
+        Kernel version of assemble_stiffness_matrix.element_geometry().
+        Returns the num_elements x 3 x 2 basis gradients and the num_elements areas.
+    '''
+    num_elements = elements.shape[0]
+    gradients = np.empty((num_elements, 3, 2))
+    areas = np.empty(num_elements)
+    for k in prange(num_elements):
+        x1 = nodal_points[elements[k, 0], 0]
+        y1 = nodal_points[elements[k, 0], 1]
+        x2 = nodal_points[elements[k, 1], 0]
+        y2 = nodal_points[elements[k, 1], 1]
+        x3 = nodal_points[elements[k, 2], 0]
+        y3 = nodal_points[elements[k, 2], 1]
+
+        # Twice the signed area
+        det = (x2 - x1) * (y3 - y1) - (y2 - y1) * (x3 - x1)
+
+        gradients[k, 0, 0] = (y2 - y3) / det
+        gradients[k, 0, 1] = (x3 - x2) / det
+        gradients[k, 1, 0] = (y3 - y1) / det
+        gradients[k, 1, 1] = (x1 - x3) / det
+        gradients[k, 2, 0] = (y1 - y2) / det
+        gradients[k, 2, 1] = (x2 - x1) / det
+        areas[k] = 0.5 * abs(det)
+    return gradients, areas
+
+#----------------------------------------------------------------------------------------
+
+@jit
+def stiffness_values(nodal_points, elements):
+    '''
+        Computes all elemental stiffness matrices, returned as a num_elements x 3 x 3 array.
+    '''
+    gradients, areas = element_geometry(nodal_points, elements)
+    num_elements = elements.shape[0]
+    A_k = np.empty((num_elements, 3, 3))
+    for k in prange(num_elements):
+        for alpha in range(3):
+            for beta in range(3):
+                A_k[k, alpha, beta] = areas[k] * (gradients[k, alpha, 0] * gradients[k, beta, 0]
+                                                  + gradients[k, alpha, 1] * gradients[k, beta, 1])
+    return A_k
+
+#----------------------------------------------------------------------------------------
+
+@jit
+def load_values(nodal_points, elements, z, rho, right_hand_side):
+    '''
+        Computes all elemental load vectors, returned as a num_elements x 3 array.
+        ----------------
+        Long description:
+            right_hand_side is called with one scalar point at a time, so it can contain
+            branches that are awkward to vectorize. With Numba it must be compiled with
+            numba.njit itself.
+    '''
+    num_elements = elements.shape[0]
+    Fh = np.zeros((num_elements, 3))
+    for k in prange(num_elements):
+        x1 = nodal_points[elements[k, 0], 0]
+        y1 = nodal_points[elements[k, 0], 1]
+        x2 = nodal_points[elements[k, 1], 0]
+        y2 = nodal_points[elements[k, 1], 1]
+        x3 = nodal_points[elements[k, 2], 0]
+        y3 = nodal_points[elements[k, 2], 1]
+        area = 0.5 * abs((x2 - x1) * (y3 - y1) - (y2 - y1) * (x3 - x1))
+
+        for q in range(z.shape[0]):
+            x = z[q, 0] * x1 + z[q, 1] * x2 + z[q, 2] * x3
+            y = z[q, 0] * y1 + z[q, 1] * y2 + z[q, 2] * y3
+            weight = area * rho[q] * right_hand_side(x, y)
+            # The local basis function alpha equals the barycentric coordinate z[q, alpha]
+            for alpha in range(3):
+                Fh[k, alpha] += weight * z[q, alpha]
+    return Fh
+
+#----------------------------------------------------------------------------------------
+
+@jit
+def stiffness_matvec(elements, gradients_x, gradients_y, u):
+    '''
+        Applies the matrix-free stiffness matrix of assemble_stiffness_matrix.StiffnessOperator.
+        elements, gradients_x and gradients_y are 3 x num_elements arrays, the gradients
+        scaled by the square root of the element area. The scatter is not thread safe,
+        so the loop over the elements is serial.
+    '''
+    result = np.zeros(u.shape[0])
+    for k in range(elements.shape[1]):
+        gradient_x = 0.0
+        gradient_y = 0.0
+        for alpha in range(3):
+            gradient_x += gradients_x[alpha, k] * u[elements[alpha, k]]
+            gradient_y += gradients_y[alpha, k] * u[elements[alpha, k]]
+        for alpha in range(3):
+            result[elements[alpha, k]] += gradients_x[alpha, k] * gradient_x + gradients_y[alpha, k] * gradient_y
+    return result
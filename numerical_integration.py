@@ -1,5 +1,57 @@
 import numpy as np
 
+def quadrature_rule(N_q : int):
+    '''
+        Returns the barycentric integration points and weights of the Gaussian
+        quadrature rule on a triangle with N_q integration points.
+        ----------------
+        Inputs:
+            N_q: number of integration points in gaussian quadrature,
+                 type: int
+                 options: 1, 3, 4, 7
+        ----------------
+        Outputs:
+            z (ndarray): N_q x 3 array of barycentric coordinates of the integration points
+            rho (ndarray): N_q array of integration weights (they sum to 1)
+        ----------------
+        Raises:
+            ValueError:
+                N_q is not an integer in [1, 3, 4, 7].
+        ----------------
+        Long description:
+            The rules with 1, 3, 4 and 7 points integrate polynomials up to degree 1, 2, 3
+            and 5 exactly. The rules are shared between gaussian_quadrature_2D(), which integrates over
+            a single triangle, and the vectorized assembly routines, which evaluate the
+            integrand on all elements at once.
+    '''
+    if(N_q == 1):
+        z = np.array([np.array([1/3, 1/3, 1/3])])
+        rho = np.array([1])
+
+    elif(N_q == 3):
+        z = np.array([np.array([1/2, 1/2, 0]), np.array([1/2, 0, 1/2]), np.array([0, 1/2, 1/2])])
+        rho = np.array([1/3, 1/3, 1/3])
+
+    elif(N_q == 4):
+        z = np.array([np.array([1/3, 1/3, 1/3]), np.array([3/5, 1/5, 1/5]),
+                      np.array([1/5, 3/5, 1/5]), np.array([1/5, 1/5, 3/5])])
+        rho = np.array([-9/16, 25/48, 25/48, 25/48])
+
+    elif(N_q == 7):
+        a1 = (6 - np.sqrt(15)) / 21
+        a2 = (6 + np.sqrt(15)) / 21
+        z = np.array([np.array([1/3, 1/3, 1/3]),
+                      np.array([1 - 2*a1, a1, a1]), np.array([a1, 1 - 2*a1, a1]), np.array([a1, a1, 1 - 2*a1]),
+                      np.array([1 - 2*a2, a2, a2]), np.array([a2, 1 - 2*a2, a2]), np.array([a2, a2, 1 - 2*a2])])
+        rho = np.array([9/40] + 3*[(155 - np.sqrt(15)) / 1200] + 3*[(155 + np.sqrt(15)) / 1200])
+
+    else:
+        raise ValueError (f"N_q needs to be either 1, 3, 4 or 7, but is {N_q}")
+
+    return z, rho
+
+#----------------------------------------------------------------------------------------
+
 def gaussian_quadrature_2D(p1, p2, p3, N_q : int, g):
     '''
         Integrates the function g over the span of the triangle formed by the three corner points 
@@ -14,7 +66,7 @@ def gaussian_quadrature_2D(p1, p2, p3, N_q : int, g):
                 list or numpy array of size 2
             N_q: number of integration points in gaussian quadrature, 
                  type: int
-                 options: 1, 2, 3, 4
+                 options: 1, 3, 4, 7
             g: function to be integrated on the triangle given by (p1, p2, p3)
         
         Outputs:
@@ -23,7 +75,7 @@ def gaussian_quadrature_2D(p1, p2, p3, N_q : int, g):
         Raises:
             ValueError:
                 If any of p1, p2 or p3 has the wrong length.
-                N_q is not an integer in [1, 3, 4].
+                N_q is not an integer in [1, 3, 4, 7].
                 g is not a function
         ----------------
         Long description: 
@@ -39,25 +91,14 @@ def gaussian_quadrature_2D(p1, p2, p3, N_q : int, g):
         raise ValueError (f"The corner point p1 should have length 2 but has length {len(p1)}.")
     if (len(p3) != 2):
         raise ValueError (f"The corner point p1 should have length 2 but has length {len(p1)}.")
-    if (N_q != 1 and N_q != 3 and N_q != 4):
-        raise ValueError (f"N_q needs to be either 1, 3, or 4, but is {N_q}")
+    if (N_q != 1 and N_q != 3 and N_q != 4 and N_q != 7):
+        raise ValueError (f"N_q needs to be either 1, 3, 4 or 7, but is {N_q}")
     if (not callable(g)):
         raise ValueError (f"g needs to be a function, but is now of type {type(g)}")
     
     #Setting integration points and weights
-    if(N_q == 1):
-        z = np.array([np.array([1/3, 1/3, 1/3])])
-        rho = np.array([1])
-    
-    elif(N_q == 3):
-        z = np.array([np.array([1/2, 1/2, 0]), np.array([1/2, 0, 1/2]), np.array([0, 1/2, 1/2])])
-        rho = np.array([1/3, 1/3, 1/3])
-    
-    elif(N_q == 4):
-        z = np.array([np.array([1/3, 1/3, 1/3]), np.array([3/5, 1/5, 1/5]),
-                      np.array([1/5, 3/5, 1/5]), np.array([1/5, 1/5, 3/5])])
-        rho = np.array([-9/16, 25/48, 25/48, 25/48])
-    
+    z, rho = quadrature_rule(N_q)
+
     # Calculate the area of a triangle given by (p1, p2, p3)
     area = 0.5 * np.abs(p1[0]*(p2[1] - p3[1]) + p2[0]*(p3[1]-p1[1]) + p3[0]*(p1[1]-p2[1]))
 
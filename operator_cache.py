@@ -0,0 +1,393 @@
+import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.linalg as spsla
+
+import assemble_stiffness_matrix as stiffmat
+import numba_kernels
+
+import hashlib
+import os
+import tempfile
+
+# Where operators are stored when no cache directory is given
+DEFAULT_CACHE_DIR = os.environ.get("POISSON_CACHE_DIR",
+                                   os.path.join(os.path.expanduser("~"), ".cache", "poisson_fem"))
+# Total size of the stored operators before the least recently used ones are evicted
+DEFAULT_MAX_BYTES = 2 * 1024**3
+# Widest supernode of a stored factor, and how many explicit zeros its dense block may add
+SUPERNODE_WIDTH = 16
+SUPERNODE_FILL = 1.5
+# Arrays of a factor packed by pack_supernodes(), in the order the solves take them
+PACKED_FIELDS = ["starts", "rows_ptr", "rows", "block_ptr", "values"]
+
+
+#----------------------------------------------------------------------------------------
+
+@numba_kernels.serial_jit
+def supernode_partition(indptr, indices, max_width, max_fill):
+    '''
+        Splits the columns of a strictly lower triangular CSC matrix (indptr, indices, sorted)
+        into supernodes, runs of consecutive columns stored as one dense block. A column
+        joins the current supernode while the supernode is at most max_width columns wide
+        and its dense block holds at most max_fill times as many entries as the matrix.
+        Returns the first column of every supernode, followed by the number of columns.
+    '''
+    n = indptr.shape[0] - 1
+    starts = [0]
+    first = 0
+    # Rows below the current supernode, and the number of nonzeros in its columns
+    rows = indices[indptr[0]:indptr[1]].copy()
+    nonzeros = rows.shape[0]
+    for j in range(1, n):
+        column = indices[indptr[j]:indptr[j + 1]]
+        merged = np.empty(rows.shape[0] + column.shape[0], indices.dtype)
+        p = 0
+        q = 0
+        m = 0
+        while (p < rows.shape[0] or q < column.shape[0]):
+            if (q == column.shape[0] or (p < rows.shape[0] and rows[p] < column[q])):
+                row = rows[p]
+                p += 1
+            elif (p == rows.shape[0] or column[q] < rows[p]):
+                row = column[q]
+                q += 1
+            else:
+                row = rows[p]
+                p += 1
+                q += 1
+            if (row != j):
+                merged[m] = row
+                m += 1
+        width = j + 1 - first
+        if (width <= max_width and width * (width - 1) // 2 + width * m <= max_fill * (nonzeros + column.shape[0])):
+            rows = merged[:m]
+            nonzeros += column.shape[0]
+        else:
+            starts.append(j)
+            first = j
+            rows = column.copy()
+            nonzeros = column.shape[0]
+    starts.append(n)
+    return np.array(starts)
+
+#----------------------------------------------------------------------------------------
+
+@numba_kernels.serial_jit
+def pack_supernodes(indptr, indices, data, starts):
+    '''
+        Stores a strictly lower triangular CSC matrix by the supernodes of supernode_partition().
+        Supernode s holds the columns a = starts[s] to b = starts[s+1]. Its dense block
+        values[block_ptr[s]:block_ptr[s+1]] is the (b-a) x (b-a) diagonal block followed
+        by the rows rows[rows_ptr[s]:rows_ptr[s+1]] below it, both in row-major order.
+    '''
+    n = indptr.shape[0] - 1
+    num_supernodes = starts.shape[0] - 1
+    rows_ptr = np.zeros(num_supernodes + 1, np.int64)
+    block_ptr = np.zeros(num_supernodes + 1, np.int64)
+    # mark[i] == s once row i is counted for supernode s
+    mark = np.full(n, -1, np.int64)
+    for s in range(num_supernodes):
+        a = starts[s]
+        b = starts[s + 1]
+        count = 0
+        for p in range(indptr[a], indptr[b]):
+            if (indices[p] >= b and mark[indices[p]] != s):
+                mark[indices[p]] = s
+                count += 1
+        rows_ptr[s + 1] = rows_ptr[s] + count
+        block_ptr[s + 1] = block_ptr[s] + (b - a) * (b - a + count)
+
+    rows = np.empty(rows_ptr[num_supernodes], indices.dtype)
+    values = np.zeros(block_ptr[num_supernodes])
+    position = np.full(n, -1, np.int64)
+    for s in range(num_supernodes):
+        a = starts[s]
+        b = starts[s + 1]
+        width = b - a
+        count = rows_ptr[s]
+        for p in range(indptr[a], indptr[b]):
+            if (indices[p] >= b and position[indices[p]] < rows_ptr[s]):
+                position[indices[p]] = count
+                rows[count] = indices[p]
+                count += 1
+        rows[rows_ptr[s]:count].sort()
+        for q in range(rows_ptr[s], count):
+            position[rows[q]] = q
+        for k in range(width):
+            for p in range(indptr[a + k], indptr[a + k + 1]):
+                i = indices[p]
+                if (i < b):
+                    values[block_ptr[s] + (i - a) * width + k] = data[p]
+                else:
+                    values[block_ptr[s] + width * width + (position[i] - rows_ptr[s]) * width + k] = data[p]
+    return rows_ptr, rows, block_ptr, values
+
+#----------------------------------------------------------------------------------------
+
+@numba_kernels.serial_jit
+def supernodal_lower_solve(starts, rows_ptr, rows, block_ptr, values, x):
+    '''
+        Solves L y = x in place for the unit lower triangular L = I + T, with T packed by
+        pack_supernodes(). The rows below a supernode are updated with one matrix-vector
+        product, which runs in BLAS like the supernodal solve of SuperLU.
+    '''
+    for s in range(starts.shape[0] - 1):
+        a = starts[s]
+        b = starts[s + 1]
+        width = b - a
+        offset = block_ptr[s]
+        for i in range(a, b):
+            value = x[i]
+            for k in range(i - a):
+                value -= values[offset + (i - a) * width + k] * x[a + k]
+            x[i] = value
+        num_rows = rows_ptr[s + 1] - rows_ptr[s]
+        if (num_rows > 0):
+            block = values[offset + width * width:block_ptr[s + 1]].reshape((num_rows, width))
+            update = np.dot(block, x[a:b].copy())
+            for q in range(num_rows):
+                x[rows[rows_ptr[s] + q]] -= update[q]
+    return x
+
+#----------------------------------------------------------------------------------------
+
+@numba_kernels.serial_jit
+def supernodal_upper_solve(starts, rows_ptr, rows, block_ptr, values, inverse_diagonal, x):
+    '''
+        Solves U y = x in place for the upper triangular U = D + T^T, where T is packed by
+        pack_supernodes() and inverse_diagonal holds the inverse of the diagonal D.
+    '''
+    for s in range(starts.shape[0] - 2, -1, -1):
+        a = starts[s]
+        b = starts[s + 1]
+        width = b - a
+        offset = block_ptr[s]
+        num_rows = rows_ptr[s + 1] - rows_ptr[s]
+        update = np.zeros(width)
+        if (num_rows > 0):
+            x_rows = np.empty(num_rows)
+            for q in range(num_rows):
+                x_rows[q] = x[rows[rows_ptr[s] + q]]
+            block = values[offset + width * width:block_ptr[s + 1]].reshape((num_rows, width))
+            update = np.dot(x_rows, block)
+        for i in range(b - 1, a - 1, -1):
+            value = x[i] - update[i - a]
+            for j in range(i + 1, b):
+                value -= values[offset + (j - a) * width + (i - a)] * x[j]
+            x[i] = value * inverse_diagonal[i]
+    return x
+
+#----------------------------------------------------------------------------------------
+
+class TriangularFactor:
+    '''
+        Sparse LU factorization Pr A Pc = L U loaded from disk.
+        ----------------
+        Long description:
+            scipy's SuperLU objects cannot be serialized, but their factors and permutations
+            can. With Numba, the factors are also kept in supernodes, runs of columns of L
+            and rows of U stored as dense blocks (see pack_supernodes()), so solve() updates
+            each block with one BLAS call like SuperLU.solve() does, and is about as fast.
+            Packing costs about as much as a factorization, so it is done once, when the
+            operator is stored, and the packed blocks are stored next to the factors.
+            Without Numba, solve() uses scipy.sparse.linalg.spsolve_triangular() on L and U,
+            which is slower per solve but still skips the factorization.
+    '''
+    def __init__(self, L, U, perm_r, perm_c, packed = None):
+        self.L = L.tocsr()
+        self.U = U.tocsr()
+        self.perm_r = perm_r
+        self.perm_c = perm_c
+        self.shape = self.L.shape
+        self.packed = packed
+        if (packed is None and numba_kernels.NUMBA_AVAILABLE):
+            self.packed = self.pack()
+
+    @classmethod
+    def from_superlu(cls, factor):
+        '''
+            Copies the factors of a scipy SuperLU object.
+        '''
+        return cls(factor.L, factor.U, factor.perm_r, factor.perm_c)
+
+    def pack(self):
+        '''
+            Returns the supernodes of L, those of U and the inverse of the diagonal of U.
+        '''
+        def pack(T):
+            T = T.tocsc()
+            T.sort_indices()
+            starts = supernode_partition(T.indptr, T.indices, SUPERNODE_WIDTH, SUPERNODE_FILL)
+            return (starts,) + pack_supernodes(T.indptr, T.indices, T.data, starts)
+
+        # The rows of U are packed as the columns of its transpose
+        return pack(sps.tril(self.L, -1)), pack(sps.triu(self.U, 1).T), 1 / self.U.diagonal()
+
+    def solve(self, b):
+        y = np.empty(len(b))
+        y[self.perm_r] = b
+        if self.packed is not None:
+            lower, upper, inverse_diagonal = self.packed
+            supernodal_lower_solve(*lower, y)
+            supernodal_upper_solve(*upper, inverse_diagonal, y)
+        else:
+            y = spsla.spsolve_triangular(self.L, y, lower=True, unit_diagonal=True)
+            y = spsla.spsolve_triangular(self.U, y, lower=False)
+        return y[self.perm_c]
+
+#----------------------------------------------------------------------------------------
+
+def operator_key(nodal_points, elements, interior):
+    '''
+        Computes the content address of the operator of a mesh.
+        ----------------
+        Inputs:
+            nodal_points (ndarray): the nodal_points we get from the mesh generation
+            elements (ndarray): the elements we get from mesh generation
+            interior (ndarray): indices of the interior nodes, see solver.interior_nodes()
+        ----------------
+        Output:
+            key (str): sha256 hex digest of the arrays and stiffmat.ASSEMBLY_VERSION
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            The stiffness matrix and its factorization only depend on the mesh and on how
+            the matrix is assembled, so any mesh with the same arrays gets the same key,
+            whatever the right hand side.
+    '''
+    digest = hashlib.sha256(f"assembly-{stiffmat.ASSEMBLY_VERSION}".encode())
+    for array, dtype in [(nodal_points, np.float64), (elements, np.int64), (interior, np.int64)]:
+        array = np.ascontiguousarray(array, dtype=dtype)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+#----------------------------------------------------------------------------------------
+
+def store_operator(path, A, interior, factor):
+    '''
+        Writes the stiffness matrix, the interior nodes and the TriangularFactor to path,
+        with its packed supernodes when it has them. The file is written under a temporary
+        name first, so readers never see a partially written file.
+    '''
+    arrays = {"interior": interior, "perm_r": factor.perm_r, "perm_c": factor.perm_c}
+    for name, matrix in [("A", A.tocsr()), ("L", factor.L), ("U", factor.U)]:
+        arrays.update({f"{name}_data": matrix.data, f"{name}_indices": matrix.indices,
+                       f"{name}_indptr": matrix.indptr, f"{name}_shape": np.array(matrix.shape)})
+    if factor.packed is not None:
+        lower, upper, inverse_diagonal = factor.packed
+        for name, packed in [("L", lower), ("U", upper)]:
+            arrays.update({f"{name}_{field}": array for field, array in zip(PACKED_FIELDS, packed)})
+        arrays["inverse_diagonal"] = inverse_diagonal
+
+    directory = os.path.dirname(path)
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            np.savez(file, **arrays)
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+#----------------------------------------------------------------------------------------
+
+def load_operator(path):
+    '''
+        Reads a file written by store_operator().
+        Returns the CSR stiffness matrix, the interior nodes and a TriangularFactor.
+        The stored supernodes are used when Numba is available, and packed again if the
+        file was written without them.
+    '''
+    with np.load(path) as data:
+        def csr(name):
+            return sps.csr_matrix((data[f"{name}_data"], data[f"{name}_indices"], data[f"{name}_indptr"]),
+                                  shape=tuple(data[f"{name}_shape"]))
+        A = csr("A")
+        interior = data["interior"]
+        packed = None
+        if (numba_kernels.NUMBA_AVAILABLE and "inverse_diagonal" in data):
+            lower, upper = [tuple(data[f"{name}_{field}"] for field in PACKED_FIELDS) for name in ["L", "U"]]
+            packed = (lower, upper, data["inverse_diagonal"])
+        factor = TriangularFactor(csr("L"), csr("U"), data["perm_r"], data["perm_c"], packed)
+    return A, interior, factor
+
+#----------------------------------------------------------------------------------------
+
+def evict(cache_dir, max_bytes):
+    '''
+        Removes the least recently used operators until the cache holds at most max_bytes.
+        The modification time of a file is updated whenever it is read, so it gives the
+        time of last use.
+    '''
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".npz"):
+            path = os.path.join(cache_dir, name)
+            try:
+                status = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((status.st_mtime, status.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+#----------------------------------------------------------------------------------------
+
+def cached_operator(num_nodes, nodal_points, elements, interior, cache_dir = None, max_bytes = DEFAULT_MAX_BYTES):
+    '''
+        Returns the stiffness matrix and its factorization, from disk when they are cached.
+        ----------------
+        Inputs:
+            num_nodes (int): Total number of nodes in the finite element mesh
+            nodal_points (ndarray): the nodal_points we get from the mesh generation
+            elements (ndarray): the elements we get from mesh generation
+            interior (ndarray): indices of the interior nodes, see solver.interior_nodes()
+            cache_dir (str): directory of the cache (default: DEFAULT_CACHE_DIR)
+            max_bytes (int): size of the cache before old operators are evicted
+        ----------------
+        Output:
+            A: num_nodes x num_nodes CSR stiffness matrix
+            factor: LU factorization of A restricted to the interior nodes, either a
+                    scipy SuperLU object or a TriangularFactor. Both have a solve() method.
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            On a miss, the stiffness matrix is assembled and factorized, and both are stored
+            under operator_key() before the least recently used operators are evicted. On a
+            hit, nothing is assembled or factorized, so solving for a new right hand side only
+            needs the load vector and the triangular solves of TriangularFactor.solve(). A
+            file that cannot be read is treated as a miss.
+    '''
+    cache_dir = DEFAULT_CACHE_DIR if cache_dir is None else cache_dir
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, operator_key(nodal_points, elements, interior) + ".npz")
+
+    if os.path.exists(path):
+        try:
+            A, cached_interior, factor = load_operator(path)
+            if np.array_equal(cached_interior, interior):
+                os.utime(path)
+                return A, factor
+        except (OSError, ValueError, KeyError):
+            pass
+
+    A = stiffmat.sparse_stiffness_matrix(num_nodes, nodal_points, elements)
+    factor = spsla.splu(A[interior][:, interior].tocsc())
+
+    store_operator(path, A, interior, TriangularFactor.from_superlu(factor))
+    evict(cache_dir, max_bytes)
+    return A, factor
@@ -0,0 +1,223 @@
+import numpy as np
+import scipy.fft
+import scipy.sparse as sps
+import scipy.sparse.linalg as spsla
+
+import generate_mesh as mesh
+
+'''
+    Fast Poisson solver on a polar grid of the unit disc.
+    The grid has num_radii rings of cells with centres at radii (j + 1/2) / num_radii and
+    num_angles equally spaced angles on every ring. The five point finite difference
+    Laplacian in polar coordinates is diagonalized in angle by the FFT, which leaves
+    one tridiagonal system in the radius per Fourier mode, so a solve costs
+    O(n log n) operations and O(n) memory for n grid points.
+'''
+
+
+#----------------------------------------------------------------------------------------
+
+def polar_grid_size(num_nodes):
+    '''
+        Returns the number of radii and angles of a polar grid with about the resolution
+        of the finite element mesh with num_nodes nodes: one ring of cells per circle of
+        generate_mesh.circle_data(), and an FFT friendly number of angles that is at
+        least the number of nodes on the outer circle.
+    '''
+    outward_circles, _, dof_in_circles, _ = mesh.circle_data(num_nodes)
+    return outward_circles, scipy.fft.next_fast_len(int(np.max(dof_in_circles)), real=True)
+
+#----------------------------------------------------------------------------------------
+
+class PolarPoissonSolver:
+    '''
+        Solves the finite difference poisson problem nabla^2 u = -f, u = 0 on the unit circle, on a polar grid.
+        ----------------
+        Long description:
+            Multiplied by the cell areas r_j h dtheta, the finite difference operator is a
+            symmetric positive definite matrix W L. Its radial part couples the rings
+            through the fluxes r_{j+1/2} (u_{j+1} - u_j) / h, where no flux passes through
+            the origin and u = 0 on r = 1 is imposed with a ghost cell. Its angular part
+            is circulant on every ring, so the real FFT turns W L into num_angles // 2 + 1
+            independent symmetric tridiagonal matrices. These are factorized once (Thomas
+            algorithm, vectorized over the modes) when the solver is created.
+            Grid functions are num_radii x num_angles arrays.
+    '''
+    def __init__(self, num_radii, num_angles):
+        if (num_radii < 1 or num_angles < 3):
+            raise ValueError (f"Need at least 1 radius and 3 angles, but got {num_radii} and {num_angles}")
+        self.num_radii = num_radii
+        self.num_angles = num_angles
+        self.h = 1 / num_radii
+        self.h_theta = 2 * np.pi / num_angles
+        self.radii = (np.arange(num_radii) + 0.5) * self.h
+        self.angles = np.arange(num_angles) * self.h_theta
+        self.areas = self.radii * self.h * self.h_theta
+
+        # Radial part: flux r_{j+1/2} / h between the rings j and j + 1, times dtheta
+        j = np.arange(num_radii)
+        off_diagonal = -self.h_theta * (j[:-1] + 1)
+        diagonal = self.h_theta * (2 * j + 1.0)
+        diagonal[-1] += self.h_theta * num_radii
+
+        # Angular part: eigenvalues 4 sin^2(m dtheta / 2) of minus the second difference
+        modes = np.arange(num_angles // 2 + 1)
+        eigenvalues = 4 * np.sin(modes * self.h_theta / 2)**2
+        diagonals = diagonal[:, None] + (self.h / (self.radii * self.h_theta))[:, None] * eigenvalues
+
+        # Thomas algorithm factorization, shared by all solves
+        self.off_diagonal = off_diagonal
+        self.inverse_pivots = np.empty_like(diagonals)
+        self.upper = np.zeros_like(diagonals)
+        self.inverse_pivots[0] = 1 / diagonals[0]
+        for i in range(1, num_radii):
+            self.upper[i - 1] = off_diagonal[i - 1] * self.inverse_pivots[i - 1]
+            self.inverse_pivots[i] = 1 / (diagonals[i] - off_diagonal[i - 1] * self.upper[i - 1])
+
+    def grid_points(self):
+        '''
+            Returns the x and y coordinates of the grid points as num_radii x num_angles arrays.
+        '''
+        return (np.outer(self.radii, np.cos(self.angles)), np.outer(self.radii, np.sin(self.angles)))
+
+    def apply_inverse(self, b):
+        '''
+            Returns (W L)^-1 b for a grid function b.
+        '''
+        b_hat = scipy.fft.rfft(np.reshape(b, (self.num_radii, self.num_angles)), axis=1)
+
+        # Forward and backward substitution for all modes at once
+        y = np.empty_like(b_hat)
+        y[0] = b_hat[0] * self.inverse_pivots[0]
+        for i in range(1, self.num_radii):
+            y[i] = (b_hat[i] - self.off_diagonal[i - 1] * y[i - 1]) * self.inverse_pivots[i]
+        for i in range(self.num_radii - 2, -1, -1):
+            y[i] -= self.upper[i] * y[i + 1]
+
+        return scipy.fft.irfft(y, n=self.num_angles, axis=1)
+
+    def solve(self, f):
+        '''
+            Returns the grid solution u of L u = f for the right hand side f on the grid.
+        '''
+        return self.apply_inverse(self.areas[:, None] * f)
+
+    def interpolation_matrix(self, points):
+        '''
+            Interpolation from the grid to arbitrary points in the unit circle.
+            ----------------
+            Inputs:
+                points (ndarray): num_points x 2 array of points, for example nodal_points
+            ----------------
+            Output:
+                P: sparse num_points x (num_radii * num_angles) matrix, P @ u.ravel() are
+                   the values of the grid function u at the points
+            ----------------
+            Raises:
+                -
+            ----------------
+            Long description:
+                The interpolation is bilinear in radius and angle (periodic). Between the
+                outer ring of cells and r = 1 the interpolation goes linearly to zero, and
+                inside the inner ring it goes linearly to the mean of the inner ring, which
+                is the value of the solution at the origin.
+        '''
+        points = np.asarray(points, dtype=float)
+        r = np.hypot(points[:, 0], points[:, 1])
+        s = np.mod(np.arctan2(points[:, 1], points[:, 0]), 2 * np.pi) / self.h_theta
+        k0 = np.floor(s).astype(int) % self.num_angles
+        k1 = (k0 + 1) % self.num_angles
+        a = s - np.floor(s)
+
+        t = r / self.h - 0.5
+        j0 = np.clip(np.floor(t).astype(int), -1, self.num_radii - 1)
+        b = t - j0
+
+        # Weight of the rings j0 and j0 + 1, ring -1 is the origin and ring num_radii is r = 1
+        inner = j0 < 0
+        weight_0 = np.where(inner, 0.0, 1 - b)
+        weight_1 = np.where(inner, r / self.radii[0], b)
+        outer = j0 == self.num_radii - 1
+        weight_0[outer] = np.clip(2 * (1 - r[outer]) / self.h, 0, 1)
+        weight_1[outer] = 0.0
+        ring_0 = np.maximum(j0, 0)
+        ring_1 = np.minimum(j0 + 1, self.num_radii - 1)
+
+        num_points = len(points)
+        rows = [np.repeat(np.arange(num_points), 4)]
+        cols = [np.stack([ring_0 * self.num_angles + k0, ring_0 * self.num_angles + k1,
+                          ring_1 * self.num_angles + k0, ring_1 * self.num_angles + k1], axis=1).ravel()]
+        values = [np.stack([weight_0 * (1 - a), weight_0 * a, weight_1 * (1 - a), weight_1 * a], axis=1).ravel()]
+
+        # Points inside the inner ring get the mean of the inner ring as their origin value
+        centre = np.flatnonzero(inner)
+        rows.append(np.repeat(centre, self.num_angles))
+        cols.append(np.tile(np.arange(self.num_angles), len(centre)))
+        values.append(np.repeat((1 - r[centre] / self.radii[0]) / self.num_angles, self.num_angles))
+
+        P = sps.coo_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                           shape=(num_points, self.num_radii * self.num_angles))
+        return P.tocsr()
+
+#----------------------------------------------------------------------------------------
+
+class PolarPreconditioner:
+    '''
+        Preconditioner for the finite element system A x = F on the interior nodes.
+        ----------------
+        Long description:
+            M^-1 r = P (W L)^-1 P^T r + D^-1 r, where P interpolates from the polar grid to
+            the interior nodes and D is the diagonal of A. P^T r moves the residual, which
+            is integrated against the basis functions, to the grid, where it approximates
+            W f, so the grid solve corrects the smooth part of the error. The oscillations
+            on the scale of the elements are not seen by the grid, and the Jacobi term D^-1
+            takes care of them. Together the number of conjugate gradient iterations does
+            not grow with the number of nodes. The preconditioner is symmetric positive
+            definite.
+    '''
+    def __init__(self, A, polar, nodal_points, interior):
+        self.polar = polar
+        self.P = polar.interpolation_matrix(np.asarray(nodal_points)[interior])
+        self.PT = self.P.T.tocsr()
+        self.inverse_diagonal = 1 / A.diagonal()
+        self.shape = A.shape
+
+    def apply(self, r):
+        r = np.asarray(r).ravel()
+        return self.P @ self.polar.apply_inverse(self.PT @ r).ravel() + self.inverse_diagonal * r
+
+    def as_linear_operator(self):
+        return spsla.LinearOperator(self.shape, matvec=self.apply)
+
+#----------------------------------------------------------------------------------------
+
+def polar_solver(num_nodes, right_hand_side, num_radii = None, num_angles = None):
+    '''
+        Solves the poisson problem with the polar grid solver and interpolates to the nodal points.
+        ----------------
+        Inputs:
+            num_nodes (int): Total number of nodes in the finite element mesh
+            right_hand_side: the function on the right hand side of the original poisson equation (f(x, y))
+            num_radii, num_angles (int): size of the polar grid (default: polar_grid_size(num_nodes))
+        ----------------
+        Output:
+            sol: A vector of length num_nodes with the solution at the nodal points
+            nodal_points (ndarray): the nodal points of generate_mesh.generate_mesh(num_nodes)
+        ----------------
+        Raises:
+            ValueError: If the grid has fewer than 1 radius or 3 angles
+        ----------------
+        Long description:
+            The right hand side is evaluated on the grid points, so no triangulation and no
+            assembly is needed. The solution is the second order finite difference solution,
+            not the finite element solution, but the two agree up to the discretization error.
+    '''
+    default_radii, default_angles = polar_grid_size(num_nodes)
+    polar = PolarPoissonSolver(num_radii or default_radii, num_angles or default_angles)
+
+    outward_circles, radii_of_circles, dof_in_circles, starting_angle_for_circles = mesh.circle_data(num_nodes)
+    nodal_points = mesh.get_nodal_points(num_nodes, outward_circles, radii_of_circles, dof_in_circles, starting_angle_for_circles)
+
+    x, y = polar.grid_points()
+    u = polar.solve(np.broadcast_to(right_hand_side(x, y), x.shape))
+    return polar.interpolation_matrix(nodal_points) @ u.ravel(), nodal_points
@@ -0,0 +1,133 @@
+import numpy as np
+
+import ast
+import math
+
+
+class Polynomial:
+    '''
+        A polynomial right hand side f(x, y) = sum of c_ij x^i y^j.
+        ----------------
+        Inputs:
+            coefficients (dict): maps the exponents (i, j) to the coefficient c_ij
+        ----------------
+        Attributes:
+            coefficients (dict): the nonzero coefficients
+            degree (int): the largest i + j with a nonzero coefficient (0 for f = 0)
+        ----------------
+        Long description:
+            A Polynomial is called like any other right hand side, f(x, y), so it can be
+            given to every solver. The load vector functions of assemble_load_vector
+            recognize it and integrate it exactly with
+            assemble_load_vector.polynomial_load_vectors() instead of with quadrature.
+    '''
+    def __init__(self, coefficients):
+        self.coefficients = {(int(i), int(j)): float(c) for (i, j), c in coefficients.items() if c != 0}
+        self.degree = max([i + j for i, j in self.coefficients], default=0)
+
+    def __call__(self, x, y):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        value = np.zeros(np.broadcast(x, y).shape)
+        for (i, j), c in self.coefficients.items():
+            value += c * x**i * y**j
+        return value
+
+    def __repr__(self):
+        terms = [f"{c!r}*x**{i}*y**{j}" for (i, j), c in sorted(self.coefficients.items())]
+        return f"Polynomial({' + '.join(terms) or '0'})"
+
+#----------------------------------------------------------------------------------------
+
+def parse_polynomial(expression):
+    '''
+        Recognizes a right hand side in text-form that is a polynomial in x and y.
+        ----------------
+        Inputs:
+            expression (str): a python expression in x and y, as given on the command line
+                              of main.py, for example x**2+y**2+1
+        ----------------
+        Output:
+            polynomial: a Polynomial equal to the expression, or None if the expression
+                        is not a polynomial (or not valid python)
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            The expression is parsed with the ast module and never evaluated. Numbers,
+            x, y, the constants pi and e of np, numpy and math, +, -, *, division by
+            constants and powers with constant non-negative integer exponents are
+            polynomials, and everything else, like np.sin(x), is not. Polynomials of a
+            degree above MAX_DEGREE and complex constants are not recognized either, so
+            such expressions are integrated with quadrature.
+    '''
+    try:
+        return Polynomial(_polynomial(ast.parse(expression.strip(), mode="eval").body))
+    except (SyntaxError, ValueError, TypeError, ZeroDivisionError, OverflowError):
+        return None
+
+#----------------------------------------------------------------------------------------
+
+CONSTANTS = {"pi": math.pi, "e": math.e}
+# Largest degree parse_polynomial() expands, which also bounds the exponents of powers
+MAX_DEGREE = 64
+
+def _polynomial(node):
+    '''
+        Returns the coefficients {(i, j): c} of the ast node, or raises ValueError if
+        it is not a polynomial.
+    '''
+    if (isinstance(node, ast.Constant) and type(node.value) in (int, float)):
+        return {(0, 0): node.value}
+    if (isinstance(node, ast.Name) and node.id in ("x", "y")):
+        return {(1, 0): 1} if node.id == "x" else {(0, 1): 1}
+    if (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name)
+            and node.value.id in ("np", "numpy", "math") and node.attr in CONSTANTS):
+        return {(0, 0): CONSTANTS[node.attr]}
+    if (isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub))):
+        sign = -1 if isinstance(node.op, ast.USub) else 1
+        return {exponents: sign * c for exponents, c in _polynomial(node.operand).items()}
+    if isinstance(node, ast.BinOp):
+        left = _polynomial(node.left)
+        right = _polynomial(node.right)
+        if isinstance(node.op, (ast.Add, ast.Sub)):
+            sign = -1 if isinstance(node.op, ast.Sub) else 1
+            result = dict(left)
+            for exponents, c in right.items():
+                result[exponents] = result.get(exponents, 0) + sign * c
+            return result
+        if isinstance(node.op, ast.Mult):
+            return _multiply(left, right)
+        if (isinstance(node.op, ast.Div) and _is_constant(right)):
+            return {exponents: c / right.get((0, 0), 0) for exponents, c in left.items()}
+        if (isinstance(node.op, ast.Pow) and _is_constant(right)):
+            exponent = right.get((0, 0), 0)
+            if _is_constant(left):
+                value = float(left.get((0, 0), 0)) ** exponent
+                if isinstance(value, complex):
+                    raise ValueError (f"{ast.dump(node)} is complex")
+                return {(0, 0): value}
+            if (exponent > MAX_DEGREE):
+                raise ValueError (f"The exponent {exponent} is larger than {MAX_DEGREE}")
+            if (exponent >= 0 and exponent == int(exponent)):
+                result = {(0, 0): 1}
+                for _ in range(int(exponent)):
+                    result = _multiply(result, left)
+                return result
+    raise ValueError (f"{ast.dump(node)} is not a polynomial")
+
+def _is_constant(coefficients):
+    return all(exponents == (0, 0) for exponents in coefficients)
+
+def _degree(coefficients):
+    return max([i + j for i, j in coefficients], default=0)
+
+def _multiply(left, right):
+    if (_degree(left) + _degree(right) > MAX_DEGREE):
+        raise ValueError (f"The degree of the product is larger than {MAX_DEGREE}")
+    result = {}
+    for (i1, j1), c1 in left.items():
+        for (i2, j2), c2 in right.items():
+            result[(i1 + i2, j1 + j2)] = result.get((i1 + i2, j1 + j2), 0) + c1 * c2
+    return result
@@ -0,0 +1,177 @@
+import numpy as np
+
+import assemble_load_vector as loadvec
+import assemble_stiffness_matrix as stiffmat
+import generate_mesh as mesh
+import solver
+
+
+def integral(sol, nodal_points, elements):
+    '''
+        Computes the integral of the piecewise linear function with nodal values sol over the mesh.
+    '''
+    elements = np.asarray(elements, dtype=int)
+    _, areas = stiffmat.element_geometry(nodal_points, elements)
+    return np.sum(areas * np.mean(np.asarray(sol)[elements], axis=1))
+
+#----------------------------------------------------------------------------------------
+
+def boundary_flux(sol, nodal_points, elements, boundary_edges):
+    '''
+        Computes the outward flux, the integral of du/dn over the boundary, of the finite element solution.
+        ----------------
+        Inputs:
+            sol: the nodal values, for example from solver.solver()
+            nodal_points (ndarray): the nodal_points we get from the mesh generation
+            elements (ndarray): the elements we get from mesh generation
+            boundary_edges (ndarray): list of boundary edges we get from mesh generation
+        ----------------
+        Output:
+            flux (float): sum over the boundary edges of the edge length times the normal
+                          component of the gradient on the element of the edge
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            The gradient of the solution is constant on every element, and the outward normals
+            come from generate_mesh.boundary_normals(). For the poisson problem the exact
+            flux equals minus the integral of f over the domain.
+    '''
+    owners, normals = mesh.boundary_normals(nodal_points, elements, boundary_edges)
+
+    gradients, _ = stiffmat.element_geometry(nodal_points, owners)
+    gradient_u = np.einsum("kaj,ka->kj", gradients, np.asarray(sol)[owners])
+
+    # The normal has the length of the edge, so this is the edge integral of du/dn
+    return np.sum(gradient_u * normals)
+
+#----------------------------------------------------------------------------------------
+
+def nested_solutions(num_nodes, right_hand_side = loadvec.zero_func, levels = 3):
+    '''
+        Solves the poisson problem on a mesh and on its uniform refinements.
+        ----------------
+        Inputs:
+            num_nodes (int): number of nodes of the coarsest mesh
+            right_hand_side: the function on the right hand side of the original poisson equation (f(x, y))
+            levels (int): number of meshes, the coarsest one and levels - 1 refinements
+        ----------------
+        Output:
+            solutions (list): (sol, nodal_points, elements, boundary_edges) of every level,
+                              from coarse to fine
+        ----------------
+        Raises:
+            ValueError: If levels is smaller than 2
+        ----------------
+        Long description:
+            The coarsest mesh comes from generate_mesh.generate_mesh() and every finer mesh
+            from generate_mesh.refine_mesh(), so the nodes of the coarsest mesh are the first
+            num_nodes nodes of every level and the mesh size is halved from level to level.
+    '''
+    if (levels < 2):
+        raise ValueError (f"Richardson extrapolation needs at least 2 levels, but got {levels}")
+
+    nodal_points, elements, boundary_edges = mesh.generate_mesh(num_nodes)
+    solutions = []
+    for level in range(levels):
+        if (level > 0):
+            nodal_points, elements, boundary_edges = mesh.refine_mesh(nodal_points, elements, boundary_edges)
+        n = len(nodal_points)
+        interior, factor = solver.factorize_stiffness(n, nodal_points, elements, boundary_edges)
+        sol = solver.solve_factorized(n, nodal_points, elements, interior, factor, right_hand_side)
+        solutions.append((sol, nodal_points, elements, boundary_edges))
+    return solutions
+
+#----------------------------------------------------------------------------------------
+
+def extrapolate(quantities, order = 2):
+    '''
+        Richardson extrapolation of a quantity computed on meshes with mesh sizes h, h/2, h/4, ...
+        ----------------
+        Inputs:
+            quantities (list): the quantity on every level, from coarse to fine. Numbers or
+                               arrays of the same shape (for example nodal values at the
+                               common nodes).
+            order (int): the order p of the leading error term C h^p
+        ----------------
+        Output:
+            value: the extrapolated quantity
+            error: estimate of the error of value
+            observed_order: the order log2((Q_1 - Q_0) / (Q_2 - Q_1)) seen in the last three
+                            levels, or None with only two levels
+        ----------------
+        Raises:
+            ValueError: If fewer than 2 quantities are given
+        ----------------
+        Long description:
+            With Q_h = Q + C h^p + ..., R = Q_{h/2} + (Q_{h/2} - Q_h) / (2^p - 1) removes the
+            leading error term. With two levels, the error estimate is |R - Q_{h/2}|, the
+            estimated error of the fine value, which bounds the error of R when the
+            expansion holds. With three or more levels, the extrapolations of the last two
+            pairs are compared, and the estimate is their difference. For arrays, the
+            error and the observed order are computed elementwise.
+    '''
+    if (len(quantities) < 2):
+        raise ValueError (f"Richardson extrapolation needs at least 2 levels, but got {len(quantities)}")
+
+    Q = [np.asarray(quantity, dtype=float) for quantity in quantities]
+    factor = 2.0**order - 1
+    extrapolated = [Q[i + 1] + (Q[i + 1] - Q[i]) / factor for i in range(len(Q) - 1)]
+    value = extrapolated[-1]
+
+    if (len(Q) == 2):
+        return value, np.abs(value - Q[-1]), None
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        observed_order = np.log2(np.abs((Q[-2] - Q[-3]) / (Q[-1] - Q[-2])))
+    return value, np.abs(value - extrapolated[-2]), observed_order
+
+#----------------------------------------------------------------------------------------
+
+def richardson_extrapolation(num_nodes, right_hand_side = loadvec.zero_func, levels = 3, functionals = None):
+    '''
+        Solves the poisson problem on nested meshes and extrapolates the solution and functionals of it.
+        ----------------
+        Inputs:
+            num_nodes (int): number of nodes of the coarsest mesh
+            right_hand_side: the function on the right hand side of the original poisson equation (f(x, y))
+            levels (int): number of nested meshes (2 or more)
+            functionals (dict): maps names to pairs (functional, order), where
+                                functional(sol, nodal_points, elements, boundary_edges)
+                                returns a number that converges with the given order
+                                (default: the integral of u, order 2, and the boundary
+                                flux, order 1)
+        ----------------
+        Output:
+            sol: extrapolated solution at the nodes of the coarsest mesh
+            error: estimated error of sol at every node
+            results (dict): maps the name of every functional to (value, error, observed_order)
+                            from extrapolate()
+            nodal_points (ndarray): the nodal_points of the coarsest mesh
+            elements (ndarray): the elements of the coarsest mesh
+            boundary_edges (ndarray): the boundary edges of the coarsest mesh
+        ----------------
+        Raises:
+            ValueError: If levels is smaller than 2
+        ----------------
+        Long description:
+            The levels come from nested_solutions(), and every quantity is extrapolated
+            with extrapolate(). The nodal values and the integral converge with order 2,
+            but boundary_flux() uses the constant gradients of the boundary elements and
+            only converges with order 1, so it is extrapolated with order 1. The observed
+            orders in the results show whether the assumed orders hold.
+    '''
+    if functionals is None:
+        functionals = {
+            "integral": (lambda sol, nodal_points, elements, boundary_edges: integral(sol, nodal_points, elements), 2),
+            "boundary_flux": (boundary_flux, 1),
+        }
+
+    solutions = nested_solutions(num_nodes, right_hand_side, levels)
+    coarse_sol, nodal_points, elements, boundary_edges = solutions[0]
+
+    sol, error, _ = extrapolate([level[0][:len(coarse_sol)] for level in solutions])
+    results = {name: extrapolate([functional(*level) for level in solutions], order)
+               for name, (functional, order) in functionals.items()}
+    return sol, error, results, nodal_points, elements, boundary_edges
@@ -0,0 +1,142 @@
+import numpy as np
+import scipy.linalg as spla
+
+import generate_mesh as mesh
+
+
+def is_radial(right_hand_side, num_samples = 64, rtol = 1e-10, atol = 1e-12, seed = 0):
+    '''
+        Checks whether a right hand side only depends on the radius r = sqrt(x^2+y^2).
+        ----------------
+        Inputs:
+            right_hand_side: the function on the right hand side of the original poisson equation (f(x, y))
+            num_samples (int): number of random radii the function is compared at
+            rtol, atol (float): tolerances of the comparison
+            seed (int): seed of the random sample points
+        ----------------
+        Output:
+            True if f takes the same value at several random angles on every sampled radius
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            This is a numerical test, so a function that only depends on the angle in a way
+            the sample points miss is taken as radial. Pass the profile to radial_solver()
+            directly when the right hand side is known to be radial.
+    '''
+    rng = np.random.default_rng(seed)
+    r = rng.random(num_samples)
+    angles = 2 * np.pi * rng.random((4, num_samples))
+
+    values = [np.broadcast_to(right_hand_side(r * np.cos(t), r * np.sin(t)), r.shape) for t in angles]
+    return all(np.allclose(value, values[0], rtol=rtol, atol=atol) for value in values[1:])
+
+#----------------------------------------------------------------------------------------
+
+def radial_solution(radii, radial_profile):
+    '''
+        Solves the radially symmetric poisson problem with 1D finite elements on the given radii.
+        ----------------
+        Inputs:
+            radii (ndarray): increasing radii from 0 to 1, the nodes of the 1D mesh
+            radial_profile: function of r giving the right hand side f(r)
+        ----------------
+        Output:
+            u (ndarray): the solution at the radii (zero at r = 1)
+        ----------------
+        Raises:
+            ValueError: If the radii do not start at 0, end at 1 and increase
+        ----------------
+        Long description:
+            For f = f(r) the solution is radial and nabla^2 u = -f becomes
+            -(1/r) (r u')' = f(r), u'(0) = 0, u(1) = 0.
+            Multiplying by r v and integrating by parts gives the weak form
+            int_0^1 r u' v' dr = int_0^1 r f v dr,
+            where the condition at r = 0 is natural. With linear elements on [a, b] the
+            elemental matrix is (a + b) / (2 (b - a)) [[1, -1], [-1, 1]], and the load is
+            integrated with 3-point Gauss-Legendre quadrature. The system is tridiagonal
+            and solved with a banded Cholesky factorization.
+    '''
+    radii = np.asarray(radii, dtype=float)
+    if (radii[0] != 0 or radii[-1] != 1 or np.any(np.diff(radii) <= 0)):
+        raise ValueError ("The radii need to increase from 0 to 1")
+
+    a = radii[:-1]
+    b = radii[1:]
+    h = b - a
+    n = len(radii)
+
+    # Elemental stiffness (a + b) / (2h) on the diagonal and minus that off the diagonal
+    k = (a + b) / (2 * h)
+    diagonal = np.zeros(n)
+    diagonal[:-1] += k
+    diagonal[1:] += k
+    off_diagonal = -k
+
+    # Load with 3-point Gauss-Legendre quadrature on every interval, s in (0, 1)
+    s = 0.5 + 0.5 * np.array([-np.sqrt(3 / 5), 0, np.sqrt(3 / 5)])
+    w = np.array([5 / 18, 8 / 18, 5 / 18])
+    r = a[:, None] + h[:, None] * s
+    f = np.broadcast_to(radial_profile(r.ravel()), r.size).reshape(r.shape)
+    rf = h[:, None] * w * r * f
+    F = np.zeros(n)
+    F[:-1] += rf @ (1 - s)
+    F[1:] += rf @ s
+
+    # Impose u(1) = 0 by removing the last node and solve the tridiagonal system
+    ab = np.zeros((2, n - 1))
+    ab[0, 1:] = off_diagonal[:-1]
+    ab[1] = diagonal[:-1]
+
+    u = np.zeros(n)
+    u[:-1] = spla.solveh_banded(ab, F[:-1])
+    return u
+
+#----------------------------------------------------------------------------------------
+
+def radial_solver(num_nodes, right_hand_side = None, radial_profile = None):
+    '''
+        Solves the 2D poisson problem for a radially symmetric right hand side by a 1D solve.
+        ----------------
+        Inputs:
+            num_nodes (int): Total number of nodes in the finite element mesh
+            right_hand_side: the function on the right hand side of the original poisson
+                             equation (f(x, y)). It is checked with is_radial().
+            radial_profile: function f(r) of the radius, can be given instead of right_hand_side
+        ----------------
+        Output:
+            sol: A vector of length num_nodes that is the solution at the nodal points
+            nodal_points (ndarray): the nodal points of generate_mesh.generate_mesh(num_nodes)
+        ----------------
+        Raises:
+            ValueError: If neither or both of right_hand_side and radial_profile are given,
+                        or if right_hand_side is not radial
+        ----------------
+        Long description:
+            The 1D problem is solved with radial_solution() on the radii of the circles from
+            generate_mesh.circle_data(), so every nodal point lies on a node of the 1D mesh
+            and the solution is mapped back by looking up the radius of each nodal point.
+            No triangulation, no 2D assembly and no 2D solve is needed.
+    '''
+    if ((right_hand_side is None) == (radial_profile is None)):
+        raise ValueError ("Give exactly one of right_hand_side and radial_profile")
+    if radial_profile is None:
+        if not is_radial(right_hand_side):
+            raise ValueError ("The right hand side is not radially symmetric")
+        radial_profile = lambda r: right_hand_side(r, np.zeros_like(r))
+
+    outward_circles, radii_of_circles, dof_in_circles, starting_angle_for_circles = mesh.circle_data(num_nodes)
+    nodal_points = mesh.get_nodal_points(num_nodes, outward_circles, radii_of_circles, dof_in_circles, starting_angle_for_circles)
+
+    sol = radial_to_nodal(nodal_points, radii_of_circles, radial_solution(radii_of_circles, radial_profile))
+    return sol, nodal_points
+
+#----------------------------------------------------------------------------------------
+
+def radial_to_nodal(nodal_points, radii, u):
+    '''
+        Evaluates the piecewise linear radial function with values u at radii in the nodal points.
+    '''
+    r = np.hypot(nodal_points[:, 0], nodal_points[:, 1])
+    return np.interp(r, radii, u)
@@ -0,0 +1,283 @@
+import numpy as np
+
+import generate_mesh as mesh
+import operator_cache as opcache
+import polynomial
+import solver
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+#----------------------------------------------------------------------------------------
+
+def right_hand_side_from_expression(expression):
+    '''
+        Turns a right hand side written in text-form into a python function.
+        ----------------
+        Inputs:
+            expression (str): a python expression in x and y, for example x**2+y**2+1.
+                              numpy is available as np, like on the command line of main.py
+        ----------------
+        Output:
+            right_hand_side_f: function of (x, y) evaluating the expression, a
+                               polynomial.Polynomial if the expression is a polynomial
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            This is the same convention as main.run_program() uses for the right hand side
+            given on the command line. Polynomials are recognized with
+            polynomial.parse_polynomial(), so that their load vectors are exact. Unlike on
+            the command line, the expression comes from a client, so it is evaluated
+            without the python builtins: only x, y and np are available.
+    '''
+    polynomial_f = polynomial.parse_polynomial(expression)
+    if polynomial_f is not None:
+        return polynomial_f
+
+    code = compile(expression, "<right_hand_side>", "eval")
+
+    def right_hand_side_f(x, y):
+        return eval(code, {"__builtins__": {}, "np": np}, {"x": x, "y": y})
+
+    return right_hand_side_f
+
+#----------------------------------------------------------------------------------------
+
+class CachedOperator:
+    '''
+        A mesh together with the factorized stiffness matrix on its interior nodes.
+        The lock serializes the solves that use the same factorization. When cache_dir
+        is given, the factorization is shared with other processes through
+        operator_cache.cached_operator().
+    '''
+    def __init__(self, num_nodes, cache_dir = None):
+        self.num_nodes = num_nodes
+        self.nodal_points, self.elements, self.boundary_edges = mesh.generate_mesh(num_nodes)
+        if cache_dir is None:
+            self.interior, self.factor = solver.factorize_stiffness(num_nodes, self.nodal_points,
+                                                                    self.elements, self.boundary_edges)
+        else:
+            self.interior = solver.interior_nodes(num_nodes, self.boundary_edges)
+            _, self.factor = opcache.cached_operator(num_nodes, self.nodal_points, self.elements,
+                                                     self.interior, cache_dir)
+        self.lock = threading.Lock()
+
+#----------------------------------------------------------------------------------------
+
+class OperatorCache:
+    '''
+        Least recently used cache of CachedOperator objects keyed by num_nodes.
+        ----------------
+        Long description:
+            get() is called from the worker threads. Building an operator for one mesh
+            size only holds the lock of that size, so different sizes are built
+            concurrently while two requests for the same size share one build.
+    '''
+    def __init__(self, max_entries = 8, cache_dir = None):
+        if (max_entries < 1):
+            raise ValueError (f"The cache needs room for at least one operator, not {max_entries}")
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks = {}
+
+    def get(self, num_nodes):
+        with self._lock:
+            if num_nodes in self._entries:
+                self._entries.move_to_end(num_nodes)
+                return self._entries[num_nodes]
+            build_lock = self._build_locks.setdefault(num_nodes, threading.Lock())
+
+        with build_lock:
+            with self._lock:
+                if num_nodes in self._entries:
+                    self._entries.move_to_end(num_nodes)
+                    return self._entries[num_nodes]
+            operator = CachedOperator(num_nodes, self.cache_dir)
+            with self._lock:
+                self._entries[num_nodes] = operator
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                self._build_locks.pop(num_nodes, None)
+        return operator
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, num_nodes):
+        return num_nodes in self._entries
+
+#----------------------------------------------------------------------------------------
+
+def handle_request(request, cache):
+    '''
+        Solves the poisson problem for one request and writes the solution to disk.
+        ----------------
+        Inputs:
+            request (dict): decoded JSON request with the keys
+                num_nodes: Total number of nodes in the finite element mesh
+                rhs: the right hand side in text-form, see right_hand_side_from_expression()
+                output: path of the .npz file the solution is written to
+            cache (OperatorCache): the cache of meshes and factorizations
+        ----------------
+        Output:
+            response (dict): the output path and the time spent on the request
+        ----------------
+        Raises:
+            KeyError: If num_nodes or output is missing from the request
+            ValueError: If num_nodes is too small to generate a mesh
+        ----------------
+        Long description:
+            The npz file holds the arrays solution, nodal_points, elements and boundary_edges.
+            When the mesh size is cached, only the load vector is assembled before the
+            forward and backward substitution.
+    '''
+    start = time.perf_counter()
+    num_nodes = int(request["num_nodes"])
+    output = request["output"]
+    right_hand_side = right_hand_side_from_expression(str(request.get("rhs", "0*x")))
+
+    operator = cache.get(num_nodes)
+    with operator.lock:
+        sol = solver.solve_factorized(num_nodes, operator.nodal_points, operator.elements,
+                                      operator.interior, operator.factor, right_hand_side)
+
+    np.savez(output, solution=sol, nodal_points=operator.nodal_points,
+             elements=operator.elements, boundary_edges=operator.boundary_edges)
+    return {"output": output, "elapsed": time.perf_counter() - start}
+
+#----------------------------------------------------------------------------------------
+
+async def serve_stream(reader, respond, cache, executor):
+    '''
+        Answers JSON-lines requests read from reader until end of file.
+        ----------------
+        Inputs:
+            reader (asyncio.StreamReader): stream with one JSON request per line
+            respond: coroutine function that is given every response as a dict
+            cache (OperatorCache): the cache of meshes and factorizations
+            executor: worker pool the requests are solved in
+        ----------------
+        Output:
+            -
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            Every request is solved as its own task, so responses can come back in a
+            different order than the requests. The "id" of a request, if given, is copied
+            to its response. Failed requests are answered with status "error" instead of
+            stopping the server.
+    '''
+    loop = asyncio.get_running_loop()
+
+    async def answer(line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            response = await loop.run_in_executor(executor, handle_request, request, cache)
+            response["status"] = "ok"
+        except Exception as error:
+            response = {"status": "error", "error": f"{type(error).__name__}: {error}"}
+        if request_id is not None:
+            response["id"] = request_id
+        await respond(response)
+
+    tasks = set()
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        if not line.strip():
+            continue
+        task = asyncio.create_task(answer(line))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+
+#----------------------------------------------------------------------------------------
+
+async def serve(socket_path = None, workers = None, cache_size = 8, cache_dir = None):
+    '''
+        Runs the solve server on stdin/stdout or on a Unix socket.
+        ----------------
+        Inputs:
+            socket_path (str): path of the Unix socket to listen on. If None, requests
+                               are read from stdin and answered on stdout
+            workers (int): number of worker threads (default: number of cpus)
+            cache_size (int): maximal number of meshes and factorizations kept in memory
+            cache_dir (str): directory of the persistent operator cache, so the server
+                             starts warm after a restart (default: no persistent cache)
+        ----------------
+        Output:
+            -
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            The cache and the worker pool are shared between all connections, so a
+            factorization made for one client is reused by the others.
+    '''
+    loop = asyncio.get_running_loop()
+    cache = OperatorCache(cache_size, cache_dir)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if socket_path is None:
+            reader = asyncio.StreamReader()
+            await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+            async def respond(response):
+                sys.stdout.write(json.dumps(response) + "\n")
+                sys.stdout.flush()
+
+            await serve_stream(reader, respond, cache, executor)
+            return
+
+        async def handle_connection(reader, writer):
+            write_lock = asyncio.Lock()
+
+            async def respond(response):
+                async with write_lock:
+                    writer.write((json.dumps(response) + "\n").encode())
+                    await writer.drain()
+
+            try:
+                await serve_stream(reader, respond, cache, executor)
+            finally:
+                writer.close()
+
+        server = await asyncio.start_unix_server(handle_connection, path=socket_path)
+        # Only the user running the server may connect and send expressions
+        os.chmod(socket_path, 0o600)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+
+#----------------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-running solve server for the 2D poisson problem.")
+    parser.add_argument("--socket", default=None, help="Unix socket to listen on (default: stdin/stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker threads")
+    parser.add_argument("--cache-size", type=int, default=8, help="Number of meshes and factorizations kept in memory")
+    parser.add_argument("--cache-dir", default=None, help="Directory of the persistent operator cache")
+    options = parser.parse_args()
+    asyncio.run(serve(options.socket, options.workers, options.cache_size, options.cache_dir))
@@ -0,0 +1,168 @@
+import numpy as np
+
+from functools import cached_property
+
+import assemble_stiffness_matrix as stiffmat
+import generate_mesh as mesh
+
+
+class Solution:
+    '''
+        A finite element solution together with its mesh, with lazily computed derived quantities.
+        ----------------
+        Inputs:
+            values (ndarray): the solution at the nodal points
+            nodal_points (ndarray): the nodal_points we get from the mesh generation
+            elements (ndarray): the elements we get from mesh generation
+            boundary_edges (ndarray): list of boundary edges we get from mesh generation
+        ----------------
+        Attributes:
+            values, nodal_points, elements, boundary_edges: the inputs
+            basis_gradients (ndarray): num_elements x 3 x 2 gradients of the local basis functions
+            areas (ndarray): the area of every element
+            element_gradients (ndarray): num_elements x 2 gradient of the solution on every element
+            nodal_gradients (ndarray): num_nodes x 2 recovered gradient at every node
+            boundary_flux (float): the integral of du/dn over the boundary
+        ----------------
+        Long description:
+            A Solution unpacks like the tuple (values, nodal_points, elements, boundary_edges)
+            that solver.solver() used to return, so sol, nodal_points, elements,
+            boundary_edges = solver.solver(...) keeps working. The other attributes are
+            computed the first time they are used and then cached, and the quantities they
+            depend on (the basis gradients from assemble_stiffness_matrix.element_geometry(),
+            the element gradients) are computed once and shared between them.
+    '''
+    def __init__(self, values, nodal_points, elements, boundary_edges):
+        self.values = values
+        self.nodal_points = nodal_points
+        self.elements = elements
+        self.boundary_edges = boundary_edges
+
+    def __iter__(self):
+        return iter((self.values, self.nodal_points, self.elements, self.boundary_edges))
+
+    def __len__(self):
+        return 4
+
+    def __getitem__(self, index):
+        return tuple(self)[index]
+
+    @cached_property
+    def _geometry(self):
+        return stiffmat.element_geometry(self.nodal_points, self.elements)
+
+    @property
+    def basis_gradients(self):
+        return self._geometry[0]
+
+    @property
+    def areas(self):
+        return self._geometry[1]
+
+    @cached_property
+    def element_gradients(self):
+        '''
+            The gradient of the solution on every element, which is constant on every element.
+        '''
+        elements = np.asarray(self.elements, dtype=int)
+        return np.einsum("kaj,ka->kj", self.basis_gradients, np.asarray(self.values)[elements])
+
+    @cached_property
+    def nodal_gradients(self):
+        '''
+            Recovers the gradient at the nodes with the superconvergent patch recovery of Zienkiewicz and Zhu.
+            ----------------
+            Output:
+                gradients (ndarray): num_nodes x 2 array with the recovered gradient at every node
+            ----------------
+            Long description:
+                The element gradients are most accurate at the centroids. For every
+                interior node, a linear function a + b (x - x_i) + c (y - y_i) is fitted
+                to the element gradients at the centroids of the patch of elements
+                around the node by least squares, and its value a at the node is the
+                recovered gradient. The normal equations of all patches are assembled
+                at once with np.bincount and solved as one batch of 3 x 3 systems. The
+                offsets are scaled by the size of the patch to keep the systems well
+                conditioned. A boundary node gets the mean of the fits of the interior
+                nodes it shares an element edge with, evaluated at the boundary node,
+                since the fits of the one sided boundary patches are less accurate.
+                Nodes without such a neighbour get the area weighted mean of the element
+                gradients around them.
+        '''
+        nodal_points = np.asarray(self.nodal_points)
+        elements = np.asarray(self.elements, dtype=int)
+        num_nodes = len(nodal_points)
+        boundary = np.zeros(num_nodes, dtype=bool)
+        boundary[np.asarray(self.boundary_edges).astype(int)] = True
+
+        # One entry per (vertex, element) pair, ordered by the local vertex index
+        nodes = elements.T.ravel()
+        def node_sum(weights):
+            return np.bincount(nodes, weights=weights, minlength=num_nodes)
+
+        # Area weighted mean of the element gradients around every node
+        gx, gy = np.tile(self.element_gradients.T, 3)
+        areas = np.tile(self.areas, 3)
+        patch_area = node_sum(areas)
+        gradients = np.column_stack([node_sum(areas * gx), node_sum(areas * gy)])
+        gradients /= np.maximum(patch_area, np.finfo(float).tiny)[:, None]
+
+        # Normal equations sum_k p_k p_k^T c = sum_k p_k g_k^T of the fit around every node,
+        # with p_k = [1, dx_k, dy_k] = [1, (x_k - x_i) / h_i, (y_k - y_i) / h_i] at the centroids x_k
+        count = np.bincount(nodes, minlength=num_nodes)
+        scale = np.sqrt(patch_area / np.maximum(count, 1))
+        centroids = np.tile(np.mean(nodal_points[elements], axis=1).T, 3)
+        dx, dy = (centroids - nodal_points[nodes].T) / scale[nodes]
+        sx, sy, sxx, sxy, syy = node_sum(dx), node_sum(dy), node_sum(dx * dx), node_sum(dx * dy), node_sum(dy * dy)
+        matrices = np.stack([np.stack([count, sx, sy], axis=1),
+                             np.stack([sx, sxx, sxy], axis=1),
+                             np.stack([sy, sxy, syy], axis=1)], axis=1)
+        right_hand_sides = np.stack([np.column_stack([node_sum(gx), node_sum(gy)]),
+                                     np.column_stack([node_sum(dx * gx), node_sum(dx * gy)]),
+                                     np.column_stack([node_sum(dy * gx), node_sum(dy * gy)])], axis=1)
+
+        fitted = np.flatnonzero(~boundary & (count >= 3))
+        coefficients = np.zeros((num_nodes, 3, 2))
+        coefficients[fitted] = np.linalg.solve(matrices[fitted], right_hand_sides[fitted])
+        gradients[fitted] = coefficients[fitted, 0]
+
+        # Boundary nodes from the fits of their interior neighbours. An edge from a boundary
+        # node to an interior node is shared by two elements, so every neighbour counts twice.
+        touching = elements[np.any(boundary[elements], axis=1)]
+        edges = np.concatenate([touching[:, [0, 1]], touching[:, [1, 2]], touching[:, [2, 0]]])
+        edges = np.concatenate([edges, edges[:, ::-1]])
+        fit = np.zeros(num_nodes, dtype=bool)
+        fit[fitted] = True
+        edges = edges[boundary[edges[:, 0]] & fit[edges[:, 1]]]
+        b, i = edges[:, 0], edges[:, 1]
+        offsets = (nodal_points[b] - nodal_points[i]) / scale[i, None]
+        values = coefficients[i, 0] + offsets[:, :1] * coefficients[i, 1] + offsets[:, 1:] * coefficients[i, 2]
+        neighbours = np.bincount(b, minlength=num_nodes)
+        extrapolated = np.flatnonzero(neighbours > 0)
+        gradients[extrapolated] = np.stack([np.bincount(b, weights=values[:, j], minlength=num_nodes)
+                                            for j in range(2)], axis=1)[extrapolated] / neighbours[extrapolated, None]
+        return gradients
+
+    @cached_property
+    def boundary_flux(self):
+        '''
+            The outward flux, the integral of du/dn over the boundary edges.
+            ----------------
+            Output:
+                flux (float): sum over the boundary edges of the edge length times the normal
+                              component of the mean recovered gradient of its end points
+            ----------------
+            Long description:
+                The recovered gradients of nodal_gradients are integrated along every
+                boundary edge with the trapezoidal rule, with the outward normals of
+                generate_mesh.boundary_normals(). With the recovered gradients, the flux
+                converges faster than with the constant gradients of the boundary elements
+                (postprocessing.boundary_flux()). For the poisson problem the exact flux
+                equals minus the integral of f over the domain.
+        '''
+        boundary = np.asarray(self.boundary_edges).astype(int)
+        _, normals = mesh.boundary_normals(self.nodal_points, self.elements, boundary)
+
+        # The normal has the length of the edge, so this is the trapezoidal rule along the edge
+        gradient = 0.5 * (self.nodal_gradients[boundary[:, 0]] + self.nodal_gradients[boundary[:, 1]])
+        return float(np.sum(gradient * normals))
@@ -1,10 +1,31 @@
 import numpy as np
+import scipy.linalg as spla
+import scipy.sparse.csgraph as spcg
+import scipy.sparse.linalg as spsla
+
+import inspect
+import logging
+import os
 
 import assemble_load_vector as loadvec
 import assemble_stiffness_matrix as stiffmat
+import domain_decomposition as ddm
 import generate_mesh as mesh
+import operator_cache as opcache
+import polar_solver as polar
+import radial_solver as radial
+import solution
+
+logger = logging.getLogger(__name__)
+
+# Rough machine constants for the cost model in estimate_cost()
+FLOP_RATE = 1e10            # floating point operations per second in dense kernels
+SPARSE_FLOP_RATE = 1e9      # floating point operations per second in sparse factorizations
+MEMORY_BANDWIDTH = 5e9      # bytes per second streamed in sparse matrix-vector products
+MEMORY_FRACTION = 0.8       # fraction of the available memory a solve may use
 
-def solver(num_nodes, right_hand_side = loadvec.zero_func):
+def solver(num_nodes, right_hand_side = loadvec.zero_func, reorder = None, engine = "auto", memory_limit = None,
+           cache_dir = None, backend = "numpy", quadrature_tolerance = None, tolerance = None):
     '''
         This function uses other implemented functions and imposes the boundary conditions.
         In short words, this function is used to solve the whole system, 
@@ -13,44 +34,598 @@ def solver(num_nodes, right_hand_side = loadvec.zero_func):
         Inputs:
             num_nodes (int): Total number of nodes in the finite element mesh
             right_hand_side: the function on the right hand side of the original poisson equation (f(x, y))
+            reorder (str): None (default) to keep the node order from generate_mesh(), or
+                           "hilbert"/"morton" to renumber the mesh along that space-filling
+                           curve with generate_mesh.renumber_mesh()
+            engine (str): how to solve the linear system, one of
+                          "auto" (default): let plan_engine() choose among dense, sparse,
+                              banded, iterative and matrix_free, in double precision
+                          "dense": dense LU factorization
+                          "sparse": sparse LU factorization
+                          "banded": banded Cholesky factorization after reverse Cuthill-McKee
+                          "iterative": conjugate gradients on the assembled matrix
+                          "mixed_precision": sparse LU in float32, refined to the tolerance
+                              in float64. Never chosen automatically.
+                          "matrix_free": the conjugate gradients of "iterative" with
+                              assemble_stiffness_matrix.StiffnessOperator, so no global
+                              matrix is stored. Chosen when nothing else fits in memory.
+                          "domain_decomposition": solve_domain_decomposition(), conjugate
+                              gradients preconditioned by additive Schwarz on angular
+                              sectors solved in parallel processes, not a substructuring
+                              solve. Never chosen automatically.
+                          "radial": a 1D solve along the radius with
+                              radial_solver.radial_solution(), which needs a radially
+                              symmetric right hand side f(r). Never chosen automatically.
+                          "polar": the finite difference problem on a polar grid solved
+                              with the FFT (polar_solver.py) and interpolated to the nodes.
+                              Needs no assembly, but is not the finite element solution.
+                              Never chosen automatically.
+                          "polar_cg": the finite element system solved with conjugate
+                              gradients preconditioned by the polar grid solver, see
+                              solve_polar_preconditioned(). Never chosen automatically.
+            memory_limit (int): number of bytes the solve may use when engine is "auto"
+                                (default: a fraction of the available memory)
+            cache_dir (str): if given, the stiffness matrix and its sparse LU factorization
+                             are read from (or stored in) this directory with
+                             operator_cache.cached_operator(). The sparse engine is then used.
+            backend (str): "numpy" (default) or "numba", the backend of the assembly routines.
+                           See assemble_stiffness_matrix.sparse_stiffness_matrix() and
+                           assemble_load_vector.vectorized_load_vector().
+            quadrature_tolerance (float): if given, the load vector is integrated with
+                                          assemble_load_vector.adaptive_load_vector() with
+                                          this tolerance per element (default: the fixed
+                                          4-point rule)
+            tolerance (float): relative residual at which the iterative engines (iterative,
+                               mixed_precision, matrix_free, domain_decomposition and
+                               polar_cg) stop (default: the default of the engine). The
+                               direct engines ignore it.
         ----------------
         Output:
+            A solution.Solution, which unpacks into
             sol: A vector of length num_nodes that is the solution to the poisson problem 
             nodal_points (ndarray): the nodal_points we get from the mesh generation
             elements (ndarray): the elements we get from mesh generation
             boundary_edges (ndarray): list of boundary nodes we get from mesh generation
+            (when reorder is given, all four outputs are in the renumbered order)
+            and computes the gradients and the boundary flux of the solution on demand
         ----------------
         Raises:
-            -
+            ValueError: If engine is unknown, or if engine is "auto" and no engine fits in memory,
+                        or if cache_dir is given together with an engine other than "sparse",
+                        or if engine is "radial" and the right hand side is not radial
         ----------------
         Long description:
             This function uses the mesh of the unit circle to build the stiffness matrix
             and load vector. Then, the homogeneous dirichlet boundary conditions are imposed
             by removing the rows and columns corresponding to boundary elements in the
             stiffness matrix (as we already know the value here). 
+            The engine is chosen before the mesh is generated, so a problem that is too
+            large fails before any work is done.
     '''
+    # Choose how to solve the linear system
+    if (cache_dir is not None and engine != "auto" and engine != "sparse"):
+        raise ValueError (f"Cached operators are solved with the sparse engine, not {engine}")
+    if (cache_dir is not None):
+        engine = "sparse"
+    elif (engine == "auto"):
+        engine = plan_engine(num_nodes, expected_num_elements(num_nodes), memory_limit)
+    elif (engine not in ENGINES and engine not in SPECIAL_ENGINES):
+        raise ValueError (f"engine needs to be auto or one of {', '.join(list(ENGINES) + SPECIAL_ENGINES)}, but is {engine}")
+    if (engine == "radial" and not radial.is_radial(right_hand_side)):
+        raise ValueError ("The radial engine needs a radially symmetric right hand side")
+
     # Generate mesh
     nodal_points, elements, boundary_edges = mesh.generate_mesh(num_nodes)
+    if reorder is not None:
+        nodal_points, elements, boundary_edges, _ = mesh.renumber_mesh(nodal_points, elements, boundary_edges, reorder)
 
-    # Assemble stiffness matrix
-    A = stiffmat.stiffness_matrix(num_nodes, nodal_points, elements)
+    if (engine == "radial"):
+        # The nodes lie on the circles of the mesh, which are the nodes of the 1D mesh
+        radii = mesh.circle_data(num_nodes)[1]
+        u = radial.radial_solution(radii, lambda r: right_hand_side(r, np.zeros_like(r)))
+        return solution.Solution(radial.radial_to_nodal(nodal_points, radii, u), nodal_points, elements, boundary_edges)
+    if (engine == "polar"):
+        grid = polar.PolarPoissonSolver(*polar.polar_grid_size(num_nodes))
+        x, y = grid.grid_points()
+        u = grid.solve(np.broadcast_to(right_hand_side(x, y), x.shape))
+        return solution.Solution(grid.interpolation_matrix(nodal_points) @ u.ravel(), nodal_points, elements, boundary_edges)
 
     # Assemble load vector
-    F = loadvec.load_vector(num_nodes, nodal_points, elements, right_hand_side)
+    if (quadrature_tolerance is None):
+        F = loadvec.vectorized_load_vector(num_nodes, nodal_points, elements, right_hand_side, backend)
+    else:
+        F = loadvec.adaptive_load_vector(num_nodes, nodal_points, elements, right_hand_side, quadrature_tolerance)
 
     # Impose boundary conditions by removing boundary nodes from A and F
-    edge_nodes = np.unique(boundary_edges).astype(int)
-    
-    A = np.delete(A, edge_nodes, axis = 0)
-    A = np.delete(A, edge_nodes, axis = 1)
-    F = np.delete(F, edge_nodes)
+    interior = interior_nodes(num_nodes, boundary_edges)
+    F = F[interior]
 
-    # Solve linear system
-    solution_temp = np.linalg.solve(A, F)
+    if (cache_dir is not None):
+        # Reuse the factorized stiffness matrix of this mesh if it is cached
+        _, factor = opcache.cached_operator(num_nodes, nodal_points, elements, interior, cache_dir)
+        solution_temp = factor.solve(F)
+    elif (engine == "matrix_free"):
+        # Only the element gradients are stored, the boundary nodes are masked by the operator
+        A = stiffmat.StiffnessOperator(num_nodes, nodal_points, elements, interior, backend)
+        solution_temp = solve_iterative(A, F, **({} if tolerance is None else {"tolerance": tolerance}))
+    else:
+        # Assemble stiffness matrix
+        A = stiffmat.sparse_stiffness_matrix(num_nodes, nodal_points, elements, backend)
+        A = A[interior][:, interior]
+
+        # Solve linear system
+        options = {} if (tolerance is None or engine not in ITERATIVE_ENGINES) else {"tolerance": tolerance}
+        if (engine == "domain_decomposition"):
+            solution_temp = solve_domain_decomposition(A, F, interior, nodal_points, elements, **options)
+        elif (engine == "polar_cg"):
+            solution_temp = solve_polar_preconditioned(A, F, interior, nodal_points, num_nodes, **options)
+        else:
+            solution_temp = ENGINES[engine](A, F, **options)
 
     # Get the full solution by adding zeros on boundary again
     sol = np.zeros(num_nodes)
-    sol[:len(solution_temp)] = solution_temp
+    sol[interior] = solution_temp
 
     # Return the solution, and nodal_points + elements for plotting
-    return sol, nodal_points, elements, boundary_edges
+    return solution.Solution(sol, nodal_points, elements, boundary_edges)
+
+#----------------------------------------------------------------------------------------
+
+def interior_nodes(num_nodes, boundary_edges):
+    '''
+        Finds the nodes that are not on the boundary of the mesh.
+        ----------------
+        Inputs:
+            num_nodes (int): Total number of nodes in the finite element mesh
+            boundary_edges (ndarray): list of boundary edges we get from mesh generation
+        ----------------
+        Output:
+            interior (ndarray): sorted array of the indices of all interior nodes
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            The interior nodes are the degrees of freedom that remain after the homogeneous
+            dirichlet boundary conditions are imposed.
+    '''
+    edge_nodes = np.unique(boundary_edges).astype(int)
+    return np.setdiff1d(np.arange(num_nodes), edge_nodes)
+
+#----------------------------------------------------------------------------------------
+
+def factorize_stiffness(num_nodes, nodal_points, elements, boundary_edges):
+    '''
+        Assembles the stiffness matrix and computes a sparse LU factorization of it
+        with the boundary conditions imposed.
+        ----------------
+        Inputs:
+            num_nodes (int): Total number of nodes in the finite element mesh
+            nodal_points (ndarray): the nodal_points we get from the mesh generation
+            elements (ndarray): the elements we get from mesh generation
+            boundary_edges (ndarray): list of boundary edges we get from mesh generation
+        ----------------
+        Output:
+            interior (ndarray): indices of the interior nodes, see interior_nodes()
+            factor: scipy.sparse.linalg.SuperLU factorization of the stiffness matrix
+                    restricted to the interior nodes
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            The stiffness matrix only depends on the mesh, so the factorization can be reused
+            for any number of right hand sides with solve_factorized().
+    '''
+    A = stiffmat.sparse_stiffness_matrix(num_nodes, nodal_points, elements)
+    interior = interior_nodes(num_nodes, boundary_edges)
+    factor = spsla.splu(A[interior][:, interior].tocsc())
+    return interior, factor
+
+#----------------------------------------------------------------------------------------
+
+def solve_factorized(num_nodes, nodal_points, elements, interior, factor, right_hand_side = loadvec.zero_func,
+                     backend = "numpy"):
+    '''
+        Solves the poisson problem with a stiffness matrix factorized by factorize_stiffness().
+        ----------------
+        Inputs:
+            num_nodes (int): Total number of nodes in the finite element mesh
+            nodal_points (ndarray): the nodal_points we get from the mesh generation
+            elements (ndarray): the elements we get from mesh generation
+            interior (ndarray): indices of the interior nodes
+            factor: factorization of the interior stiffness matrix
+            right_hand_side: the function on the right hand side of the original poisson equation (f(x, y))
+            backend (str): "numpy" (default) or "numba", see assemble_load_vector.vectorized_load_vector()
+        ----------------
+        Output:
+            sol: A vector of length num_nodes that is the solution to the poisson problem
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            Only the load vector is assembled, after which the solution on the interior
+            nodes is found by forward and backward substitution. The boundary nodes are zero.
+    '''
+    F = loadvec.vectorized_load_vector(num_nodes, nodal_points, elements, right_hand_side, backend)
+
+    sol = np.zeros(num_nodes)
+    sol[interior] = factor.solve(F[interior])
+    return sol
+
+#----------------------------------------------------------------------------------------
+
+def solve_dense(A, F):
+    '''
+        Solves A x = F with a dense LU factorization. A is a scipy.sparse matrix.
+    '''
+    return np.linalg.solve(A.toarray(), F)
+
+#----------------------------------------------------------------------------------------
+
+def solve_sparse(A, F):
+    '''
+        Solves A x = F with a sparse LU factorization (SuperLU with COLAMD ordering).
+    '''
+    return spsla.splu(A.tocsc()).solve(F)
+
+#----------------------------------------------------------------------------------------
+
+def solve_banded(A, F):
+    '''
+        Solves A x = F with a banded Cholesky factorization.
+        ----------------
+        Long description:
+            The unknowns are first permuted with reverse Cuthill-McKee to make the
+            bandwidth small, then the upper band of the symmetric positive definite
+            matrix is stored in LAPACK banded form and passed to solveh_banded().
+    '''
+    A = A.tocsr()
+    permutation = spcg.reverse_cuthill_mckee(A, symmetric_mode=True)
+    A = A[permutation][:, permutation].tocoo()
+
+    upper = A.col >= A.row
+    rows, cols, values = A.row[upper], A.col[upper], A.data[upper]
+    bandwidth = int(np.max(cols - rows, initial=0))
+
+    ab = np.zeros((bandwidth + 1, A.shape[0]))
+    ab[bandwidth + rows - cols, cols] = values
+
+    x = np.empty_like(F, dtype=float)
+    x[permutation] = spla.solveh_banded(ab, F[permutation])
+    return x
+
+#----------------------------------------------------------------------------------------
+
+def conjugate_gradient(A, F, tolerance = 1e-10, M = None):
+    '''
+        Runs scipy's conjugate gradient method and warns if it does not converge.
+        ----------------
+        Long description:
+            The relative tolerance keyword of scipy.sparse.linalg.cg() was renamed from
+            tol to rtol in scipy 1.12, both versions are supported.
+    '''
+    if "rtol" in inspect.signature(spsla.cg).parameters:
+        x, info = spsla.cg(A, F, rtol=tolerance, atol=0.0, M=M)
+    else:
+        x, info = spsla.cg(A, F, tol=tolerance, atol=0.0, M=M)
+    if (info != 0):
+        logger.warning("Conjugate gradient stopped without converging (info = %d)", info)
+    return x
+
+#----------------------------------------------------------------------------------------
+
+def solve_iterative(A, F, tolerance = 1e-10):
+    '''
+        Solves A x = F with the Jacobi preconditioned conjugate gradient method.
+        A can be a scipy.sparse matrix or any LinearOperator with a diagonal() method,
+        like assemble_stiffness_matrix.StiffnessOperator.
+    '''
+    inverse_diagonal = 1 / A.diagonal()
+    M = spsla.LinearOperator(A.shape, matvec=lambda r: inverse_diagonal * r.ravel())
+    return conjugate_gradient(A, F, tolerance, M=M)
+
+#----------------------------------------------------------------------------------------
+
+def mixed_precision_refinement(A, F, tolerance = 1e-10, max_steps = 20):
+    '''
+        Solves A x = F with a single precision LU factorization and double precision iterative refinement.
+        ----------------
+        Inputs:
+            A: scipy.sparse matrix
+            F: right hand side
+            tolerance (float): relative residual ||F - A x|| / ||F|| to reach
+            max_steps (int): maximum number of refinement steps
+        ----------------
+        Output:
+            x: the solution, in double precision
+            steps (int): number of refinement steps that were done
+            residual (float): the relative residual of x
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            A is factorized by SuperLU in float32, which halves the memory of the factors
+            and the bandwidth of the triangular solves. Every step computes the residual
+            r = F - A x in float64, solves A d = r with the float32 factors and updates
+            x += d. The error shrinks by about cond(A) * 6e-8 per step, so a few steps give
+            full double precision for the condition numbers ~ num_nodes of the stiffness
+            matrix. The residual is scaled to unit norm before it is rounded to float32.
+            The refinement stops early when the residual no longer decreases, which
+            happens when tolerance is below what float64 can resolve.
+    '''
+    factor = spsla.splu(A.astype(np.float32).tocsc())
+    norm_F = np.linalg.norm(F)
+    x = np.zeros(A.shape[0])
+    if (norm_F == 0):
+        return x, 0, 0.0
+
+    residual = 1.0
+    r = F
+    for steps in range(1, max_steps + 1):
+        norm_r = np.linalg.norm(r)
+        x += norm_r * factor.solve((r / norm_r).astype(np.float32))
+        r = F - A @ x
+        previous, residual = residual, np.linalg.norm(r) / norm_F
+        if (residual <= tolerance or residual > previous / 2):
+            break
+    return x, steps, residual
+
+#----------------------------------------------------------------------------------------
+
+def solve_mixed_precision(A, F, tolerance = 1e-10):
+    '''
+        Solves A x = F with mixed_precision_refinement(), logs the number of refinement
+        steps and warns if the tolerance is not reached.
+    '''
+    x, steps, residual = mixed_precision_refinement(A, F, tolerance)
+    if (residual > tolerance):
+        logger.warning("Mixed precision refinement stopped at relative residual %.3g after %d steps", residual, steps)
+    else:
+        logger.info("Mixed precision refinement reached relative residual %.3g in %d steps", residual, steps)
+    return x
+
+#----------------------------------------------------------------------------------------
+
+def solve_domain_decomposition(A, F, interior, nodal_points, elements, num_sectors = None,
+                               overlap = 2, processes = True, tolerance = 1e-10):
+    '''
+        Solves A x = F with conjugate gradients preconditioned by angular-sector domain decomposition.
+        ----------------
+        Inputs:
+            A: the stiffness matrix restricted to the interior nodes
+            F: the load vector restricted to the interior nodes
+            interior (ndarray): indices of the interior nodes
+            nodal_points (ndarray): the nodal_points we get from the mesh generation
+            elements (ndarray): the elements we get from mesh generation
+            num_sectors (int): number of subdomains (default: ddm.DEFAULT_SECTORS)
+            overlap (int): number of layers of nodes the subdomains overlap with
+            processes (bool): factorize and solve the subdomains in worker processes
+            tolerance (float): relative residual at which conjugate gradients stop
+        ----------------
+        Output:
+            x: solution on the interior nodes
+        ----------------
+        Raises:
+            ValueError: If num_sectors is smaller than 1
+        ----------------
+        Long description:
+            The elements are split into angular sectors around the centre node, the sectors
+            are grown into overlapping subdomains, and every subdomain is factorized in its
+            own worker process. See domain_decomposition.py. The subdomain solves are an
+            additive Schwarz preconditioner for conjugate gradients on the whole system;
+            there is no substructuring, and no Schur complement on the interfaces is
+            formed. The workers are stopped when the solve is finished.
+    '''
+    if num_sectors is None:
+        num_sectors = ddm.DEFAULT_SECTORS
+    elements = np.asarray(elements, dtype=int)
+
+    sectors = ddm.sector_partition(nodal_points, elements, num_sectors)
+    owned, extended = ddm.subdomains(A, interior, elements, sectors, num_sectors, overlap)
+
+    with ddm.SchwarzPreconditioner(A, owned, extended, processes) as preconditioner:
+        return conjugate_gradient(A, F, tolerance, M=preconditioner.as_linear_operator())
+
+#----------------------------------------------------------------------------------------
+
+def solve_polar_preconditioned(A, F, interior, nodal_points, num_nodes, tolerance = 1e-10):
+    '''
+        Solves A x = F with conjugate gradients preconditioned by the fast polar grid solver.
+        ----------------
+        Inputs:
+            A: the stiffness matrix restricted to the interior nodes
+            F: the load vector restricted to the interior nodes
+            interior (ndarray): indices of the interior nodes
+            nodal_points (ndarray): the nodal_points we get from the mesh generation
+            num_nodes (int): Total number of nodes, sets the size of the polar grid
+            tolerance (float): relative residual at which conjugate gradients stop
+        ----------------
+        Output:
+            x: solution on the interior nodes
+        ----------------
+        Raises:
+            -
+        ----------------
+        Long description:
+            Every iteration costs one FFT based solve on the polar grid and a sparse
+            matrix-vector product, and the number of iterations does not grow with the
+            number of nodes, see polar_solver.PolarPreconditioner. Nothing is factorized,
+            so the memory use stays a small multiple of the size of A.
+    '''
+    grid = polar.PolarPoissonSolver(*polar.polar_grid_size(num_nodes))
+    preconditioner = polar.PolarPreconditioner(A, grid, nodal_points, interior)
+    return conjugate_gradient(A, F, tolerance, M=preconditioner.as_linear_operator())
+
+#----------------------------------------------------------------------------------------
+
+ENGINES = {
+    "dense": solve_dense,
+    "sparse": solve_sparse,
+    "banded": solve_banded,
+    "iterative": solve_iterative,
+    "mixed_precision": solve_mixed_precision,
+}
+
+# Engines that stop at a tolerance, see the tolerance argument of solver()
+ITERATIVE_ENGINES = ["iterative", "mixed_precision", "matrix_free", "domain_decomposition", "polar_cg"]
+
+# Engines that need more than A and F, handled separately in solver()
+SPECIAL_ENGINES = ["matrix_free", "domain_decomposition", "radial", "polar", "polar_cg"]
+
+# Engines plan_engine() chooses from. mixed_precision changes the numerics (float32 factors),
+# so it is only used when asked for.
+PLANNED_ENGINES = [engine for engine in ENGINES if engine != "mixed_precision"] + ["matrix_free"]
+
+#----------------------------------------------------------------------------------------
+
+def expected_num_elements(num_nodes):
+    '''
+        Computes the number of elements generate_mesh() gives, without generating the mesh.
+        ----------------
+        Long description:
+            A Delaunay triangulation of n points of which b lie on the convex hull has
+            2n - b - 2 triangles. For the unit circle mesh, the convex hull is the outermost
+            circle, which has dof_in_circles[-1] nodes.
+    '''
+    _, _, dof_in_circles, _ = mesh.circle_data(num_nodes)
+    return 2 * num_nodes - int(dof_in_circles[-1]) - 2
+
+#----------------------------------------------------------------------------------------
+
+def available_memory():
+    '''
+        Returns the number of bytes of memory available to new allocations.
+        ----------------
+        Long description:
+            Uses MemAvailable from /proc/meminfo when it exists, and otherwise the
+            number of free physical pages. Returns None if neither can be read.
+    '''
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+#----------------------------------------------------------------------------------------
+
+def estimate_cost(engine, num_nodes, num_elements):
+    '''
+        Estimates the memory use and run time of solving the poisson problem with an engine.
+        ----------------
+        Inputs:
+            engine (str): one of ENGINES or "matrix_free"
+            num_nodes (int): Total number of nodes in the finite element mesh
+            num_elements (int): Total number of elements in the finite element mesh
+        ----------------
+        Output:
+            memory (float): estimated peak memory use in bytes
+            time (float): estimated run time in seconds
+        ----------------
+        Raises:
+            ValueError: If engine is unknown
+        ----------------
+        Long description:
+            The estimates are order of magnitude models, good enough to rank the engines
+            and to catch problems that cannot fit in memory:
+            - every engine pays for the COO triplets and CSR matrix of the sparse assembly
+            - dense: the interior matrix is stored in full and LU factorized
+            - banded: after reverse Cuthill-McKee the bandwidth of the unit circle mesh is
+              about 1.4 sqrt(n), and the Cholesky factorization takes n * bandwidth^2 operations
+            - sparse: the LU factors of a 2D problem hold about 10 n log2(n) nonzeros
+              and take about n^1.5 operations
+            - mixed_precision: the same fill as sparse, stored in float32 (8 bytes per
+              nonzero with the index), a factorization at the speed of the sparse one
+              in single precision, and refinement steps that each stream the factors and
+              the matrix. Each step reduces the error by about 1.5e-8 n, which sets the
+              number of steps to reach a residual of 1e-10. It is ruled out (infinite
+              time) when that reduction is not below 1/2.
+            - iterative: conjugate gradients on a matrix with condition number ~ n need
+              about 2 sqrt(n) iterations, each streaming the matrix and a few vectors
+            - matrix_free: no assembly, 6 numbers per element and the temporaries of one
+              product are stored. It needs as many iterations as iterative, but every
+              product moves about 800 bytes per element (measured with NumPy).
+    '''
+    n = max(num_nodes, 2)
+    nnz = 7 * n
+    assembly_memory = 9 * num_elements * 24 + nnz * 12 + 3 * n * 8
+    assembly_time = 9 * num_elements * 24 / MEMORY_BANDWIDTH
+
+    if (engine == "dense"):
+        memory = 8 * n**2
+        time = (2 / 3) * n**3 / FLOP_RATE
+    elif (engine == "banded"):
+        bandwidth = 1.4 * np.sqrt(n)
+        memory = 8 * (bandwidth + 1) * n
+        time = n * bandwidth**2 / FLOP_RATE
+    elif (engine == "sparse"):
+        fill = 10 * n * np.log2(n)
+        memory = 12 * fill
+        time = 50 * n**1.5 / SPARSE_FLOP_RATE
+    elif (engine == "mixed_precision"):
+        fill = 10 * n * np.log2(n)
+        memory = 8 * fill + 3 * 8 * n
+        reduction = 1.5e-8 * n
+        steps = np.ceil(np.log(1e-10) / np.log(reduction)) if reduction < 0.5 else np.inf
+        time = 0.6 * 50 * n**1.5 / SPARSE_FLOP_RATE + steps * (8 * fill + 12 * nnz) / MEMORY_BANDWIDTH
+    elif (engine == "iterative"):
+        iterations = 2 * np.sqrt(n)
+        memory = 6 * 8 * n
+        time = iterations * (12 * nnz + 6 * 8 * n) / MEMORY_BANDWIDTH
+    elif (engine == "matrix_free"):
+        iterations = 2 * np.sqrt(n)
+        memory = 12 * 8 * num_elements + 6 * 8 * n
+        time = iterations * 800 * num_elements / MEMORY_BANDWIDTH
+        return memory, time
+    else:
+        raise ValueError (f"engine needs to be one of {', '.join(list(ENGINES) + ['matrix_free'])}, but is {engine}")
+
+    return assembly_memory + memory, assembly_time + time
+
+#----------------------------------------------------------------------------------------
+
+def plan_engine(num_nodes, num_elements, memory_limit = None):
+    '''
+        Chooses the fastest engine whose estimated memory use fits in memory.
+        ----------------
+        Inputs:
+            num_nodes (int): Total number of nodes in the finite element mesh
+            num_elements (int): Total number of elements in the finite element mesh
+            memory_limit (int): number of bytes the solve may use (default: MEMORY_FRACTION
+                                of available_memory(), or no limit if that is unknown)
+        ----------------
+        Output:
+            engine (str): the chosen engine, one of PLANNED_ENGINES
+        ----------------
+        Raises:
+            ValueError: If none of the engines is estimated to fit in memory_limit
+        ----------------
+        Long description:
+            The estimates come from estimate_cost(). The decision is logged together with
+            the estimates, so it can be checked and overridden with the engine argument
+            of solver().
+    '''
+    if memory_limit is None:
+        memory = available_memory()
+        memory_limit = np.inf if memory is None else MEMORY_FRACTION * memory
+
+    estimates = {engine: estimate_cost(engine, num_nodes, num_elements) for engine in PLANNED_ENGINES}
+    fitting = [engine for engine in PLANNED_ENGINES if estimates[engine][0] <= memory_limit]
+
+    if not fitting:
+        smallest = min(PLANNED_ENGINES, key=lambda engine: estimates[engine][0])
+        raise ValueError (f"No engine fits in {memory_limit / 1e9:.3g} GB for num_nodes = {num_nodes}. "
+                          f"The smallest estimate is {estimates[smallest][0] / 1e9:.3g} GB with the {smallest} engine.")
+
+    engine = min(fitting, key=lambda engine: estimates[engine][1])
+    logger.info("Using the %s engine for num_nodes = %d (estimated %.3g GB, %.3g s; limit %.3g GB)",
+                engine, num_nodes, estimates[engine][0] / 1e9, estimates[engine][1], memory_limit / 1e9)
+    return engine
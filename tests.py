@@ -1,5 +1,15 @@
+import asyncio
+import json
+import os
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from math import factorial
+
 import pytest
 import numpy as np
+import scipy.special
+import scipy.sparse as sps
+import scipy.sparse.linalg as spsla
 from hypothesis import given, settings
 from hypothesis import strategies as st
 
@@ -8,6 +18,20 @@ import generate_mesh as gm
 import assemble_stiffness_matrix as stiffness
 import assemble_load_vector as load
 import solver
+import server
+import operator_cache as opcache
+import numba_kernels
+import export
+import assemble_mass_matrix as massmat
+import eigen_solver
+import domain_decomposition as ddm
+import radial_solver
+import polar_solver
+import incremental_assembly
+import nonlinear_solver
+import postprocessing
+import polynomial
+import solution
 
 
 #----------------------------------------------------------------------------------------
@@ -59,6 +83,24 @@ def test_gaussian_quadrature_2d_advanced():
 
 #----------------------------------------------------------------------------------------
 
+def test_quadrature_rule_degree_5():
+    '''
+        Tests that the 7-point rule integrates all monomials x^a y^b of degree at most 5
+        exactly on the reference triangle, where the integral is a! b! / (a+b+2)!.
+    '''
+
+    p1 = np.array([0, 0])
+    p2 = np.array([1, 0])
+    p3 = np.array([0, 1])
+
+    for a in range(6):
+        for b in range(6-a):
+            exact = factorial(a)*factorial(b)/factorial(a+b+2)
+            numerical_value = numint.gaussian_quadrature_2D(p1, p2, p3, 7, lambda x, y: x**a*y**b)
+            assert np.isclose(numerical_value, exact, rtol = 1e-12), f"7-point rule is not exact for x^{a} y^{b}"
+
+#----------------------------------------------------------------------------------------
+
 # Tests from generate_mesh.py
 #----------------------------------------------------------------------------------------
 
@@ -244,6 +286,83 @@ def test_generate_mesh_elements(num_nodes):
 
 #----------------------------------------------------------------------------------------
 
+@given(num_nodes = st.integers(4, 2000), curve = st.sampled_from(["hilbert", "morton"]))
+@settings(max_examples = 20, deadline=None)
+def test_renumber_mesh(num_nodes, curve):
+    '''
+        Tests that renumber_mesh() only changes the numbering of the mesh: the permutation
+        maps the new nodes to the old ones, and every element and boundary edge is made up
+        of the same points as before.
+    '''
+    nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+    new_points, new_elements, new_edges, permutation = gm.renumber_mesh(nodal_points, elements, boundary_edges, curve)
+
+    assert np.array_equal(np.sort(permutation), np.arange(num_nodes)), "The renumbering must be a permutation"
+    assert np.array_equal(new_points, nodal_points[permutation]), "Nodal points must follow the permutation"
+
+    old_triangles = {tuple(sorted(map(tuple, nodal_points[element]))) for element in elements}
+    new_triangles = {tuple(sorted(map(tuple, new_points[element]))) for element in new_elements}
+    assert old_triangles == new_triangles, "The elements must cover the same triangles"
+
+    old_edges = np.sort(permutation[new_edges.astype(int)], axis=1)
+    assert np.array_equal(old_edges, np.sort(boundary_edges.astype(int), axis=1)), "Boundary edges are inconsistent"
+
+#----------------------------------------------------------------------------------------
+
+def test_space_filling_curve_index_hilbert():
+    '''
+        Tests that the Hilbert curve visits every point of an 8x8 grid once and only
+        moves to a neighbouring grid point in each step.
+    '''
+    grid = np.array([[i, j] for i in range(8) for j in range(8)], dtype=float)
+    index = gm.space_filling_curve_index(grid, "hilbert", order = 3)
+    steps = np.diff(grid[np.argsort(index)], axis=0)
+
+    assert np.array_equal(np.sort(index), np.arange(64)), "Every grid point must get its own index"
+    assert np.all(np.abs(steps).sum(axis=1) == 1), "The Hilbert curve must move between neighbours"
+
+#----------------------------------------------------------------------------------------
+
+def test_refine_mesh():
+    '''
+        Tests that uniform refinement keeps the old nodes, splits every element into four
+        elements of a quarter of the area, and puts the new boundary nodes on the circle.
+    '''
+    nodal_points, elements, boundary_edges = gm.generate_mesh(300)
+    fine_points, fine_elements, fine_edges = gm.refine_mesh(nodal_points, elements, boundary_edges)
+
+    _, areas = stiffness.element_geometry(nodal_points, elements)
+    _, fine_areas = stiffness.element_geometry(fine_points, fine_elements)
+
+    assert np.array_equal(fine_points[:300], nodal_points), "The old nodes must keep their indices"
+    assert len(fine_elements) == 4 * len(elements) and len(fine_edges) == 2 * len(boundary_edges)
+    assert len(fine_points) == 300 + len(np.unique(np.sort(np.vstack([elements[:, :2], elements[:, 1:], elements[:, ::2]]), axis = 1), axis = 0))
+    assert np.all(fine_areas > 0), "Refinement created degenerate elements"
+    assert np.sum(fine_areas) > np.sum(areas) and np.sum(fine_areas) < np.pi, "The refined mesh should approximate the circle better"
+
+    boundary_nodes = np.unique(fine_edges.astype(int))
+    assert np.allclose(np.linalg.norm(fine_points[boundary_nodes], axis = 1), 1), "Boundary nodes must lie on the circle"
+
+#----------------------------------------------------------------------------------------
+
+def test_boundary_normals():
+    '''
+        Tests that the boundary normals of the unit circle mesh point outwards, are
+        perpendicular to their edges and have the length of their edges.
+    '''
+    nodal_points, elements, boundary_edges = gm.generate_mesh(300)
+    owners, normals = gm.boundary_normals(nodal_points, elements, boundary_edges)
+
+    boundary = boundary_edges.astype(int)
+    edge = nodal_points[boundary[:, 1]] - nodal_points[boundary[:, 0]]
+    midpoint = 0.5 * (nodal_points[boundary[:, 1]] + nodal_points[boundary[:, 0]])
+    assert np.all((owners[:, :, None] == boundary[:, None, :]).any(axis = 1)), "Every owner must contain its edge"
+    assert np.allclose(np.sum(normals * edge, axis = 1), 0), "Normals must be perpendicular to the edges"
+    assert np.allclose(np.linalg.norm(normals, axis = 1), np.linalg.norm(edge, axis = 1))
+    assert np.all(np.sum(normals * midpoint, axis = 1) > 0), "Normals must point out of the circle"
+
+#----------------------------------------------------------------------------------------
+
 # Tests from assemble_stiffness_matrix
 #----------------------------------------------------------------------------------------
 
@@ -297,6 +416,86 @@ def test_stiffness_matrix(num_nodes):
 
 #----------------------------------------------------------------------------------------
 
+@given(num_nodes = st.integers(4, 1000))
+@settings(max_examples = 20, deadline=None)
+def test_sparse_stiffness_matrix(num_nodes):
+    '''
+        Tests that the sparse assembly gives the same stiffness matrix as the
+        element by element assembly in stiffness_matrix().
+    '''
+    nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+
+    A_dense = stiffness.stiffness_matrix(num_nodes, nodal_points, elements)
+    A_sparse = stiffness.sparse_stiffness_matrix(num_nodes, nodal_points, elements)
+
+    assert A_sparse.shape == (num_nodes, num_nodes), "Sparse stiffness matrix has the wrong shape"
+    assert np.allclose(A_sparse.toarray(), A_dense), "Sparse and dense stiffness matrices differ"
+
+#----------------------------------------------------------------------------------------
+
+def test_stiffness_operator():
+    '''
+        Tests that the matrix-free stiffness operator gives the same products and diagonal
+        as the assembled sparse matrix restricted to the interior nodes.
+    '''
+    num_nodes = 1500
+    nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+    interior = solver.interior_nodes(num_nodes, boundary_edges)
+    A = stiffness.sparse_stiffness_matrix(num_nodes, nodal_points, elements)[interior][:, interior]
+
+    for backend in ["numpy", "numba"]:
+        operator = stiffness.StiffnessOperator(num_nodes, nodal_points, elements, interior, backend)
+        u = np.random.default_rng(0).random(len(interior))
+        assert operator.shape == A.shape, "Wrong shape of the operator"
+        assert np.allclose(operator @ u, A @ u, atol = 1e-12), f"Matrix-free product differs ({backend})"
+        assert np.allclose(operator.T @ u, A @ u, atol = 1e-12), f"Matrix-free operator is not symmetric ({backend})"
+        assert np.allclose(operator.diagonal(), A.diagonal()), f"Matrix-free diagonal differs ({backend})"
+
+    sol, _, _, _ = solver.solver(600, lambda x, y: np.sin(2*x)+y**2, engine = "matrix_free")
+    sol_dense, _, _, _ = solver.solver(600, lambda x, y: np.sin(2*x)+y**2, engine = "dense")
+    assert np.allclose(sol, sol_dense, atol = 1e-8), "The matrix_free engine gives a different solution"
+
+#----------------------------------------------------------------------------------------
+
+def test_incremental_assembly():
+    '''
+        Tests that moving some nodes and updating the stiffness matrix and load vector in
+        place gives the same result as assembling them again on the moved mesh.
+    '''
+
+    def f(x, y):
+        return np.exp(x)*y+1
+
+    num_nodes = 2000
+    nodal_points, elements, _ = gm.generate_mesh(num_nodes)
+    assembly = incremental_assembly.IncrementalAssembly(num_nodes, nodal_points, elements, f)
+    A, F = assembly.A, assembly.F
+
+    rng = np.random.default_rng(1)
+    moved = np.array([0, 17, 18, 500, 1200])
+    new_points = nodal_points[moved] + 0.002 * rng.standard_normal((len(moved), 2))
+    affected = assembly.move_nodes(moved, new_points)
+
+    moved_points = nodal_points.copy()
+    moved_points[moved] = new_points
+    assert A is assembly.A and F is assembly.F, "A and F must be updated in place"
+    assert np.allclose(A.toarray(), stiffness.sparse_stiffness_matrix(num_nodes, moved_points, elements).toarray(), atol = 1e-12)
+    assert np.allclose(F, load.vectorized_load_vector(num_nodes, moved_points, elements, f), atol = 1e-14)
+    assert np.array_equal(affected, np.flatnonzero(np.isin(elements, moved).any(axis = 1))), "Wrong affected elements"
+
+    # Many updates, like an optimization loop, must not let rounding errors build up
+    for step in range(1000):
+        nodes = rng.choice(np.arange(100, 300), size = 3, replace = False)
+        assembly.move_nodes(nodes, assembly.nodal_points[nodes] + 0.001 * rng.standard_normal((3, 2)))
+    fresh = incremental_assembly.IncrementalAssembly(num_nodes, assembly.nodal_points, elements, f)
+    assert np.max(np.abs(A.data - fresh.A.data)) <= 4 * np.finfo(float).eps * np.max(np.abs(fresh.A.data)), "A drifted over the updates"
+    assert np.max(np.abs(F - fresh.F)) <= 4 * np.finfo(float).eps * np.max(np.abs(fresh.F)), "F drifted over the updates"
+
+    with pytest.raises(ValueError):
+        assembly.move_nodes([1, 2], [[0.0, 0.0]])
+
+#----------------------------------------------------------------------------------------
+
 # Tests from assemble_load_vector
 #----------------------------------------------------------------------------------------
 
@@ -346,6 +545,180 @@ def test_load_vector(num_nodes):
 
 #----------------------------------------------------------------------------------------
 
+@given(num_nodes = st.integers(4, 1000))
+@settings(max_examples = 20, deadline=None)
+def test_vectorized_load_vector(num_nodes):
+    '''
+        Tests that the vectorized assembly gives the same load vector as load_vector().
+        The constant function f = 1 checks that scalar valued right hand sides work.
+    '''
+    def f_test(x, y):
+        return np.sin(x)+y**2
+
+    nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+
+    for f in [f_test, lambda x, y: 1]:
+        F = load.load_vector(num_nodes, nodal_points, elements, f)
+        F_vectorized = load.vectorized_load_vector(num_nodes, nodal_points, elements, f)
+        assert np.allclose(F_vectorized, F), "Vectorized and looped load vectors differ"
+
+#----------------------------------------------------------------------------------------
+
+def test_adaptive_load_vector_peaked():
+    '''
+        Tests that the adaptive quadrature integrates a sharply peaked right hand side
+        much better than the fixed 4-point rule. As the basis functions sum to one, the
+        entries of the load vector sum to the integral of f, which for the bump
+        f(x, y) = exp(-((x-0.3)^2+(y-0.2)^2)/eps^2) is pi*eps^2 up to a negligible tail.
+    '''
+    eps = 0.03
+
+    def f_peaked(x, y):
+        return np.exp(-((x-0.3)**2+(y-0.2)**2)/eps**2)
+
+    num_nodes = 1000
+    nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+    exact = np.pi*eps**2
+
+    F_fixed = load.vectorized_load_vector(num_nodes, nodal_points, elements, f_peaked)
+    F_adaptive = load.adaptive_load_vector(num_nodes, nodal_points, elements, f_peaked, tolerance = 1e-12)
+
+    assert abs(np.sum(F_adaptive) - exact) < 1e-9, "Adaptive quadrature should resolve the peak"
+    assert abs(np.sum(F_adaptive) - exact) < 1e-3 * abs(np.sum(F_fixed) - exact), "Adaptive quadrature should beat the fixed rule"
+
+#----------------------------------------------------------------------------------------
+
+def test_adaptive_load_vector_evaluations():
+    '''
+        Tests that the adaptive quadrature reaches the accuracy of uniformly refining every
+        element with the fixed 4-point rule with fewer evaluations of f. The peaked
+        right hand side of test_adaptive_load_vector_peaked() is used, and the accuracy is
+        that of the integral of f, the sum of the load vector.
+    '''
+    eps = 0.03
+    evaluations = [0]
+
+    def f_peaked(x, y):
+        evaluations[0] += np.size(x)
+        return np.exp(-((x-0.3)**2+(y-0.2)**2)/eps**2)
+
+    num_nodes = 1000
+    nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+    exact = np.pi*eps**2
+
+    F_adaptive = load.adaptive_load_vector(num_nodes, nodal_points, elements, f_peaked, tolerance = 1e-10)
+    adaptive_error = abs(np.sum(F_adaptive) - exact)
+    adaptive_evaluations = evaluations[0]
+
+    # Uniform refinement: split every triangle into four until the 4-point rule is as accurate
+    z, rho = numint.quadrature_rule(4)
+    triangles = nodal_points[elements]
+    while True:
+        evaluations[0] = 0
+        d1 = triangles[:, 1] - triangles[:, 0]
+        d2 = triangles[:, 2] - triangles[:, 0]
+        area = 0.5 * np.abs(d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0])
+        integral = np.sum(area * (f_peaked(triangles[:, :, 0] @ z.T, triangles[:, :, 1] @ z.T) @ rho))
+        if (abs(integral - exact) <= adaptive_error):
+            break
+        midpoints = 0.5 * (triangles + np.roll(triangles, -1, axis = 1))
+        triangles = np.concatenate([np.stack([triangles[:, 0], midpoints[:, 0], midpoints[:, 2]], axis = 1),
+                                    np.stack([midpoints[:, 0], triangles[:, 1], midpoints[:, 1]], axis = 1),
+                                    np.stack([midpoints[:, 2], midpoints[:, 1], triangles[:, 2]], axis = 1),
+                                    midpoints])
+
+    assert adaptive_evaluations < evaluations[0], "Adaptive quadrature should need fewer evaluations of f"
+
+#----------------------------------------------------------------------------------------
+
+def test_adaptive_load_vector_polynomial():
+    '''
+        Tests that the adaptive quadrature agrees with the fixed rule when the fixed rule
+        is already exact, which it is when f is a polynomial of degree at most 2, and that
+        a nearly constant f costs no more evaluations than the fixed rule.
+    '''
+    def f_test(x, y):
+        return x**2+3*y*x+1
+
+    num_nodes = 500
+    nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+
+    F = load.vectorized_load_vector(num_nodes, nodal_points, elements, f_test)
+    F_adaptive = load.adaptive_load_vector(num_nodes, nodal_points, elements, f_test)
+
+    assert np.allclose(F_adaptive, F), "Adaptive and fixed quadrature differ for a polynomial"
+
+    with pytest.raises(ValueError):
+        load.adaptive_load_vector(num_nodes, nodal_points, elements, f_test, tolerance = 0)
+
+    # Where f is nearly constant, the cheap estimate accepts the 4-point rule everywhere
+    evaluations = [0]
+
+    def f_smooth(x, y):
+        evaluations[0] += np.size(x)
+        return 1 + 1e-6*np.sin(x)
+
+    F_smooth = load.adaptive_load_vector(num_nodes, nodal_points, elements, f_smooth, tolerance = 1e-8)
+    assert evaluations[0] == 4*len(elements), "A nearly constant f should only need the 4-point rule"
+    assert np.allclose(F_smooth, load.vectorized_load_vector(num_nodes, nodal_points, elements, f_smooth))
+
+#----------------------------------------------------------------------------------------
+
+def test_parse_polynomial():
+    '''
+        Tests that polynomials in text-form are recognized with the right coefficients,
+        and that other expressions, or polynomials that are too large, are not.
+    '''
+
+    f = polynomial.parse_polynomial("-(x-2*y)**2/4+np.pi*x*y+3")
+    assert f.coefficients == pytest.approx({(2, 0): -0.25, (1, 1): 1 + np.pi, (0, 2): -1, (0, 0): 3})
+    assert f.degree == 2
+
+    x, y = np.random.default_rng(0).random((2, 10))
+    assert np.allclose(f(x, y), -(x-2*y)**2/4+np.pi*x*y+3)
+
+    for expression in ["np.sin(x)", "x**0.5", "x**-1", "x/y", "1/(1+x)", "x**"]:
+        assert polynomial.parse_polynomial(expression) is None, f"{expression} is not a polynomial"
+
+    # Complex constants, overflowing coefficients and too high degrees are left to quadrature
+    for expression in ["(-1)**0.5*x", "x*10**400", "(x+y)**10**7", "((x**8)**8)**8"]:
+        assert polynomial.parse_polynomial(expression) is None, f"{expression} should not be expanded"
+    assert polynomial.parse_polynomial("(x+y)**64").degree == polynomial.MAX_DEGREE
+
+#----------------------------------------------------------------------------------------
+
+def test_polynomial_load_vector():
+    '''
+        Tests the exact load vector of a polynomial against the 7-point rule, which is
+        exact for polynomials of degree at most 4 (times the linear basis functions),
+        and against the 4-point rule, which is not.
+    '''
+
+    def f_test(x, y):
+        return 1+2*x-3*x*y+x**2*y**2-y**4
+
+    f_polynomial = polynomial.parse_polynomial("1+2*x-3*x*y+x**2*y**2-y**4")
+
+    num_nodes = 500
+    nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+    Fh = load.polynomial_load_vectors(nodal_points, elements, f_polynomial)
+
+    # The 7-point rule on every element
+    z, rho = numint.quadrature_rule(7)
+    p = nodal_points[elements]
+    _, areas = stiffness.element_geometry(nodal_points, elements)
+    Fh_7 = areas[:, None] * ((rho * f_test(p[:, :, 0] @ z.T, p[:, :, 1] @ z.T)) @ z)
+
+    assert np.allclose(Fh, Fh_7, rtol = 1e-12, atol = 1e-15), "The polynomial load vectors are not exact"
+
+    # The polynomial is recognized by the other load vector functions
+    F = load.vectorized_load_vector(num_nodes, nodal_points, elements, f_polynomial)
+    assert np.allclose(F, np.bincount(elements.ravel(), weights = Fh_7.ravel(), minlength = num_nodes), rtol = 1e-12, atol = 1e-15)
+    assert np.array_equal(load.adaptive_load_vector(num_nodes, nodal_points, elements, f_polynomial), F)
+    assert not np.allclose(load.vectorized_load_vector(num_nodes, nodal_points, elements, f_test), F, rtol = 1e-12, atol = 1e-15)
+
+#----------------------------------------------------------------------------------------
+
 # Tests for solver
 #----------------------------------------------------------------------------------------
 
@@ -405,3 +778,708 @@ def test_solver_advanced(num_nodes):
     # Hard to get it much smaller without smoothing the mesh more
     assert np.max(error) < 0.1, "Solver finds wrong solution for advanced function"
 
+
+
+#----------------------------------------------------------------------------------------
+
+def test_solve_factorized():
+    '''
+        Tests that solving with a reused factorization gives the same solution as solver()
+        for two different right hand sides.
+    '''
+    num_nodes = 500
+    nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+    interior, factor = solver.factorize_stiffness(num_nodes, nodal_points, elements, boundary_edges)
+
+    for f in [lambda x, y: x**2+y**2+1, lambda x, y: np.sin(x*y)]:
+        sol, _, _, _ = solver.solver(num_nodes, f)
+        sol_factorized = solver.solve_factorized(num_nodes, nodal_points, elements, interior, factor, f)
+        assert np.allclose(sol_factorized, sol), "Factorized solve differs from solver()"
+
+#----------------------------------------------------------------------------------------
+
+# Tests for server
+#----------------------------------------------------------------------------------------
+
+def test_operator_cache_lru():
+    '''
+        Tests that the operator cache reuses cached operators and evicts the least
+        recently used mesh size when it is full.
+    '''
+    cache = server.OperatorCache(max_entries = 2)
+
+    operator = cache.get(100)
+    cache.get(200)
+    assert cache.get(100) is operator, "Cached operator should be reused"
+
+    cache.get(300)
+    assert len(cache) == 2, "Cache should not grow beyond max_entries"
+    assert 100 in cache and 300 in cache, "Recently used operators should stay in the cache"
+    assert 200 not in cache, "The least recently used operator should be evicted"
+
+#----------------------------------------------------------------------------------------
+
+def test_serve_stream(tmp_path):
+    '''
+        Tests that the server answers every JSON-lines request, writes the same solution
+        as solver() and reports malformed requests, and expressions that use the python
+        builtins, as errors.
+    '''
+    output = tmp_path / "solution.npz"
+    requests = [{"id": 1, "num_nodes": 400, "rhs": "x**2+y**2+1", "output": str(output)},
+                {"id": 2, "num_nodes": 400},
+                {"id": 3, "num_nodes": 400, "rhs": "__import__('os').getpid()+x"}]
+    responses = []
+
+    async def run():
+        reader = asyncio.StreamReader()
+        for request in requests:
+            reader.feed_data((json.dumps(request) + "\n").encode())
+        reader.feed_eof()
+
+        async def respond(response):
+            responses.append(response)
+
+        with ThreadPoolExecutor(max_workers = 2) as executor:
+            await server.serve_stream(reader, respond, server.OperatorCache(), executor)
+
+    asyncio.run(run())
+    status = {response["id"]: response["status"] for response in responses}
+
+    assert status == {1: "ok", 2: "error", 3: "error"}, "Every request should be answered"
+
+    sol, _, _, _ = solver.solver(400, lambda x, y: x**2+y**2+1)
+    assert np.allclose(np.load(output)["solution"], sol), "Server solution differs from solver()"
+
+#----------------------------------------------------------------------------------------
+
+@pytest.mark.parametrize("curve", ["hilbert", "morton"])
+def test_solver_reorder(curve):
+    '''
+        Tests that the solver gives the same solution at every nodal point when the mesh
+        is renumbered along a space-filling curve, so boundary nodes no longer come last.
+    '''
+    def f(x, y):
+        return x**2+y**2+1
+
+    sol, nodal_points, _, _ = solver.solver(500, f)
+    sol_reordered, points_reordered, _, _ = solver.solver(500, f, reorder = curve)
+
+    order = np.lexsort(nodal_points.T)
+    order_reordered = np.lexsort(points_reordered.T)
+
+    assert np.allclose(points_reordered[order_reordered], nodal_points[order]), "Nodal points differ"
+    assert np.allclose(sol_reordered[order_reordered], sol[order]), "Solution differs after renumbering"
+
+#----------------------------------------------------------------------------------------
+
+@pytest.mark.parametrize("engine", ["dense", "sparse", "banded", "iterative"])
+def test_solver_engines(engine):
+    '''
+        Tests that all engines give the same solution as the dense engine.
+    '''
+    def f(x, y):
+        return np.sin(2*x)+y**2
+
+    sol_dense, _, _, _ = solver.solver(600, f, engine = "dense")
+    sol, _, _, _ = solver.solver(600, f, engine = engine)
+
+    assert np.allclose(sol, sol_dense, atol = 1e-8), f"The {engine} engine gives a different solution"
+
+#----------------------------------------------------------------------------------------
+
+def test_expected_num_elements():
+    '''
+        Tests that the number of elements is predicted correctly without generating the mesh.
+    '''
+    for num_nodes in [10, 315, 1000, 5000]:
+        _, elements, _ = gm.generate_mesh(num_nodes)
+        assert solver.expected_num_elements(num_nodes) == len(elements), "Wrong number of elements predicted"
+
+#----------------------------------------------------------------------------------------
+
+def test_plan_engine():
+    '''
+        Tests that the planner picks the fastest engine that fits in memory, avoids the
+        dense engine for large problems and fails early when nothing fits.
+    '''
+    num_nodes = 100000
+    num_elements = solver.expected_num_elements(num_nodes)
+    estimates = {engine: solver.estimate_cost(engine, num_nodes, num_elements) for engine in solver.PLANNED_ENGINES}
+
+    engine = solver.plan_engine(num_nodes, num_elements, memory_limit = np.inf)
+    assert engine == min(estimates, key = lambda e: estimates[e][1]), "Planner should pick the fastest engine"
+    assert engine != "dense", "The dense engine should not be chosen for large problems"
+
+    smallest = min(estimates, key = lambda e: estimates[e][0])
+    assert solver.plan_engine(num_nodes, num_elements, memory_limit = estimates[smallest][0]) == smallest
+
+    with pytest.raises(ValueError):
+        solver.plan_engine(num_nodes, num_elements, memory_limit = estimates[smallest][0] / 2)
+
+    # Without room for any assembled matrix, only the matrix-free engine fits
+    assert smallest == "matrix_free", "The matrix-free engine should need the least memory"
+
+    # The mixed precision engine is opt-in: auto keeps a double precision solve at every size
+    assert "mixed_precision" not in solver.PLANNED_ENGINES
+    for size in [10**3, 10**4, 10**5, 10**6]:
+        assert solver.plan_engine(size, solver.expected_num_elements(size), memory_limit = np.inf) in ["banded", "sparse"]
+
+    with pytest.raises(ValueError):
+        solver.solver(1000, engine = "not an engine")
+
+#----------------------------------------------------------------------------------------
+
+# Tests for operator_cache
+#----------------------------------------------------------------------------------------
+
+def test_cached_operator(tmp_path):
+    '''
+        Tests that a cached operator is read back from disk and gives the same solution
+        as a fresh factorization, and that another mesh gets another key.
+    '''
+
+    num_nodes = 500
+    nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+    interior = solver.interior_nodes(num_nodes, boundary_edges)
+
+    A, factor = opcache.cached_operator(num_nodes, nodal_points, elements, interior, tmp_path)
+    A_cached, factor_cached = opcache.cached_operator(num_nodes, nodal_points, elements, interior, tmp_path)
+
+    assert isinstance(factor_cached, opcache.TriangularFactor), "Second call should read the factors from disk"
+    assert (factor_cached.packed is not None) == numba_kernels.NUMBA_AVAILABLE, "Supernodes are only used with Numba"
+    assert np.allclose(A_cached.toarray(), A.toarray()), "Cached stiffness matrix differs"
+
+    F = np.random.default_rng(0).random(len(interior))
+    assert np.allclose(factor_cached.solve(F), factor.solve(F)), "Cached factorization solves differently"
+
+    other_points, other_elements, other_edges = gm.generate_mesh(num_nodes + 1)
+    other_interior = solver.interior_nodes(num_nodes + 1, other_edges)
+    assert opcache.operator_key(nodal_points, elements, interior) != \
+           opcache.operator_key(other_points, other_elements, other_interior), "Different meshes need different keys"
+
+#----------------------------------------------------------------------------------------
+
+def test_operator_cache_eviction(tmp_path):
+    '''
+        Tests that the cache evicts the least recently used operator when it grows
+        beyond max_bytes.
+    '''
+
+    paths = []
+    for num_nodes in [300, 400]:
+        nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+        interior = solver.interior_nodes(num_nodes, boundary_edges)
+        opcache.cached_operator(num_nodes, nodal_points, elements, interior, tmp_path)
+        paths.append(tmp_path / (opcache.operator_key(nodal_points, elements, interior) + ".npz"))
+
+    # Make the first operator the oldest one and shrink the cache to the newest one
+    newest = paths[1].stat().st_mtime
+    os.utime(paths[0], (newest - 10, newest - 10))
+    opcache.evict(tmp_path, paths[1].stat().st_size)
+
+    assert not paths[0].exists(), "The least recently used operator should be evicted"
+    assert paths[1].exists(), "The most recently used operator should be kept"
+
+#----------------------------------------------------------------------------------------
+
+def test_solver_cache_dir(tmp_path):
+    '''
+        Tests that solver() gives the same solution with a cold and a warm cache.
+    '''
+    def f(x, y):
+        return np.cos(x)*y
+
+    sol, _, _, _ = solver.solver(700, f, engine = "sparse")
+    sol_cold, _, _, _ = solver.solver(700, f, cache_dir = tmp_path)
+    sol_warm, _, _, _ = solver.solver(700, f, cache_dir = tmp_path)
+
+    assert np.allclose(sol_cold, sol) and np.allclose(sol_warm, sol), "Cached solve differs from solver()"
+
+#----------------------------------------------------------------------------------------
+
+# Tests for numba_kernels
+#----------------------------------------------------------------------------------------
+
+def test_numba_backend():
+    '''
+        Tests that the Numba backend gives the same stiffness matrix and load vector as the
+        NumPy backend, for a right hand side with a branch that is written per point for
+        the kernels and with np.where for NumPy. Without Numba, the kernels are checked as
+        plain python functions and the "numba" backend must fall back to NumPy.
+    '''
+
+    def f_point(x, y):
+        if x*x + y*y < 0.25:
+            return 1.0
+        return x
+
+    def f_vectorized(x, y):
+        return np.where(x**2 + y**2 < 0.25, 1.0, x)
+
+    num_nodes = 300
+    nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+    elements = elements.astype(int)
+
+    A = stiffness.sparse_stiffness_matrix(num_nodes, nodal_points, elements)
+    F = load.vectorized_load_vector(num_nodes, nodal_points, elements, f_vectorized)
+
+    if numba_kernels.NUMBA_AVAILABLE:
+        import numba
+        f_point = numba.njit(f_point)
+
+    A_numba = stiffness.sparse_stiffness_matrix(num_nodes, nodal_points, elements, backend = "numba")
+    F_numba = load.vectorized_load_vector(num_nodes, nodal_points, elements, f_vectorized, backend = "numba")
+    assert np.allclose(A_numba.toarray(), A.toarray()), "Numba and NumPy stiffness matrices differ"
+    assert np.allclose(F_numba, F), "Numba backend with a NumPy right hand side differs"
+
+    z, rho = numint.quadrature_rule(4)
+    Fh = numba_kernels.load_values(nodal_points, elements, z, rho.astype(float), f_point)
+    F_kernel = np.bincount(elements.ravel(), weights = Fh.ravel(), minlength = num_nodes)
+    assert np.allclose(F_kernel, F), "Load kernel differs from the NumPy load vector"
+
+    A_k = numba_kernels.stiffness_values(nodal_points, elements)
+    gradients, areas = stiffness.element_geometry(nodal_points, elements)
+    assert np.allclose(A_k, areas[:, None, None] * (gradients @ gradients.transpose(0, 2, 1))), \
+           "Stiffness kernel differs from the NumPy elemental matrices"
+
+    if numba_kernels.NUMBA_AVAILABLE:
+        F_jitted = load.vectorized_load_vector(num_nodes, nodal_points, elements, f_point, backend = "numba")
+        assert np.allclose(F_jitted, F), "Numba backend with a jitted right hand side differs"
+
+    with pytest.raises(ValueError):
+        stiffness.sparse_stiffness_matrix(num_nodes, nodal_points, elements, backend = "fortran")
+
+#----------------------------------------------------------------------------------------
+
+def test_supernodal_solve_kernels():
+    '''
+        Tests the supernodal solve kernels used by operator_cache.TriangularFactor against
+        scipy on the LU factors of a stiffness matrix (as plain python without Numba).
+    '''
+    num_nodes = 200
+    nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+    interior, factor = solver.factorize_stiffness(num_nodes, nodal_points, elements, boundary_edges)
+    b = np.random.default_rng(0).random(len(interior))
+
+    T = sps.tril(factor.L, -1).tocsc()
+    T.sort_indices()
+    starts = opcache.supernode_partition(T.indptr, T.indices, 4, 2.0)
+    assert starts[0] == 0 and starts[-1] == len(interior) and np.all(np.diff(starts) <= 4)
+    assert len(starts) - 1 < len(interior), "Some columns should share a supernode"
+
+    lower = (starts,) + opcache.pack_supernodes(T.indptr, T.indices, T.data, starts)
+    y = opcache.supernodal_lower_solve(*lower, b.copy())
+    assert np.allclose(y, spsla.spsolve_triangular(factor.L.tocsr(), b, lower = True, unit_diagonal = True))
+
+    # Both the supernodal solves and the scipy triangular solves used without Numba
+    reloaded = opcache.TriangularFactor.from_superlu(factor)
+    reloaded.packed = reloaded.pack()
+    assert np.allclose(reloaded.solve(b), factor.solve(b)), "The reloaded factor should solve like SuperLU"
+    reloaded.packed = None
+    assert np.allclose(reloaded.solve(b), factor.solve(b)), "The scipy triangular solves differ from SuperLU"
+
+#----------------------------------------------------------------------------------------
+
+# Tests for export
+#----------------------------------------------------------------------------------------
+
+def test_write_vtu(tmp_path):
+    '''
+        Tests that the appended raw binary data of a .vtu file holds the nodal points,
+        the elements and boundary edges as cells, and the solution. The file is read back
+        by following the offsets in the XML header.
+    '''
+
+    sol, nodal_points, elements, boundary_edges = solver.solver(300, lambda x, y: x+1)
+    path = tmp_path / "solution.vtu"
+    export.write_vtu(path, nodal_points, elements, boundary_edges, {"solution": sol})
+
+    content = path.read_bytes()
+    start = content.index(b"_", content.index(b"<AppendedData")) + 1
+    header = ET.fromstring(content[:start - 1].decode() + "</AppendedData></VTKFile>")
+    dtypes = {"Float64": "<f8", "Int64": "<i8", "UInt8": "u1"}
+
+    def read(data_array):
+        offset = start + int(data_array.get("offset"))
+        size = int(np.frombuffer(content, "<u8", 1, offset)[0])
+        return np.frombuffer(content[offset + 8:offset + 8 + size], dtypes[data_array.get("type")])
+
+    arrays = {data_array.get("Name"): read(data_array) for data_array in header.iter("DataArray")}
+    num_elements = len(elements)
+
+    assert np.array_equal(arrays["solution"], sol), "Solution was not written correctly"
+    assert np.array_equal(arrays[None].reshape(-1, 3)[:, :2], nodal_points), "Nodal points were not written correctly"
+    assert np.array_equal(arrays["connectivity"][:3*num_elements], elements.ravel()), "Elements were not written correctly"
+    assert np.array_equal(arrays["connectivity"][3*num_elements:], boundary_edges.ravel()), "Boundary edges were not written correctly"
+    assert arrays["offsets"][-1] == len(arrays["connectivity"]), "Cell offsets do not match the connectivity"
+    assert np.array_equal(np.bincount(arrays["types"]).nonzero()[0], [export.VTK_LINE, export.VTK_TRIANGLE])
+
+#----------------------------------------------------------------------------------------
+
+def test_write_xdmf_time_series(tmp_path):
+    '''
+        Tests that an XDMF time series refers to one copy of the mesh in the binary sidecar,
+        and that every step points to its own solution.
+    '''
+
+    sol, nodal_points, elements, boundary_edges = solver.solver(300, lambda x, y: x+1)
+    solutions = np.stack([sol, 2*sol, 3*sol])
+    path = tmp_path / "series.xmf"
+    export.write_xdmf(path, nodal_points, elements, boundary_edges, solutions, times = [0.0, 0.5, 1.0])
+
+    def read(data_item):
+        dtype = ("<f" if data_item.get("DataType") == "Float" else "<i") + data_item.get("Precision")
+        dimensions = [int(dimension) for dimension in data_item.get("Dimensions").split()]
+        return np.fromfile(tmp_path / data_item.text, dtype, int(np.prod(dimensions)),
+                           offset = int(data_item.get("Seek"))).reshape(dimensions)
+
+    root = ET.parse(path).getroot()
+    steps = root.findall("./Domain/Grid[@Name='mesh']/Grid")
+
+    assert [float(step.find("Time").get("Value")) for step in steps] == [0.0, 0.5, 1.0], "Wrong times"
+    for k, step in enumerate(steps):
+        assert np.array_equal(read(step.find("./Topology/DataItem")), elements), "Elements were not written correctly"
+        assert np.array_equal(read(step.find("./Geometry/DataItem")), nodal_points), "Nodal points were not written correctly"
+        assert np.array_equal(read(step.find("./Attribute/DataItem")), solutions[k]), "Solution was not written correctly"
+
+    boundary = root.find("./Domain/Grid[@Name='boundary']/Topology/DataItem")
+    assert np.array_equal(read(boundary), boundary_edges), "Boundary edges were not written correctly"
+
+    mesh_bytes = nodal_points.size*8 + elements.size*8 + boundary_edges.size*8
+    assert (tmp_path / "series.bin").stat().st_size == mesh_bytes + solutions.size*8, "The mesh should be written once"
+
+#----------------------------------------------------------------------------------------
+
+# Tests for assemble_mass_matrix and eigen_solver
+#----------------------------------------------------------------------------------------
+
+def test_mass_matrix():
+    '''
+        Tests the mass matrix. The sum of all entries is the integral of 1 over the mesh,
+        which is the area of the polygon approximating the unit disc, and M u for a nodal
+        vector u is the load vector of the piecewise linear function u.
+    '''
+
+    num_nodes = 500
+    nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+    M = massmat.mass_matrix(num_nodes, nodal_points, elements)
+
+    _, areas = stiffness.element_geometry(nodal_points, elements)
+    assert np.isclose(M.sum(), np.sum(areas)), "The entries of the mass matrix must sum to the area"
+
+    # The 4-point rule integrates the product of two linear functions exactly
+    u = nodal_points[:, 0] + 2*nodal_points[:, 1]
+    F = load.vectorized_load_vector(num_nodes, nodal_points, elements, lambda x, y: x + 2*y)
+    assert np.allclose(M @ u, F), "Mass matrix does not match the load vector of a linear function"
+
+#----------------------------------------------------------------------------------------
+
+def test_eigen_solver_bessel_zeros():
+    '''
+        Tests that the smallest Dirichlet eigenvalues of the unit disc match the squared
+        Bessel function zeros j_{0,1}^2, j_{1,1}^2 (twice), j_{2,1}^2 (twice) and j_{0,2}^2,
+        and that the eigenfunctions are orthonormal in the mass matrix.
+    '''
+
+    exact = np.sort(np.concatenate([scipy.special.jn_zeros(0, 2)**2,
+                                    np.repeat(scipy.special.jn_zeros(1, 1)**2, 2),
+                                    np.repeat(scipy.special.jn_zeros(2, 1)**2, 2)]))
+
+    num_nodes = 5000
+    eigenvalues, eigenfunctions, nodal_points, elements, _ = eigen_solver.eigen_solver(num_nodes, k = 6)
+
+    assert np.allclose(eigenvalues, exact, rtol = 2e-3), "Eigenvalues do not match the Bessel zeros"
+
+    M = massmat.mass_matrix(num_nodes, nodal_points, elements)
+    assert np.allclose(eigenfunctions.T @ (M @ eigenfunctions), np.eye(6), atol = 1e-8), "Eigenfunctions are not orthonormal"
+
+    with pytest.raises(ValueError):
+        eigen_solver.eigen_solver(100, k = 0)
+
+#----------------------------------------------------------------------------------------
+
+# Tests for domain_decomposition
+#----------------------------------------------------------------------------------------
+
+def test_subdomains_cover_interior():
+    '''
+        Tests that the owned unknowns of the sectors split the interior nodes without
+        overlap, and that every extended subdomain contains the unknowns it owns.
+    '''
+
+    num_nodes = 2000
+    nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+    interior = solver.interior_nodes(num_nodes, boundary_edges)
+    A = stiffness.sparse_stiffness_matrix(num_nodes, nodal_points, elements)[interior][:, interior]
+
+    sectors = ddm.sector_partition(nodal_points, elements, 5)
+    owned, extended = ddm.subdomains(A, interior, elements, sectors, 5, overlap = 2)
+
+    assert np.array_equal(np.sort(np.concatenate(owned)), np.arange(len(interior))), "Owned unknowns must partition the interior"
+    for own, ext in zip(owned, extended):
+        assert np.all(np.isin(own, ext)), "A subdomain must contain the unknowns it owns"
+        assert len(ext) > len(own), "Subdomains must overlap"
+
+#----------------------------------------------------------------------------------------
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_solve_domain_decomposition(processes):
+    '''
+        Tests that the domain decomposition solver gives the same solution as the sparse
+        direct solver, with the subdomains solved in-process and in worker processes.
+    '''
+    num_nodes = 3000
+    nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+    interior = solver.interior_nodes(num_nodes, boundary_edges)
+    A = stiffness.sparse_stiffness_matrix(num_nodes, nodal_points, elements)[interior][:, interior]
+    F = load.vectorized_load_vector(num_nodes, nodal_points, elements, lambda x, y: np.exp(x)*y+1)[interior]
+
+    x = solver.solve_domain_decomposition(A, F, interior, nodal_points, elements, num_sectors = 4, processes = processes)
+
+    assert np.allclose(x, solver.solve_sparse(A, F), atol = 1e-8), "Domain decomposition gives a different solution"
+
+    sol, _, _, _ = solver.solver(1000, lambda x, y: x**2+1, engine = "domain_decomposition")
+    sol_sparse, _, _, _ = solver.solver(1000, lambda x, y: x**2+1, engine = "sparse")
+    assert np.allclose(sol, sol_sparse, atol = 1e-8), "Domain decomposition engine differs from the sparse engine"
+
+#----------------------------------------------------------------------------------------
+
+# Tests for radial_solver
+#----------------------------------------------------------------------------------------
+
+def test_radial_solver():
+    '''
+        Tests the 1D radial solve against the exact solution u = sin(2*pi*(x^2+y^2)) of
+        test_solver_advanced, and that it agrees with the 2D solver at the nodal points.
+    '''
+
+    def right_hand_side(x, y):
+        return -8*np.pi*np.cos(2*np.pi*(x**2+y**2)) + 16*np.pi**2*(x**2+y**2)*np.sin(2*np.pi*(x**2+y**2))
+
+    assert radial_solver.is_radial(right_hand_side), "The right hand side is radial"
+    assert not radial_solver.is_radial(lambda x, y: x + 1), "x + 1 is not radial"
+
+    num_nodes = 3000
+    sol, nodal_points = radial_solver.radial_solver(num_nodes, right_hand_side)
+    exact = np.sin(2*np.pi*(nodal_points[:, 0]**2 + nodal_points[:, 1]**2))
+    assert np.max(np.abs(sol - exact)) < 1e-2, "The radial solution is not accurate"
+
+    sol_2d, nodal_points_2d, _, _ = solver.solver(num_nodes, right_hand_side)
+    assert np.array_equal(nodal_points, nodal_points_2d), "The radial solver must use the nodes of the mesh"
+    assert np.max(np.abs(sol - sol_2d)) < 0.05, "The radial and 2D solutions differ"
+
+    sol_engine, nodal_points_engine, _, _ = solver.solver(num_nodes, right_hand_side, reorder = "hilbert", engine = "radial")
+    exact = np.sin(2*np.pi*(nodal_points_engine[:, 0]**2 + nodal_points_engine[:, 1]**2))
+    assert np.max(np.abs(sol_engine - exact)) < 1e-2, "The radial engine does not follow the renumbering"
+
+    with pytest.raises(ValueError):
+        solver.solver(100, lambda x, y: x + 1, engine = "radial")
+
+#----------------------------------------------------------------------------------------
+
+# Tests for polar_solver
+#----------------------------------------------------------------------------------------
+
+def test_polar_solver():
+    '''
+        Tests the polar grid solver against the exact solution u = sin(2*pi*(x^2+y^2)) and
+        u = (1 - x^2 - y^2) * x of f = 8x, and that the polar engine agrees with it.
+    '''
+
+    def right_hand_side(x, y):
+        return -8*np.pi*np.cos(2*np.pi*(x**2+y**2)) + 16*np.pi**2*(x**2+y**2)*np.sin(2*np.pi*(x**2+y**2))
+
+    sol, nodal_points = polar_solver.polar_solver(3000, right_hand_side)
+    exact = np.sin(2*np.pi*(nodal_points[:, 0]**2 + nodal_points[:, 1]**2))
+    assert np.max(np.abs(sol - exact)) < 1e-2, "The polar solution is not accurate"
+
+    sol, nodal_points = polar_solver.polar_solver(3000, lambda x, y: 8*x)
+    exact = (1 - nodal_points[:, 0]**2 - nodal_points[:, 1]**2) * nodal_points[:, 0]
+    assert np.max(np.abs(sol - exact)) < 1e-2, "The polar solution of a non-radial problem is not accurate"
+
+    sol_engine, nodal_points_engine, _, _ = solver.solver(3000, lambda x, y: 8*x, reorder = "hilbert", engine = "polar")
+    exact = (1 - nodal_points_engine[:, 0]**2 - nodal_points_engine[:, 1]**2) * nodal_points_engine[:, 0]
+    assert np.max(np.abs(sol_engine - exact)) < 1e-2, "The polar engine does not follow the renumbering"
+
+#----------------------------------------------------------------------------------------
+
+def test_polar_preconditioner():
+    '''
+        Tests that conjugate gradients with the polar preconditioner solve the finite element
+        system, and that the number of iterations does not grow with the number of nodes.
+    '''
+
+    iterations = []
+    for num_nodes in [2000, 20000]:
+        nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+        interior = solver.interior_nodes(num_nodes, boundary_edges)
+        A = stiffness.sparse_stiffness_matrix(num_nodes, nodal_points, elements)[interior][:, interior]
+        F = load.vectorized_load_vector(num_nodes, nodal_points, elements, lambda x, y: np.exp(x)*y+1)[interior]
+
+        grid = polar_solver.PolarPoissonSolver(*polar_solver.polar_grid_size(num_nodes))
+        M = polar_solver.PolarPreconditioner(A, grid, nodal_points, interior).as_linear_operator()
+        count = []
+        spsla.cg(A, F, M = M, atol = 0.0, callback = lambda xk: count.append(1), maxiter = 200)
+        iterations.append(len(count))
+
+        x = solver.solve_polar_preconditioned(A, F, interior, nodal_points, num_nodes)
+        assert np.allclose(x, solver.solve_sparse(A, F), atol = 1e-8), "Polar preconditioned CG gives a different solution"
+
+    assert iterations[1] <= iterations[0] + 5, f"Iterations grow with the number of nodes: {iterations}"
+
+    sol, _, _, _ = solver.solver(1000, lambda x, y: x**2+1, engine = "polar_cg")
+    sol_sparse, _, _, _ = solver.solver(1000, lambda x, y: x**2+1, engine = "sparse")
+    assert np.allclose(sol, sol_sparse, atol = 1e-8), "The polar_cg engine differs from the sparse engine"
+
+#----------------------------------------------------------------------------------------
+
+def test_mixed_precision():
+    '''
+        Tests that iterative refinement of a float32 factorization reaches double precision
+        accuracy in a few steps, and that the mixed_precision engine matches the dense engine.
+    '''
+    num_nodes = 5000
+    nodal_points, elements, boundary_edges = gm.generate_mesh(num_nodes)
+    interior = solver.interior_nodes(num_nodes, boundary_edges)
+    A = stiffness.sparse_stiffness_matrix(num_nodes, nodal_points, elements)[interior][:, interior]
+    F = load.vectorized_load_vector(num_nodes, nodal_points, elements, lambda x, y: np.exp(x)*y+1)[interior]
+
+    x, steps, residual = solver.mixed_precision_refinement(A, F, tolerance = 1e-11)
+    assert residual <= 1e-11 and 1 < steps <= 6, f"Refinement took {steps} steps to residual {residual}"
+    assert np.linalg.norm(F - A @ x) <= 1e-11 * np.linalg.norm(F), "The reported residual is wrong"
+    assert np.allclose(x, solver.solve_sparse(A, F), rtol = 1e-9, atol = 1e-12), "Mixed precision solution is inaccurate"
+
+    sol, _, _, _ = solver.solver(600, lambda x, y: np.sin(2*x)+y**2, engine = "mixed_precision", tolerance = 1e-12)
+    sol_dense, _, _, _ = solver.solver(600, lambda x, y: np.sin(2*x)+y**2, engine = "dense")
+    assert np.allclose(sol, sol_dense, atol = 1e-10), "The mixed_precision engine gives a different solution"
+
+#----------------------------------------------------------------------------------------
+
+# Tests for nonlinear_solver
+#----------------------------------------------------------------------------------------
+
+@pytest.mark.parametrize("inexact", [False, True])
+def test_newton_solver(inexact):
+    '''
+        Tests Newton's method on nabla^2 u = u^3 - 4 - u_e^3 with the exact solution
+        u_e = 1 - x^2 - y^2, and that a right hand side independent of u is solved in one
+        step with the same solution as the linear solver.
+    '''
+
+    def u_exact(x, y):
+        return 1 - x**2 - y**2
+
+    def f(x, y, u):
+        return -u**3 + 4 + u_exact(x, y)**3
+
+    sol, nodal_points, _, _ = nonlinear_solver.newton_solver(2000, f, lambda x, y, u: -3*u**2, inexact = inexact)
+    assert np.max(np.abs(sol - u_exact(nodal_points[:, 0], nodal_points[:, 1]))) < 2e-3, "Newton solution is inaccurate"
+
+    # The finite difference derivative gives the same solution
+    sol_fd, _, _, _ = nonlinear_solver.newton_solver(2000, f, inexact = inexact)
+    assert np.allclose(sol_fd, sol, atol = 1e-8), "Finite difference Jacobian gives a different solution"
+
+    sol_linear, _, _, _ = nonlinear_solver.newton_solver(1000, lambda x, y, u: np.exp(x)*y+1+0*u, max_iterations = 1)
+    sol_reference, _, _, _ = solver.solver(1000, lambda x, y: np.exp(x)*y+1, engine = "sparse")
+    assert np.allclose(sol_linear, sol_reference, atol = 1e-10), "A linear problem must be solved in one Newton step"
+
+    with pytest.raises(ValueError):
+        nonlinear_solver.newton_solver(100, lambda x, y: x)
+
+#----------------------------------------------------------------------------------------
+
+def test_newton_line_search_failure(caplog):
+    '''
+        Tests that with a wrong derivative, where no Newton step reduces the residual,
+        Newton's method warns and returns the last iterate instead of taking the step,
+        and that an initial guess that is already solved gives no warning.
+    '''
+
+    def f(x, y, u):
+        return -u**3 + 4 + 0*x
+
+    with caplog.at_level("WARNING", logger = "nonlinear_solver"):
+        sol, _, _, _ = nonlinear_solver.newton_solver(500, f, lambda x, y, u: 1e6 + 0*u)
+    assert np.all(sol == 0), "The initial guess is the last iterate that did not increase the residual"
+    assert "line search" in caplog.text, "A failed line search must be reported"
+
+    # An initial guess that is solved up to round-off stops at the absolute tolerance
+    def g(x, y, u):
+        return np.exp(x)*y + 1 + 0*u
+
+    caplog.clear()
+    sol_reference, _, _, _ = solver.solver(500, lambda x, y: np.exp(x)*y+1, engine = "sparse")
+    with caplog.at_level("WARNING", logger = "nonlinear_solver"):
+        sol, _, _, _ = nonlinear_solver.newton_solver(500, g, initial_guess = sol_reference)
+    assert np.all(sol == sol_reference), "A solved initial guess must be returned unchanged"
+    assert caplog.text == "", "A solved initial guess must not end in a failed line search"
+
+#----------------------------------------------------------------------------------------
+
+# Tests for postprocessing
+#----------------------------------------------------------------------------------------
+
+def test_richardson_extrapolation():
+    '''
+        Tests Richardson extrapolation on nested meshes for u = 1 - (x^2+y^2)^2, where
+        f = 16 (x^2+y^2), the integral of u is 2 pi / 3 and the boundary flux is -8 pi.
+    '''
+
+    def f(x, y):
+        return 16*(x**2+y**2)
+
+    num_nodes = 100
+    solutions = postprocessing.nested_solutions(num_nodes, f, levels = 3)
+    fine_sol, fine_points, fine_elements, fine_boundary_edges = solutions[-1]
+    sol, error, results, nodal_points, elements, _ = postprocessing.richardson_extrapolation(num_nodes, f, levels = 3)
+
+    exact = 1 - (nodal_points[:, 0]**2 + nodal_points[:, 1]**2)**2
+    assert np.max(np.abs(sol - exact)) < np.max(np.abs(fine_sol[:num_nodes] - exact)), "Extrapolation should improve the nodal values"
+    assert np.all(np.abs(sol - exact) <= error + 1e-12), "The error estimate should bound the nodal error"
+
+    value, estimate, observed_order = results["integral"]
+    fine_error = abs(postprocessing.integral(fine_sol, fine_points, fine_elements) - 2*np.pi/3)
+    assert abs(value - 2*np.pi/3) < fine_error / 10, "Extrapolation should improve the integral"
+    assert abs(value - 2*np.pi/3) <= estimate, "The error estimate should bound the error of the integral"
+    assert abs(observed_order - 2) < 0.2, "The integral should converge with order 2"
+
+    value, estimate, _ = results["boundary_flux"]
+    fine_error = abs(postprocessing.boundary_flux(fine_sol, fine_points, fine_elements, fine_boundary_edges) + 8*np.pi)
+    assert abs(value + 8*np.pi) < fine_error / 3, "Extrapolation should improve the boundary flux"
+    assert abs(value + 8*np.pi) <= estimate, "The error estimate should bound the error of the flux"
+
+    with pytest.raises(ValueError):
+        postprocessing.extrapolate([1.0])
+
+#----------------------------------------------------------------------------------------
+
+# Tests for solution
+#----------------------------------------------------------------------------------------
+
+def test_solution_recovery():
+    '''
+        Tests the gradient recovery and the boundary flux of solution.Solution. A linear
+        function is recovered exactly, and for u = 1 - (x^2+y^2)^2, with f = 16 (x^2+y^2),
+        grad u = -4 (x^2+y^2) (x, y) and the flux is -8 pi.
+    '''
+
+    nodal_points, elements, boundary_edges = gm.generate_mesh(500)
+    linear = solution.Solution(2*nodal_points[:, 0] - 3*nodal_points[:, 1] + 1, nodal_points, elements, boundary_edges)
+    assert np.allclose(linear.element_gradients, [2, -3]) and np.allclose(linear.nodal_gradients, [2, -3])
+    assert abs(linear.boundary_flux) < 1e-10, "A constant gradient has no net flux through a closed curve"
+
+    num_nodes = 4000
+    result = solver.solver(num_nodes, lambda x, y: 16*(x**2+y**2))
+    sol, nodal_points, elements, boundary_edges = result
+    assert len(result) == 4 and result[0] is sol, "The solution must behave like the old tuple"
+
+    exact = -4 * np.sum(nodal_points**2, axis = 1)[:, None] * nodal_points
+    assert np.max(np.linalg.norm(result.nodal_gradients - exact, axis = 1)) < 0.05, "The recovered gradient is inaccurate"
+
+    flux_error = abs(result.boundary_flux + 8*np.pi)
+    assert flux_error < 0.2, "The boundary flux is inaccurate"
+    assert flux_error < abs(postprocessing.boundary_flux(sol, nodal_points, elements, boundary_edges) + 8*np.pi)
+
+    # The results are computed once
+    assert result.nodal_gradients is result.nodal_gradients and result.element_gradients is result.element_gradients